@@ -0,0 +1,197 @@
+import asyncio
+import random
+import time
+from datetime import datetime, timezone
+from app.store.base import LoopListener
+
+# Node fields that describe the reservation rather than the node
+RESERVATION_FIELDS = ('node', 'status', 'reserved_by', 'expires_at', 'updated_at')
+# Claim rounds per request; each round reserves the still-missing count in one batch
+CLAIM_ROUNDS = 4
+
+
+class AllocationError(Exception):
+    """Not enough matching nodes could be reserved"""
+
+
+def _indexable(value):
+    # Scalars only; DynamoDB numbers come back as Decimal (which has as_tuple)
+    return isinstance(value, (str, int, float, bool)) or value is None or hasattr(value, 'as_tuple')
+
+
+class NodeAllocator(LoopListener):
+    """Reserves any N available nodes matching attribute values.
+
+    Keeps an index of every node's attributes and which nodes are free,
+    maintained from store write events and rebuilt from a full listing at
+    most every resync_interval seconds (and when a request cannot be
+    filled), which picks up writes made by other processes. The index is
+    only a hint: nodes are claimed with the store's conditional batch
+    reserve, and candidates that lost a race are dropped and replaced by
+    the next round, so concurrent allocations never share a node.
+    """
+
+    def __init__(self, store, resync_interval=60):
+        self.store = store
+        self.resync_interval = resync_interval
+        self._attributes = {}  # node -> {attribute: value}
+        self._by_value = {}  # (attribute, value) -> set of node names
+        self._free = set()
+        self._reserved_until = {}  # node -> expires_at of a reservation seen
+        self._claiming = set()  # picked by a request whose reserve is in flight
+        self._built_at = None
+        self._rebuild_task = None
+        self._pending_events = None  # events that arrive while a rebuild is listing
+        self._loop = None
+
+    def _apply_event(self, event, node_name, item):
+        """Keep the attribute index and the free set in step with a write"""
+        if self._pending_events is not None:
+            self._pending_events.append((event, node_name, item))
+        if event == 'create':
+            self._put(item)
+        elif event == 'delete':
+            self._forget(node_name)
+        elif node_name in self._attributes:
+            if event == 'reserve':
+                self._free.discard(node_name)
+                self._reserved_until[node_name] = (item or {}).get('expires_at')
+            elif event in ('release', 'expire'):
+                self._free.add(node_name)
+                self._reserved_until.pop(node_name, None)
+
+    def _put(self, item):
+        name = item['node']
+        self._forget(name)
+        attributes = {k: v for k, v in item.items() if k not in RESERVATION_FIELDS and _indexable(v)}
+        self._attributes[name] = attributes
+        for key in attributes.items():
+            self._by_value.setdefault(key, set()).add(name)
+        if item.get('status') == 'reserved':
+            self._reserved_until[name] = item.get('expires_at')
+        else:
+            self._free.add(name)
+
+    def _forget(self, name):
+        for key in self._attributes.pop(name, {}).items():
+            names = self._by_value.get(key)
+            if names is not None:
+                names.discard(name)
+                if not names:
+                    del self._by_value[key]
+        self._free.discard(name)
+        self._reserved_until.pop(name, None)
+
+    async def rebuild(self):
+        """Reload the index from a full node listing"""
+        self._loop = asyncio.get_running_loop()
+        if self._rebuild_task is None:
+            self._rebuild_task = asyncio.ensure_future(self._rebuild())
+        task = self._rebuild_task
+        try:
+            await asyncio.shield(task)
+        finally:
+            if task.done() and self._rebuild_task is task:
+                self._rebuild_task = None
+
+    async def _rebuild(self):
+        self._pending_events = []
+        try:
+            nodes = await self.store.list_nodes()
+            events, self._pending_events = self._pending_events, None
+            self._attributes, self._by_value, self._free, self._reserved_until = {}, {}, set(), {}
+            for item in nodes:
+                self._put(item)
+            # Writes that landed while listing may be missing from the listing
+            for event in events:
+                self._apply_event(*event)
+            self._built_at = time.monotonic()
+        finally:
+            self._pending_events = None
+
+    def _candidates(self, match):
+        """Names of the matching nodes that are free or hold an expired reservation"""
+        if match:
+            sets = sorted((self._by_value.get(key, set()) for key in match.items()), key=len)
+            names = set.intersection(*sets)
+        else:
+            names = self._free | set(self._reserved_until)
+        now = datetime.now(timezone.utc).isoformat()
+        return [
+            name for name in names
+            if name not in self._claiming
+            and (name in self._free or (self._reserved_until.get(name) or now) < now)
+        ]
+
+    def _take(self, match, count):
+        """Pick up to count candidates and hide them from concurrent requests"""
+        candidates = self._candidates(match)
+        # Random picks spread concurrent requests (and other processes) over different nodes
+        picks = random.sample(candidates, min(count, len(candidates)))
+        self._claiming.update(picks)
+        return picks
+
+    def _settle(self, picks, results=None):
+        """Make picks visible again; the ones that failed are taken by someone else"""
+        self._claiming.difference_update(picks)
+        for name in picks:
+            if results is not None and not results.get(name) and name in self._attributes:
+                # Stays hidden until a release or expire event (or a rebuild) says otherwise
+                self._free.discard(name)
+                self._reserved_until[name] = None
+
+    async def allocate(self, count, match, user, expires_at, partial=False):
+        """Reserve count nodes whose attributes equal every value in match.
+
+        Returns the reserved nodes. Without partial, raises AllocationError
+        (and releases what it got) when fewer than count could be reserved.
+        """
+        for value in match.values():
+            if not _indexable(value):
+                raise ValueError("match values must be strings, numbers, booleans or null")
+        self._loop = asyncio.get_running_loop()
+        if self._built_at is None or time.monotonic() - self._built_at > self.resync_interval:
+            await self.rebuild()
+
+        claimed, result = [], None
+        rebuilt = False
+        for _ in range(CLAIM_ROUNDS):
+            missing = count - len(claimed)
+            picks = self._take(match, missing)
+            if len(picks) < missing and not rebuilt:
+                # Maybe released by another process since the last rebuild
+                self._settle(picks)
+                await self.rebuild()
+                rebuilt = True
+                picks = self._take(match, missing)
+            if not picks:
+                break
+            try:
+                result = await self.store.reserve_nodes(picks, user, expires_at)
+            except Exception:
+                self._settle(picks)
+                raise
+            outcome = {r['node']: r['ok'] for r in result['results']}
+            self._settle(picks, outcome)
+            claimed += [name for name in picks if outcome.get(name)]
+            if len(claimed) == count:
+                break
+
+        if len(claimed) < count and not partial:
+            if claimed:
+                await self.store.release_nodes(claimed)
+            raise AllocationError(f"Only {len(claimed)} of {count} matching nodes could be reserved")
+        return {
+            "message": f"Reserved {len(claimed)} of {count} nodes",
+            "expires_at": result["expires_at"] if result else None,
+            "nodes": [
+                {
+                    **self._attributes.get(name, {}),
+                    "node": name,
+                    "status": "reserved",
+                    "reserved_by": user,
+                    "expires_at": result["expires_at"],
+                }
+                for name in sorted(claimed)
+            ],
+        }
@@ -0,0 +1,149 @@
+import asyncio
+import logging
+from collections import deque
+from datetime import datetime, timezone
+from app.responses import dumps
+from app.store.base import LoopListener
+
+logger = logging.getLogger(__name__)
+
+# Version recorded for deleted nodes
+_DELETED = object()
+
+
+class Subscription:
+    def __init__(self, broker, node=None, queue_size=100):
+        self.broker = broker
+        self.node = node
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        # Set when the subscriber fell too far behind and missed events
+        self.overflowed = False
+
+    def offer(self, event):
+        if self.node and event["node"] != self.node:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+            self.broker.unsubscribe(self)
+            # Wake the reader so it can tell the client to resync
+            self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+    async def next(self, timeout):
+        """Next event, or None on timeout or overflow"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class EventBroker(LoopListener):
+    """Fans node change events from the store's write paths out to subscribers.
+
+    Every event gets an increasing sequence number and the most recent ones
+    are kept, so a client that reconnects with its last seen sequence number
+    resumes without gaps. Subscribers have bounded queues; one that falls
+    behind is cut off with a reset event instead of slowing everyone down.
+
+    Events come from this process's writes. With several workers or replicas,
+    follow_changes adds the writes made elsewhere by polling the store's
+    change feed; without it, each process streams only its own writes.
+    """
+
+    def __init__(self, history=1000, queue_size=100):
+        self.queue_size = queue_size
+        self._history = deque(maxlen=history)
+        self._seq = 0
+        self._subscribers = set()
+        self._loop = None
+        # node -> updated_at of the last event published for it (_DELETED once deleted)
+        self._versions = {}
+
+    def start(self, loop=None):
+        self._loop = loop or asyncio.get_running_loop()
+
+    def _apply_event(self, event, node_name, item):
+        """Publish a write to subscribers"""
+        self.publish(event, node_name, item)
+
+    def publish(self, event_type, node_name, item=None):
+        self._versions[node_name] = _DELETED if event_type == 'delete' else (item or {}).get('updated_at')
+        self._seq += 1
+        event = {
+            "seq": self._seq,
+            "type": event_type,
+            "node": node_name,
+            "item": item,
+            "at": datetime.now(timezone.utc).isoformat(),
+        }
+        self._history.append(event)
+        for subscription in list(self._subscribers):
+            subscription.offer(event)
+        return event
+
+    async def follow_changes(self, store, interval):
+        """Publish writes made by other processes until cancelled.
+
+        Polls store.list_changes every interval seconds and publishes an
+        update event for each node whose updated_at differs from the last
+        event published for it, and a delete event for nodes deleted
+        elsewhere. Writes this process already published are skipped.
+        """
+        since = datetime.now(timezone.utc).isoformat()
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                changes = await store.list_changes(since)
+            except Exception as e:
+                logger.error(f"Error polling node changes: {e}")
+                continue
+            since = changes["as_of"]
+            for node in changes["nodes"]:
+                if self._versions.get(node["node"]) != node.get("updated_at"):
+                    self.publish("update", node["node"], node)
+            for name in changes["deleted"]:
+                if self._versions.get(name) is not _DELETED:
+                    self.publish("delete", name)
+
+    @property
+    def last_seq(self):
+        return self._seq
+
+    def subscribe(self, node=None, since=None):
+        """Subscribe to live events, replaying those after sequence number since.
+
+        Returns the subscription and a list of events to send first. If the
+        requested history is no longer available, the list starts with a
+        reset event telling the client to reload its state.
+        """
+        subscription = Subscription(self, node=node, queue_size=self.queue_size)
+        backlog = []
+        if since is not None:
+            oldest = self._history[0]["seq"] if self._history else self._seq + 1
+            if since < oldest - 1 or since > self._seq:
+                backlog.append(self.reset_event())
+            else:
+                backlog.extend(
+                    event for event in self._history
+                    if event["seq"] > since and (not node or event["node"] == node)
+                )
+        self._subscribers.add(subscription)
+        return subscription, backlog
+
+    def unsubscribe(self, subscription):
+        self._subscribers.discard(subscription)
+
+    def reset_event(self):
+        return {"seq": self._seq, "type": "reset", "node": None, "item": None,
+                "at": datetime.now(timezone.utc).isoformat()}
+
+    @staticmethod
+    def format_sse(event):
+        data = dumps(event).decode()
+        return f"id: {event['seq']}\nevent: {event['type']}\ndata: {data}\n\n"
+
+    @property
+    def subscriber_count(self):
+        return len(self._subscribers)
@@ -0,0 +1,184 @@
+import asyncio
+import heapq
+import logging
+import time
+from datetime import datetime, timezone
+from app import metrics
+from app.store import throttle
+from app.store.base import LoopListener
+
+logger = logging.getLogger(__name__)
+
+# Delay before retrying a release that failed (e.g. DynamoDB unavailable)
+RETRY_DELAY_SECONDS = 5
+
+# How often to re-check is_active while waiting for the next deadline
+ACTIVE_CHECK_SECONDS = 5
+
+# Releases in flight at once, so a burst of due reservations does not fill the
+# store's worker pool ahead of interactive requests
+RELEASE_CONCURRENCY = 8
+
+
+class ExpiryScheduler(LoopListener):
+    """Releases reservations at the moment they expire.
+
+    Upcoming deadlines live in a min-heap and the scheduler sleeps until the
+    earliest one, so each run only touches the nodes that are actually due.
+    Store write events keep the heap current. The heap is rebuilt from a full
+    reservation listing only when the scheduler becomes active, which picks
+    up reservations made by processes that have since gone away; with a
+    resync_interval it is also rebuilt that often.
+
+    When is_active is given, only the process for which it returns True
+    (the lease holder) performs the resync scans. Every process still
+    releases the reservations it saw being made, which is safe because
+    releases are conditional writes. A reservation whose process died
+    between leader changes is released by the first read that finds it
+    expired.
+
+    Store calls made by the scheduler run at background priority.
+    """
+
+    def __init__(self, store, resync_interval=None, is_active=None):
+        self.store = store
+        self.resync_interval = resync_interval
+        self.is_active = is_active
+        self._heap = []
+        # node -> expires_at currently scheduled; heap entries that disagree are stale
+        self._deadlines = {}
+        self._loop = None
+        self._wakeup = None
+        self._release_slots = None
+        self._pending_events = None  # events that arrive while a rebuild is listing
+
+    def _apply_event(self, event, node_name, item):
+        """Schedule new reservations and forget ones that ended before their deadline"""
+        if self._pending_events is not None:
+            self._pending_events.append((event, node_name, item))
+        if event == 'reserve' and item and item.get('expires_at'):
+            self.schedule(node_name, item['expires_at'])
+        elif event in ('create', 'release', 'delete', 'expire'):
+            self._deadlines.pop(node_name, None)
+
+    def schedule(self, node_name, expires_at):
+        deadline = datetime.fromisoformat(expires_at)
+        if deadline.tzinfo is None:
+            deadline = deadline.replace(tzinfo=timezone.utc)
+        self._deadlines[node_name] = expires_at
+        heapq.heappush(self._heap, (deadline, node_name, expires_at))
+        if self._wakeup is not None and self._heap[0][1] == node_name:
+            self._wakeup.set()
+
+    @property
+    def pending(self):
+        return len(self._deadlines)
+
+    async def rebuild(self):
+        """Reload every current reservation from the store"""
+        started = time.perf_counter()
+        self._pending_events = []
+        try:
+            reservations = await self.store.list_reservations()
+            events, self._pending_events = self._pending_events, None
+            self._heap = []
+            self._deadlines = {}
+            for item in reservations:
+                self.schedule(item['node'], item['expires_at'])
+            # Writes that landed while listing may be missing from the listing
+            for event in events:
+                self._apply_event(*event)
+        finally:
+            self._pending_events = None
+        metrics.EXPIRY_SWEEP_DURATION.observe(time.perf_counter() - started, 'resync')
+        logger.info(f"Expiry scheduler tracking {self.pending} reservations")
+
+    async def _release(self, node_name, expires_at):
+        try:
+            async with self._release_slots:
+                released = await self.store.release_expired(node_name, expires_at)
+        except Exception as e:
+            logger.error(f"Error releasing expired node {node_name}: {e}")
+            if node_name in self._deadlines:
+                # Rescheduled by a newer reservation in the meantime
+                return False
+            retry_at = datetime.now(timezone.utc).timestamp() + RETRY_DELAY_SECONDS
+            self._deadlines[node_name] = expires_at
+            heapq.heappush(self._heap, (datetime.fromtimestamp(retry_at, tz=timezone.utc), node_name, expires_at))
+            return False
+        return released
+
+    async def release_due(self):
+        """Release every reservation whose deadline has passed"""
+        now = datetime.now(timezone.utc)
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            _, node_name, expires_at = heapq.heappop(self._heap)
+            if self._deadlines.get(node_name) != expires_at:
+                continue
+            del self._deadlines[node_name]
+            due.append((node_name, expires_at))
+        if not due:
+            return 0
+        if self._release_slots is None:
+            self._release_slots = asyncio.Semaphore(RELEASE_CONCURRENCY)
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(self._release(node, expires_at) for node, expires_at in due))
+        released = sum(1 for result in results if result)
+        metrics.EXPIRY_SWEEP_DURATION.observe(time.perf_counter() - started, 'due')
+        metrics.EXPIRY_RELEASED.inc(amount=released)
+        if released:
+            logger.info(f"Released {released} expired nodes")
+        return released
+
+    def _seconds_until_next(self):
+        # Drop stale entries so we never wake up for nothing
+        while self._heap and self._deadlines.get(self._heap[0][1]) != self._heap[0][2]:
+            heapq.heappop(self._heap)
+        if not self._heap:
+            return None
+        delta = (self._heap[0][0] - datetime.now(timezone.utc)).total_seconds()
+        return max(delta, 0)
+
+    async def run(self):
+        with throttle.background():
+            await self._run()
+
+    async def _run(self):
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        next_resync = self._loop.time()
+        was_active = False
+
+        while True:
+            active = self.is_active is None or self.is_active()
+            if active and not was_active:
+                # Newly elected: resync right away
+                next_resync = self._loop.time()
+            was_active = active
+
+            if active and next_resync is not None and self._loop.time() >= next_resync:
+                try:
+                    await self.rebuild()
+                    next_resync = self._loop.time() + self.resync_interval if self.resync_interval else None
+                except Exception as e:
+                    logger.error(f"Error rebuilding expiry schedule: {e}")
+                    next_resync = self._loop.time() + RETRY_DELAY_SECONDS
+
+            await self.release_due()
+
+            # Clear before computing the timeout: anything scheduled from here on sets it again
+            self._wakeup.clear()
+            timeouts = [next_resync - self._loop.time()] if active and next_resync is not None else []
+            if self.is_active is not None:
+                # Notice leadership changes promptly
+                timeouts.append(ACTIVE_CHECK_SECONDS)
+            until_next = self._seconds_until_next()
+            if until_next is not None:
+                timeouts.append(until_next)
+            timeout = max(min(timeouts), 0) if timeouts else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
@@ -0,0 +1,176 @@
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from app import metrics
+from app.responses import dumps
+
+IDEMPOTENT_METHODS = ('POST', 'PUT', 'PATCH', 'DELETE')
+MAX_KEY_LENGTH = 255
+# Larger responses (big batch results) are not kept; a retry runs the request again
+MAX_RESPONSE_BYTES = 256 * 1024
+
+
+class _Entry:
+    __slots__ = ('fingerprint', 'deadline', 'done', 'response')
+
+    def __init__(self, fingerprint, deadline):
+        self.fingerprint = fingerprint
+        self.deadline = deadline
+        self.done = asyncio.Event()
+        self.response = None  # (status, headers, body) once completed
+
+
+class IdempotencyCache:
+    """TTL-bounded LRU of responses by Idempotency-Key.
+
+    Used from the event loop only. Entries are per process, so retries are
+    deduplicated when they reach the same API process (one worker, or a
+    load balancer with session affinity).
+    """
+
+    def __init__(self, max_entries=10000, ttl_seconds=24 * 3600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.deadline <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def start(self, key, fingerprint):
+        entry = self._entries[key] = _Entry(fingerprint, time.monotonic() + self.ttl_seconds)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return entry
+
+    def discard(self, key, entry):
+        if self._entries.get(key) is entry:
+            del self._entries[key]
+
+
+class IdempotencyMiddleware:
+    """ASGI middleware that makes writes carrying an Idempotency-Key safe to retry.
+
+    The first request with a key runs normally and its response is kept.
+    A repeat with the same key and the same request (method, path, query and
+    body) gets the kept response back, marked Idempotent-Replayed, without
+    reaching the routes or the store. A repeat that arrives while the first
+    is still running waits for it. Reusing a key for a different request is
+    rejected with 422. Server errors (5xx) are not kept, so they can be
+    retried.
+    """
+
+    def __init__(self, app, cache):
+        self.app = app
+        self.cache = cache
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['method'] not in IDEMPOTENT_METHODS:
+            await self.app(scope, receive, send)
+            return
+        key = None
+        for name, value in scope['headers']:
+            if name == b'idempotency-key':
+                key = value.decode('latin-1').strip()
+        if not key:
+            await self.app(scope, receive, send)
+            return
+        if len(key) > MAX_KEY_LENGTH:
+            await self._error(send, 400, f"Idempotency-Key must be at most {MAX_KEY_LENGTH} characters")
+            return
+
+        body = await self._read_body(receive)
+        digest = hashlib.sha256()
+        for part in (scope['method'].encode(), scope['path'].encode(), scope.get('query_string', b''), body):
+            digest.update(part + b'\0')
+        fingerprint = digest.hexdigest()
+
+        while True:
+            entry = self.cache.get(key)
+            if entry is None:
+                break
+            if entry.fingerprint != fingerprint:
+                metrics.IDEMPOTENCY_REQUESTS.inc('mismatch')
+                await self._error(send, 422, "Idempotency-Key was already used for a different request")
+                return
+            await entry.done.wait()
+            if entry.response is not None:
+                metrics.IDEMPOTENCY_REQUESTS.inc('replayed')
+                await self._replay(send, entry.response)
+                return
+            # The first attempt failed and was not kept; run this one
+
+        metrics.IDEMPOTENCY_REQUESTS.inc('new')
+        entry = self.cache.start(key, fingerprint)
+        await self._run(scope, body, receive, send, key, entry)
+
+    async def _run(self, scope, body, receive, send, key, entry):
+        delivered = False
+
+        async def replay_receive():
+            nonlocal delivered
+            if not delivered:
+                delivered = True
+                return {'type': 'http.request', 'body': body, 'more_body': False}
+            return await receive()
+
+        response = {'status': None, 'headers': [], 'body': [], 'size': 0}
+
+        async def capture_send(message):
+            if message['type'] == 'http.response.start':
+                response['status'] = message['status']
+                response['headers'] = list(message.get('headers', ()))
+            elif message['type'] == 'http.response.body':
+                response['size'] += len(message.get('body', b''))
+                if response['size'] <= MAX_RESPONSE_BYTES:
+                    response['body'].append(message.get('body', b''))
+            await send(message)
+
+        try:
+            await self.app(scope, replay_receive, capture_send)
+        finally:
+            status = response['status']
+            if status is not None and status < 500 and response['size'] <= MAX_RESPONSE_BYTES:
+                entry.response = (status, response['headers'], b''.join(response['body']))
+            else:
+                self.cache.discard(key, entry)
+            entry.done.set()
+
+    async def _read_body(self, receive):
+        chunks = []
+        while True:
+            message = await receive()
+            if message['type'] != 'http.request':
+                break
+            chunks.append(message.get('body', b''))
+            if not message.get('more_body'):
+                break
+        return b''.join(chunks)
+
+    async def _replay(self, send, stored):
+        status, headers, body = stored
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': headers + [(b'idempotent-replayed', b'true')],
+        })
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def _error(self, send, status, detail):
+        body = dumps({"detail": detail})
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())],
+        })
+        await send({'type': 'http.response.body', 'body': body})
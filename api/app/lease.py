@@ -0,0 +1,80 @@
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+
+class LeaderLease:
+    """Cluster-wide lease that elects one process to run background maintenance.
+
+    The lease is a conditional-write lock item in the node table. The holder
+    renews it every ttl/3 seconds; if the holder dies, another process takes
+    over once the lease expires, so failover takes at most ttl plus one
+    heartbeat interval.
+    """
+
+    def __init__(self, store, name='maintenance', ttl_seconds=30, owner=None):
+        self.store = store
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self.heartbeat_interval = ttl_seconds / 3
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        # Monotonic deadline until which we may act as leader
+        self._held_until = None
+        self._holder = None
+        self._lease_expires_at = None
+
+    @property
+    def is_leader(self):
+        return self._held_until is not None and time.monotonic() < self._held_until
+
+    async def heartbeat(self):
+        """Try to take or renew the lease once"""
+        started = time.monotonic()
+        was_leader = self.is_leader
+        try:
+            lease = await self.store.acquire_lease(self.name, self.owner, self.ttl_seconds)
+        except Exception as e:
+            # Keep leadership until the lease we already hold runs out
+            logger.error(f"Error renewing lease {self.name}: {e}")
+            return self.is_leader
+
+        self._holder = lease.get('lease_owner') if lease else None
+        self._lease_expires_at = lease.get('lease_expires_at') if lease else None
+        if self._holder == self.owner:
+            # Step down one heartbeat early so two leaders never overlap
+            self._held_until = started + self.ttl_seconds - self.heartbeat_interval
+            if not was_leader:
+                logger.info(f"Acquired lease {self.name} as {self.owner}")
+        else:
+            self._held_until = None
+            if was_leader:
+                logger.warning(f"Lost lease {self.name} to {self._holder}")
+        return self.is_leader
+
+    async def run(self):
+        while True:
+            await self.heartbeat()
+            await asyncio.sleep(self.heartbeat_interval)
+
+    async def release(self):
+        if not self.is_leader:
+            return
+        self._held_until = None
+        try:
+            await self.store.release_lease(self.name, self.owner)
+        except Exception as e:
+            logger.error(f"Error releasing lease {self.name}: {e}")
+
+    def status(self):
+        return {
+            "name": self.name,
+            "owner": self.owner,
+            "leader": self.is_leader,
+            "holder": self._holder,
+            "expires_at": self._lease_expires_at,
+        }
@@ -0,0 +1,305 @@
+import bisect
+import contextvars
+import threading
+import time
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Store method currently running in this context ("" outside store calls). DynamoDB
+# calls and store events are labelled with it, so e.g. the Scan calls made while
+# listing nodes show up with method="list_nodes"
+STORE_METHOD = contextvars.ContextVar('store_method', default='')
+
+# DynamoDB operations that accept ReturnConsumedCapacity
+CAPACITY_OPERATIONS = frozenset((
+    'GetItem', 'PutItem', 'UpdateItem', 'DeleteItem', 'Query', 'Scan',
+    'BatchGetItem', 'BatchWriteItem', 'TransactGetItems', 'TransactWriteItems',
+))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values):
+    if not names:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """Base for metrics in the Prometheus text format.
+
+    Every observation is a dict update under the metric's lock, which is
+    cheap enough to run on every request and every DynamoDB call.
+    """
+
+    type = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def samples(self):
+        """Yield (suffix, labelnames, labelvalues, value)"""
+        with self._lock:
+            values = dict(self._values)
+        for labels, value in sorted(values.items()):
+            yield '', self.labelnames, labels, value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type}']
+        for suffix, names, values, value in self.samples():
+            lines.append(f'{self.name}{suffix}{_format_labels(names, values)} {_format_value(value)}')
+        return lines
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                # Per-bucket (not cumulative) counts, sum, count
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def samples(self):
+        with self._lock:
+            values = {labels: (list(state[0]), state[1], state[2]) for labels, state in self._values.items()}
+        names = self.labelnames + ('le',)
+        for labels, (counts, total, count) in sorted(values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                yield '_bucket', names, labels + (_format_value(float(bound)),), cumulative
+            yield '_sum', self.labelnames, labels, total
+            yield '_count', self.labelnames, labels, count
+
+
+class CallbackMetric(Metric):
+    """Metric whose samples are read from callback() at scrape time.
+
+    callback returns a number, or a dict of label value tuples to numbers.
+    """
+
+    def __init__(self, name, documentation, callback, type='gauge', labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self.type = type
+        self.callback = callback
+
+    def samples(self):
+        values = self.callback()
+        if not isinstance(values, dict):
+            values = {(): values}
+        for labels, value in sorted(values.items()):
+            yield '', self.labelnames, labels, value
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            # Re-registering replaces, so an app rebuilt in the same process stays scrapeable
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                lines.append(f'# {metric.name} unavailable: {_escape(e)}')
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+REQUEST_DURATION = REGISTRY.register(Histogram(
+    'rebm_http_request_duration_seconds', 'HTTP request latency by route and status',
+    ('method', 'route', 'status')
+))
+STORE_CALL_DURATION = REGISTRY.register(Histogram(
+    'rebm_store_call_duration_seconds', 'Node store method duration, excluding time queued for a worker',
+    ('method',)
+))
+STORE_CALL_ERRORS = REGISTRY.register(Counter(
+    'rebm_store_call_errors_total', 'Node store method calls that raised', ('method', 'error')
+))
+STORE_COALESCED_CALLS = REGISTRY.register(Counter(
+    'rebm_store_coalesced_calls_total', 'Store reads served by joining an identical call already in flight',
+    ('method',)
+))
+STORE_EVENTS = REGISTRY.register(Counter(
+    'rebm_store_events_total', 'Node writes by event and the store method that made them '
+    '(expire events under release_expired_nodes are expired reservations found by reads)',
+    ('event', 'method')
+))
+DYNAMODB_CALL_DURATION = REGISTRY.register(Histogram(
+    'rebm_dynamodb_call_duration_seconds', 'DynamoDB API call duration including retries',
+    ('operation', 'method')
+))
+DYNAMODB_CALL_ERRORS = REGISTRY.register(Counter(
+    'rebm_dynamodb_call_errors_total', 'DynamoDB API calls that returned an error', ('operation', 'code')
+))
+DYNAMODB_CAPACITY = REGISTRY.register(Counter(
+    'rebm_dynamodb_consumed_capacity_units_total', 'DynamoDB capacity units consumed',
+    ('operation', 'method')
+))
+DYNAMODB_THROTTLED = REGISTRY.register(Counter(
+    'rebm_dynamodb_throttled_total', 'DynamoDB attempts throttled by the table (throttled) '
+    'or refused by the local rate limiter (shed)',
+    ('operation', 'priority', 'outcome')
+))
+DYNAMODB_RATE_LIMIT_WAIT = REGISTRY.register(Histogram(
+    'rebm_dynamodb_rate_limit_wait_seconds', 'Time DynamoDB attempts waited for the local rate limiter',
+    ('operation_class', 'priority')
+))
+IDEMPOTENCY_REQUESTS = REGISTRY.register(Counter(
+    'rebm_idempotency_requests_total', 'Writes carrying an Idempotency-Key by outcome '
+    '(new, replayed from a kept response, mismatch: key reused for a different request)',
+    ('result',)
+))
+EXPIRY_SWEEP_DURATION = REGISTRY.register(Histogram(
+    'rebm_expiry_sweep_duration_seconds', 'Expiry scheduler work by kind (due: releasing due reservations, '
+    'resync: reloading reservations from the store)',
+    ('kind',)
+))
+EXPIRY_RELEASED = REGISTRY.register(Counter(
+    'rebm_expiry_released_nodes_total', 'Reservations released by the expiry scheduler'
+))
+
+
+def track_store_call(fn, *args, **kwargs):
+    """Call a store method, recording its duration under its name"""
+    method = getattr(fn, '__name__', 'unknown')
+    token = STORE_METHOD.set(method)
+    started = time.perf_counter()
+    try:
+        return fn(*args, **kwargs)
+    except Exception as e:
+        STORE_CALL_ERRORS.inc(method, type(e).__name__)
+        raise
+    finally:
+        STORE_CALL_DURATION.observe(time.perf_counter() - started, method)
+        STORE_METHOD.reset(token)
+
+
+def on_store_event(event, node_name, item):
+    """Store listener; runs in the thread (and context) of the store call"""
+    STORE_EVENTS.inc(event, STORE_METHOD.get())
+
+
+def _request_capacity(params, model, **kwargs):
+    if model.name in CAPACITY_OPERATIONS:
+        params.setdefault('ReturnConsumedCapacity', 'TOTAL')
+
+
+def _start_call(context, **kwargs):
+    context['rebm_started'] = time.perf_counter()
+
+
+def _finish_call(http_response, parsed, model, context, **kwargs):
+    started = context.get('rebm_started')
+    method = STORE_METHOD.get()
+    if started is not None:
+        DYNAMODB_CALL_DURATION.observe(time.perf_counter() - started, model.name, method)
+    if http_response.status_code >= 300:
+        DYNAMODB_CALL_ERRORS.inc(model.name, parsed.get('Error', {}).get('Code', 'Unknown'))
+    consumed = parsed.get('ConsumedCapacity')
+    if consumed:
+        if isinstance(consumed, dict):
+            consumed = [consumed]
+        units = sum(entry.get('CapacityUnits', 0) for entry in consumed)
+        DYNAMODB_CAPACITY.inc(model.name, method, amount=units)
+
+
+def instrument_dynamodb_client(client):
+    """Time every call made through a DynamoDB client and record consumed capacity"""
+    events = client.meta.events
+    events.register('provide-client-params.dynamodb', _request_capacity)
+    events.register('before-call.dynamodb', _start_call)
+    events.register('after-call.dynamodb', _finish_call)
+
+
+def _route_template(scope):
+    """The matched route's path template, so /nodes/{node} is one series however many nodes exist"""
+    route = scope.get('route')
+    template = getattr(route, 'path', None)
+    if template is None:
+        return 'unmatched'
+    path = scope.get('path', '')
+    regex = getattr(route, 'path_regex', None)
+    if regex is not None and not regex.match(path):
+        # Routes of a router included with a prefix may carry only their own part
+        for index in range(1, len(path)):
+            if path[index] == '/' and regex.match(path[index:]):
+                return path[:index] + template
+    return template
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording request latency by route template and status.
+
+    Streaming responses (Server-Sent Events) are left out: their duration
+    is the lifetime of the subscription, not request latency.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        response = {'status': 500, 'streaming': False}
+
+        async def send_with_status(message):
+            if message['type'] == 'http.response.start':
+                response['status'] = message['status']
+                response['streaming'] = any(
+                    name == b'content-type' and value.startswith(b'text/event-stream')
+                    for name, value in message.get('headers', ())
+                )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            if not response['streaming']:
+                REQUEST_DURATION.observe(
+                    time.perf_counter() - started, scope['method'], _route_template(scope), str(response['status'])
+                )
@@ -0,0 +1,99 @@
+from typing import Any, Dict, List, Optional, Union
+
+from pydantic import BaseModel, ConfigDict, Field, model_validator
+
+
+class Node(BaseModel):
+    """A node as stored; nodes may carry any extra attributes given at creation"""
+
+    model_config = ConfigDict(extra="allow")
+
+    node: str
+    status: Optional[str] = None
+    reserved_by: Optional[str] = None
+    expires_at: Optional[str] = None
+    updated_at: Optional[str] = None
+
+
+class NodeCreate(BaseModel):
+    model_config = ConfigDict(extra="allow")
+
+    node: Optional[str] = None
+
+    @model_validator(mode="before")
+    @classmethod
+    def _aliases(cls, data):
+        # Accept node_name and name as aliases for node
+        if isinstance(data, dict):
+            data = dict(data)
+            for alias in ("node_name", "name"):
+                if alias in data:
+                    data["node"] = data.pop(alias)
+        return data
+
+
+class ReserveRequest(BaseModel):
+    user: Optional[str] = None
+    # ISO timestamp or Unix timestamp
+    expires_at: Optional[Union[str, float]] = None
+    duration_hours: Optional[float] = None
+
+
+class AllocateRequest(ReserveRequest):
+    count: int = Field(1, ge=1)
+    # Attribute values every allocated node must have
+    match: Dict[str, Any] = Field(default_factory=dict)
+    # Return fewer than count nodes instead of failing
+    partial: bool = False
+
+
+class TelemetryBatch(BaseModel):
+    """Host samples in columns: {"fields": ["time", "load1", ...], "samples": [[1700000000, 0.5, ...], ...]}"""
+
+    fields: List[str]
+    samples: List[List[Optional[float]]] = Field(max_length=1000)
+
+
+class MessageResponse(BaseModel):
+    message: str
+
+
+class CreateResponse(MessageResponse):
+    status: str
+
+
+class ReserveResponse(MessageResponse):
+    expires_at: str
+    item: Node
+
+
+class ReleaseResponse(MessageResponse):
+    item: Node
+
+
+class AllocateResponse(MessageResponse):
+    expires_at: Optional[str] = None
+    nodes: List[Node]
+
+
+class NodeChanges(BaseModel):
+    nodes: List[Node]
+    deleted: List[str]
+    as_of: str
+
+
+class NodeBatch(BaseModel):
+    nodes: List[Node]
+    missing: List[str]
+
+
+class TelemetryAccepted(MessageResponse):
+    accepted: int
+
+
+class TelemetrySeries(BaseModel):
+    node: str
+    window: int
+    resolution: int
+    fields: List[str]
+    points: List[List[Optional[float]]]
@@ -0,0 +1,26 @@
+from decimal import Decimal
+
+import orjson
+from fastapi.responses import JSONResponse
+
+
+def json_default(value):
+    # DynamoDB returns every number as a Decimal
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content):
+    return orjson.dumps(content, default=json_default)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response rendered by orjson, with DynamoDB Decimals handled natively.
+
+    Routes return this directly for large payloads: FastAPI then skips
+    jsonable_encoder, which otherwise walks every item before rendering.
+    """
+
+    def render(self, content):
+        return dumps(content)
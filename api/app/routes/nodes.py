@@ -1,65 +1,355 @@
-from fastapi import APIRouter, HTTPException
+import hashlib
+import math
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Union
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from app.allocator import AllocationError
+from app.models import (
+    AllocateRequest, AllocateResponse, CreateResponse, MessageResponse, Node, NodeBatch,
+    NodeChanges, NodeCreate, ReleaseResponse, ReserveRequest, ReserveResponse,
+    TelemetryAccepted, TelemetryBatch, TelemetrySeries,
+)
+from app.responses import FastJSONResponse, dumps
+from app.store import throttle
+from app.store.exceptions import ChangesExpiredError, NodeConflictError, NodeNotFoundError, StoreThrottledError
+from app.telemetry import FIELDS as TELEMETRY_FIELDS, MAX_VALUE as MAX_TELEMETRY_VALUE, parse_window
 
-def get_router(store):
+DEFAULT_PAGE_SIZE = 100
+MAX_BATCH_NODES = 1000
+# Idle streams get a comment line this often so proxies keep them open
+EVENT_HEARTBEAT_SECONDS = 15
+# Every write to a node changes at least one of these
+ETAG_FIELDS = ('node', 'status', 'reserved_by', 'expires_at', 'updated_at')
+# Retry-After sent with 503s while the store is throttling
+THROTTLED_RETRY_AFTER_SECONDS = 1
+
+def _expires_at(body):
+    expires_at = body.get("expires_at")
+    duration_hours = body.get("duration_hours")
+    if not expires_at:
+        if duration_hours:
+            expires_at = (datetime.now(timezone.utc) + timedelta(hours=duration_hours)).isoformat()
+        else:
+            raise HTTPException(status_code=400, detail="expires_at timestamp or duration_hours is required")
+    return expires_at
+
+def _node_list(body, key="nodes"):
+    names = body.get(key) or []
+    if not isinstance(names, list) or not all(isinstance(n, str) for n in names):
+        raise HTTPException(status_code=400, detail=f"{key} must be a list of node names")
+    if len(names) > MAX_BATCH_NODES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_NODES} nodes per batch")
+    return names
+
+def _bad_request(error):
+    """400 for a store call the request made fail; throttling is left to the app's 503 handler"""
+    if isinstance(error, StoreThrottledError):
+        raise error
+    return HTTPException(status_code=400, detail=str(error))
+
+def _etag(nodes, *extra, projected=False):
+    """Weak validator for a response built from the given nodes.
+
+    Projected nodes (?fields=) may lack the fields every write changes, so
+    all of their returned attributes are hashed instead.
+    """
+    digest = hashlib.sha1()
+    for value in extra:
+        digest.update(f"{value}\0".encode())
+    for node in nodes:
+        if projected:
+            digest.update(dumps(sorted(node.items())))
+        else:
+            digest.update(dumps([node.get(f) for f in ETAG_FIELDS]))
+    return f'W/"{digest.hexdigest()}"'
+
+def _opaque_tag(tag):
+    # If-None-Match uses weak comparison, so W/ prefixes are ignored
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+def _not_modified(request, etag):
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    tags = {_opaque_tag(tag) for tag in header.split(",")}
+    return "*" in tags or _opaque_tag(etag) in tags
+
+def _tagged_response(request, content, nodes, *extra, headers=None, projected=False):
+    """Render content with an ETag, or a bodyless 304 if the client already has it"""
+    etag = _etag(nodes, *extra, projected=projected)
+    headers = {**(headers or {}), "ETag": etag}
+    if _not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+    return FastJSONResponse(content, headers=headers)
+
+def _batch_response(result, atomic):
+    if atomic and any(not r["ok"] for r in result["results"]):
+        return FastJSONResponse(status_code=409, content=result)
+    return FastJSONResponse(result)
+
+def get_router(store, events=None, allocator=None, telemetry=None):
     router = APIRouter()
 
-    @router.get("/")
-    async def list_nodes():
-        return store.list_nodes()
+    # Node-returning routes hand back FastJSONResponse directly: response_model
+    # documents the shape without re-validating thousands of items per request
+    @router.get("/", response_model=Union[List[Node], NodeChanges])
+    async def list_nodes(
+        request: Request,
+        status: Optional[str] = None,
+        reserved_by: Optional[str] = None,
+        fields: Optional[str] = None,
+        limit: Optional[int] = Query(None, ge=1, le=1000),
+        cursor: Optional[str] = None,
+        since: Optional[str] = None,
+    ):
+        if since is not None:
+            if status or reserved_by or fields or limit or cursor:
+                raise HTTPException(status_code=400, detail="since cannot be combined with filters or paging")
+            return await _list_changes(since)
+
+        field_list = [f.strip() for f in fields.split(',') if f.strip()] if fields else None
+        if limit is None and cursor is None:
+            nodes = await store.list_nodes(status=status, reserved_by=reserved_by, fields=field_list)
+            return _tagged_response(request, nodes, nodes, fields, projected=bool(field_list))
+
+        try:
+            nodes, next_cursor = await store.list_nodes_page(
+                limit or DEFAULT_PAGE_SIZE,
+                cursor,
+                status=status,
+                reserved_by=reserved_by,
+                fields=field_list,
+            )
+        except Exception as e:
+            raise _bad_request(e)
+        headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+        return _tagged_response(request, nodes, nodes, fields, next_cursor, headers=headers, projected=bool(field_list))
+
+    async def _list_changes(since):
+        """Delta sync: {"nodes": [changed...], "deleted": [names...], "as_of": <next since>}"""
+        try:
+            return FastJSONResponse(await store.list_changes(since))
+        except ChangesExpiredError as e:
+            raise HTTPException(status_code=410, detail=str(e))
+        except Exception as e:
+            raise _bad_request(e)
+
+    if events is not None:
+        @router.get("/events")
+        async def node_events(request: Request, node: Optional[str] = None, since: Optional[int] = None):
+            """Server-Sent Events stream of node changes (create/reserve/release/delete/expire/update).
+
+            Resume with ?since=<seq> or the Last-Event-ID header. A "reset" event
+            means events were missed and the client should reload its state.
+            """
+            last_event_id = request.headers.get("last-event-id")
+            if since is None and last_event_id and last_event_id.isdigit():
+                since = int(last_event_id)
+            subscription, backlog = events.subscribe(node=node, since=since)
+
+            async def stream():
+                try:
+                    if not backlog:
+                        # Lets clients that start fresh resume from here later
+                        yield events.format_sse({"seq": events.last_seq, "type": "ready", "node": node, "item": None, "at": None})
+                    for event in backlog:
+                        yield events.format_sse(event)
+                    while True:
+                        event = await subscription.next(timeout=EVENT_HEARTBEAT_SECONDS)
+                        if subscription.overflowed:
+                            yield events.format_sse(events.reset_event())
+                            return
+                        if event is None:
+                            yield ": keepalive\n\n"
+                            continue
+                        yield events.format_sse(event)
+                finally:
+                    events.unsubscribe(subscription)
+
+            return StreamingResponse(
+                stream(),
+                media_type="text/event-stream",
+                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+            )
+
+    @router.get("/batch", response_model=NodeBatch)
+    async def get_nodes(names: str = ""):
+        """Fetch several nodes at once: /nodes/batch?names=a,b,c"""
+        return await _get_nodes([n.strip() for n in names.split(',') if n.strip()])
+
+    @router.post("/batch/get", response_model=NodeBatch)
+    async def get_nodes_post(body: dict):
+        """Same as GET /nodes/batch for lists too long for a query string: {"names": [...]}"""
+        return await _get_nodes(_node_list(body, "names"))
 
-    @router.get("/{node}")
-    async def get_node(node: str):
-        node_data = store.get_node(node)
+    async def _get_nodes(names):
+        if len(names) > MAX_BATCH_NODES:
+            raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_NODES} nodes per batch")
+        try:
+            nodes = await store.get_nodes(names)
+        except Exception as e:
+            raise _bad_request(e)
+        found = {n['node'] for n in nodes}
+        return FastJSONResponse({"nodes": nodes, "missing": [n for n in dict.fromkeys(names) if n not in found]})
+
+    @router.get("/{node}", response_model=Node)
+    async def get_node(node: str, request: Request):
+        node_data = await store.get_node(node)
         if not node_data:
             raise HTTPException(status_code=404, detail="Node not found")
-        return node_data
-
-    @router.post("/")
-    async def create_node(body: dict):
-        # Ensure the node field is set correctly
-        if 'node_name' in body:
-            body['node'] = body.pop('node_name')
-        if 'name' in body:
-            body['node'] = body.pop('name')
-        return store.create_node(body)
-
-    @router.delete("/{node}")
-    async def delete_node(node: str):
+        return _tagged_response(request, node_data, [node_data])
+
+    @router.post("/", response_model=CreateResponse)
+    async def create_node(body: NodeCreate):
         try:
-            return store.delete_node(node)
+            return await store.create_node(body.model_dump())
         except Exception as e:
-            raise HTTPException(status_code=400, detail=str(e))
+            raise _bad_request(e)
 
-    @router.post("/{node}/reserve")
-    async def reserve_node(node: str, body: dict):
-        user = body.get("user")
-        expires_at = body.get("expires_at")
-        duration_hours = body.get("duration_hours")
+    # Batch routes are registered before /{node}/... so "batch" is never taken for a node name
+    @router.post("/batch")
+    async def batch_write_nodes(body: dict):
+        """Create and/or delete many nodes: {"create": [...], "delete": [...], "atomic": false}"""
+        create = body.get("create") or []
+        if not isinstance(create, list) or not all(isinstance(n, dict) for n in create):
+            raise HTTPException(status_code=400, detail="create must be a list of node objects")
+        delete = _node_list(body, "delete")
+        if len(create) + len(delete) > MAX_BATCH_NODES:
+            raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_NODES} nodes per batch")
+        atomic = bool(body.get("atomic", False))
+        try:
+            result = await store.write_nodes(
+                create=[NodeCreate.model_validate(n).model_dump() for n in create],
+                delete=delete,
+                atomic=atomic
+            )
+        except Exception as e:
+            raise _bad_request(e)
+        return _batch_response(result, atomic)
 
+    @router.post("/batch/reserve")
+    async def batch_reserve_nodes(body: dict):
+        """Reserve many nodes: {"nodes": [...], "user": ..., "duration_hours": ..., "atomic": false}"""
+        names = _node_list(body)
+        user = body.get("user")
         if not user:
             raise HTTPException(status_code=400, detail="User is required")
-        if not expires_at:
-            if duration_hours:
-                from datetime import datetime, timedelta, timezone
-                expires_at = (datetime.now(timezone.utc) + timedelta(hours=duration_hours)).isoformat()
-            else:
-                raise HTTPException(status_code=400, detail="expires_at timestamp or duration_hours is required")
+        expires_at = _expires_at(body)
+        atomic = bool(body.get("atomic", False))
+        try:
+            result = await store.reserve_nodes(names, user, expires_at, atomic=atomic)
+        except Exception as e:
+            raise _bad_request(e)
+        return _batch_response(result, atomic)
+
+    @router.post("/batch/release")
+    async def batch_release_nodes(body: dict):
+        """Release many nodes: {"nodes": [...], "atomic": false}"""
+        names = _node_list(body)
+        atomic = bool(body.get("atomic", False))
         try:
-            return store.reserve_node(node, user, expires_at)
+            result = await store.release_nodes(names, atomic=atomic)
         except Exception as e:
-            raise HTTPException(status_code=400, detail=str(e))
+            raise _bad_request(e)
+        return _batch_response(result, atomic)
 
-    @router.post("/{node}/release")
+    if allocator is not None:
+        @router.post("/allocate", response_model=AllocateResponse)
+        async def allocate_nodes(body: AllocateRequest):
+            """Reserve any count free nodes with matching attributes:
+            {"count": 2, "match": {"gpu": "a100"}, "user": ..., "duration_hours": ..., "partial": false}
+            """
+            if not body.user:
+                raise HTTPException(status_code=400, detail="User is required")
+            if body.count > MAX_BATCH_NODES:
+                raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_NODES} nodes per batch")
+            expires_at = _expires_at(body.model_dump())
+            try:
+                result = await allocator.allocate(body.count, body.match, body.user, expires_at, partial=body.partial)
+            except AllocationError as e:
+                raise HTTPException(status_code=409, detail=str(e))
+            except Exception as e:
+                raise _bad_request(e)
+            return FastJSONResponse(result)
+
+    @router.delete("/{node}", response_model=MessageResponse)
+    async def delete_node(node: str):
+        try:
+            return await store.delete_node(node)
+        except NodeNotFoundError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+        except NodeConflictError as e:
+            raise HTTPException(status_code=409, detail=str(e))
+        except Exception as e:
+            raise _bad_request(e)
+
+    @router.post("/{node}/reserve", response_model=ReserveResponse)
+    async def reserve_node(node: str, body: ReserveRequest):
+        if not body.user:
+            raise HTTPException(status_code=400, detail="User is required")
+        expires_at = _expires_at(body.model_dump())
+        try:
+            return FastJSONResponse(await store.reserve_node(node, body.user, expires_at))
+        except NodeNotFoundError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+        except NodeConflictError as e:
+            raise HTTPException(status_code=409, detail=str(e))
+        except Exception as e:
+            raise _bad_request(e)
+
+    @router.post("/{node}/release", response_model=ReleaseResponse)
     async def release_node(node: str):
         try:
-            return store.release_node(node)
+            return FastJSONResponse(await store.release_node(node))
+        except NodeNotFoundError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+        except NodeConflictError as e:
+            raise HTTPException(status_code=409, detail=str(e))
         except Exception as e:
-            raise HTTPException(status_code=400, detail=str(e))
+            raise _bad_request(e)
+
+    if telemetry is not None:
+        @router.post("/{node}/metrics", response_model=TelemetryAccepted)
+        async def report_node_metrics(node: str, body: TelemetryBatch):
+            """Record host samples sent by the node's agent; unknown fields are ignored"""
+            if "time" not in body.fields:
+                raise HTTPException(status_code=400, detail="fields must include time")
+            if any(len(row) != len(body.fields) for row in body.samples):
+                raise HTTPException(status_code=400, detail="Every sample needs one value per field")
+            # The JSON parser accepts NaN and Infinity (and a 422 could not echo them back)
+            if any(v is not None and not (math.isfinite(v) and abs(v) <= MAX_TELEMETRY_VALUE)
+                   for row in body.samples for v in row):
+                raise HTTPException(status_code=400, detail=f"Sample values must be finite numbers up to {MAX_TELEMETRY_VALUE:g}")
+            if not await store.get_node(node):
+                raise HTTPException(status_code=404, detail="Node not found")
+            columns = [(i, name) for i, name in enumerate(body.fields) if name in TELEMETRY_FIELDS]
+            t = body.fields.index("time")
+            samples = [
+                {"time": row[t], **{name: row[i] for i, name in columns}}
+                for row in body.samples if row[t] is not None
+            ]
+            accepted = telemetry.add(node, samples)
+            return {"message": f"Recorded {accepted} of {len(body.samples)} samples", "accepted": accepted}
+
+        @router.get("/{node}/metrics", response_model=TelemetrySeries)
+        async def get_node_metrics(node: str, window: str = "1h"):
+            """Host samples for the last window ("15m", "6h", "7d"), downsampled to fit it"""
+            try:
+                seconds = parse_window(window)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            if not await store.get_node(node):
+                raise HTTPException(status_code=404, detail="Node not found")
+            return FastJSONResponse(telemetry.query(node, seconds))
 
     @router.post("/cleanup/expired")
     async def cleanup_expired_nodes():
         """Manually trigger cleanup of expired nodes"""
-        return store.cleanup_expired_nodes()
+        # A bulk sweep; interactive requests keep priority for store capacity
+        with throttle.background():
+            return await store.cleanup_expired_nodes()
 
     return router
 
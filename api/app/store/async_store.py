@@ -0,0 +1,143 @@
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from app import metrics
+
+class AsyncNodeStore:
+    """Async facade over a synchronous node store.
+
+    Blocking store calls run on a bounded thread pool, so a slow DynamoDB
+    round trip only occupies one worker thread instead of stalling every
+    request on the event loop.
+
+    Concurrent identical get_node and list_nodes calls are coalesced: the
+    first one runs and the others await its result (single flight). The
+    shared result must not be modified. A write to the store stops later
+    callers from joining a read that started before it, so a client always
+    sees its own writes.
+    """
+
+    def __init__(self, store, max_workers=32):
+        self.store = store
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix='rebm-store'
+        )
+        self._flights = {}  # call key -> task, accessed from the event loop only
+        self._loop = None
+        store.add_listener(self._on_store_event)
+
+    async def _run(self, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        # Carry context variables over to the worker thread
+        context = contextvars.copy_context()
+        call = functools.partial(context.run, metrics.track_store_call, fn, *args, **kwargs)
+        return await loop.run_in_executor(self._executor, call)
+
+    async def _single_flight(self, key, fn, *args, **kwargs):
+        """Run fn once for concurrent calls with the same key and share its result"""
+        flight = self._flights.get(key)
+        if flight is None:
+            self._loop = asyncio.get_running_loop()
+            flight = asyncio.ensure_future(self._run(fn, *args, **kwargs))
+            self._flights[key] = flight
+            flight.add_done_callback(functools.partial(self._land, key))
+        else:
+            metrics.STORE_COALESCED_CALLS.inc(key[0])
+        # A caller that goes away (client disconnect) must not cancel the call for the others
+        return await asyncio.shield(flight)
+
+    def _land(self, key, flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        if not flight.cancelled():
+            # Marks the exception retrieved even if every caller went away
+            flight.exception()
+
+    def _on_store_event(self, event, node_name, item):
+        # Runs in the writing thread, before the write returns to its caller
+        loop = self._loop
+        if loop is None:
+            return
+        try:
+            loop.call_soon_threadsafe(self._close_flights, node_name)
+        except RuntimeError:
+            # The loop has been closed
+            pass
+
+    def _close_flights(self, node_name):
+        """Stop new callers from joining reads that may predate a write to node_name"""
+        for key in [key for key in self._flights if key[0] == 'list_nodes' or key == ('get_node', node_name)]:
+            del self._flights[key]
+
+    def add_listener(self, listener):
+        self.store.add_listener(listener)
+
+    async def get_node(self, node_name):
+        return await self._single_flight(('get_node', node_name), self.store.get_node, node_name)
+
+    async def get_nodes(self, node_names):
+        return await self._run(self.store.get_nodes, node_names)
+
+    async def list_nodes(self, status=None, reserved_by=None, fields=None):
+        return await self._single_flight(
+            ('list_nodes', status, reserved_by, tuple(fields) if fields else None),
+            self.store.list_nodes, status=status, reserved_by=reserved_by, fields=fields
+        )
+
+    async def list_nodes_page(self, limit, cursor=None, status=None, reserved_by=None, fields=None):
+        return await self._run(
+            self.store.list_nodes_page, limit, cursor,
+            status=status, reserved_by=reserved_by, fields=fields
+        )
+
+    async def list_changes(self, since):
+        return await self._run(self.store.list_changes, since)
+
+    async def create_node(self, node_data):
+        return await self._run(self.store.create_node, node_data)
+
+    async def delete_node(self, node_name):
+        return await self._run(self.store.delete_node, node_name)
+
+    async def reserve_node(self, node_name, user, expires_at_timestamp):
+        return await self._run(self.store.reserve_node, node_name, user, expires_at_timestamp)
+
+    async def release_node(self, node_name):
+        return await self._run(self.store.release_node, node_name)
+
+    async def write_nodes(self, create=None, delete=None, atomic=False):
+        return await self._run(self.store.write_nodes, create=create, delete=delete, atomic=atomic)
+
+    async def reserve_nodes(self, node_names, user, expires_at_timestamp, atomic=False):
+        return await self._run(self.store.reserve_nodes, node_names, user, expires_at_timestamp, atomic=atomic)
+
+    async def release_nodes(self, node_names, atomic=False):
+        return await self._run(self.store.release_nodes, node_names, atomic=atomic)
+
+    async def release_expired(self, node_name, expires_at):
+        return await self._run(self.store.release_expired, node_name, expires_at)
+
+    async def release_expired_nodes(self, reservations):
+        return await self._run(self.store.release_expired_nodes, reservations)
+
+    async def list_reservations(self):
+        return await self._run(self.store.list_reservations)
+
+    async def cleanup_expired_nodes(self):
+        return await self._run(self.store.cleanup_expired_nodes)
+
+    async def acquire_lease(self, name, owner, ttl_seconds):
+        return await self._run(self.store.acquire_lease, name, owner, ttl_seconds)
+
+    async def release_lease(self, name, owner):
+        return await self._run(self.store.release_lease, name, owner)
+
+    async def get_lease(self, name):
+        return await self._run(self.store.get_lease, name)
+
+    def shutdown(self, flush_timeout=5):
+        # Auto-releases queued by reads are cheap to finish and save the next reader a write
+        self.store.flush_releases(flush_timeout)
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,279 @@
+import base64
+import json
+import logging
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta, timezone
+from .deferred import DeferredReleaser
+from .exceptions import ChangesExpiredError, NodeConflictError, NodeNotFoundError
+
+logger = logging.getLogger(__name__)
+
+# Keys with this prefix hold internal bookkeeping (e.g. leases), not nodes
+SYSTEM_PREFIX = '__rebm__/'
+
+# How long deletions are remembered for delta sync (?since=)
+TOMBSTONE_TTL_SECONDS = 7 * 24 * 3600
+# Margin for clock differences between API servers writing updated_at
+CHANGES_CLOCK_SKEW_SECONDS = 5
+
+
+class LoopListener:
+    """Base for store listeners whose state lives on an event loop.
+
+    Stores call listeners in the thread that made the write, usually a store
+    worker thread. on_store_event hands each event to _apply_event on the
+    loop in self._loop, which subclasses set once they run; events from
+    before that, or after the loop closed, are dropped.
+    """
+
+    _loop = None
+
+    def on_store_event(self, event, node_name, item):
+        loop = self._loop
+        if loop is None:
+            return
+        try:
+            loop.call_soon_threadsafe(self._apply_event, event, node_name, item)
+        except RuntimeError:
+            # The loop has been closed
+            pass
+
+    def _apply_event(self, event, node_name, item):
+        raise NotImplementedError
+
+
+class NodeStore(ABC):
+    """Interface every node store backend implements.
+
+    Nodes are dicts with node, status ('available' or 'reserved'),
+    reserved_by, expires_at and updated_at (ISO timestamps in UTC) plus any
+    extra attributes given at creation. A reservation whose expires_at has
+    passed counts as available everywhere, even before it is released;
+    reads that find one report it as available and leave the release write
+    to a background writer.
+
+    Writes are conditional: reserve_node raises NodeConflictError when the
+    node is held by a live reservation and every single-node write raises
+    NodeNotFoundError for a missing node. Listeners registered with
+    add_listener are called after every successful write.
+    """
+
+    def __init__(self):
+        self._listeners = []
+        self._releaser = DeferredReleaser(self)
+
+    def _isoformat(self, dt):
+        return dt.astimezone(timezone.utc).isoformat()
+
+    def _now(self):
+        return datetime.now(timezone.utc)
+
+    def add_listener(self, listener):
+        """Register listener(event, node_name, item), called after every successful write"""
+        self._listeners.append(listener)
+
+    def _notify(self, event, node_name, item=None):
+        for listener in self._listeners:
+            try:
+                listener(event, node_name, item)
+            except Exception:
+                logger.exception(f"Store listener failed on {event} for {node_name}")
+
+    def _encode_cursor(self, key):
+        if not key:
+            return None
+        return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+    def _decode_cursor(self, cursor):
+        try:
+            key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        except (ValueError, TypeError):
+            raise Exception("Invalid cursor")
+        if not isinstance(key, dict) or not isinstance(key.get('node'), str):
+            raise Exception("Invalid cursor")
+        return {'node': key['node']}
+
+    def _present(self, item, fields=None):
+        item = self._check_expired(item)
+        if fields:
+            item = {k: v for k, v in item.items() if k == 'node' or k in fields}
+        return item
+
+    def _check_expired(self, item):
+        if item.get('expires_at'):
+            expires_at = datetime.fromisoformat(item['expires_at'])
+            if expires_at < self._now():
+                # Auto-release in the background; the caller sees the effective state now
+                self._releaser.submit(item['node'], item['expires_at'])
+                item['status'] = 'available'
+                item['reserved_by'] = None
+                item['expires_at'] = None
+        return item
+
+    @property
+    def pending_releases(self):
+        """Auto-releases queued by reads and not yet written"""
+        return self._releaser.pending
+
+    def flush_releases(self, timeout=None):
+        """Wait for auto-releases queued by reads to be written; returns False on timeout"""
+        return self._releaser.flush(timeout)
+
+    def _check_name(self, node_name):
+        # Names under SYSTEM_PREFIX are internal rows (leases, tombstones)
+        if not node_name or node_name.startswith(SYSTEM_PREFIX):
+            raise Exception("Invalid node name")
+        return node_name
+
+    def _node_names(self, node_names):
+        """Batch node names, deduplicated and checked"""
+        return [self._check_name(name) for name in dict.fromkeys(node_names)]
+
+    def _new_node(self, node_data):
+        self._check_name(node_data.get('node'))
+        # Set default values for new nodes
+        node_data['status'] = 'available'  # Nodes are unreserved by default
+        node_data['reserved_by'] = None
+        node_data['expires_at'] = None
+        node_data['updated_at'] = self._isoformat(self._now())
+        return node_data
+
+    def _parse_expires_at(self, expires_at_timestamp):
+        # Parse the timestamp - expect ISO format string
+        try:
+            if isinstance(expires_at_timestamp, str):
+                # Handle both timezone-aware and timezone-naive ISO strings
+                expires_at = datetime.fromisoformat(expires_at_timestamp)
+                # If the datetime is timezone-naive, assume it's in UTC
+                if expires_at.tzinfo is None:
+                    expires_at = expires_at.replace(tzinfo=timezone.utc)
+            else:
+                expires_at = datetime.fromtimestamp(expires_at_timestamp, tz=timezone.utc)
+        except (ValueError, TypeError):
+            raise Exception("Invalid timestamp format. Use ISO format string or Unix timestamp")
+
+        # Check if the expiration time is in the future
+        if expires_at <= self._now():
+            raise Exception("Expiration time must be in the future")
+        return expires_at
+
+    def _parse_since(self, since):
+        try:
+            if isinstance(since, str) and not since.replace('.', '', 1).isdigit():
+                parsed = datetime.fromisoformat(since)
+                if parsed.tzinfo is None:
+                    parsed = parsed.replace(tzinfo=timezone.utc)
+            else:
+                parsed = datetime.fromtimestamp(float(since), tz=timezone.utc)
+        except (ValueError, TypeError, OverflowError):
+            raise Exception("Invalid since. Use ISO format string or Unix timestamp")
+        return parsed
+
+    def _changes_window(self, since):
+        """Return (since, now, as_of) ISO strings for list_changes"""
+        since = self._parse_since(since)
+        now = self._now()
+        if since < now - timedelta(seconds=TOMBSTONE_TTL_SECONDS):
+            raise ChangesExpiredError("Deletions are not kept that long, reload the full node list")
+        as_of = now - timedelta(seconds=CHANGES_CLOCK_SKEW_SECONDS)
+        return self._isoformat(since), self._isoformat(now), self._isoformat(as_of)
+
+    def _reserve_failure(self, old_item):
+        if old_item:
+            return NodeConflictError("Node is already reserved")
+        return NodeNotFoundError("Node does not exist")
+
+    def _results(self, names, errors):
+        return [
+            {"node": name, "ok": False, "error": errors[name]} if name in errors
+            else {"node": name, "ok": True}
+            for name in names
+        ]
+
+    def _batch_names(self, create, delete):
+        names = [node['node'] for node in create] + [self._check_name(name) for name in delete]
+        if len(set(names)) != len(names):
+            raise Exception("A node may appear only once per batch")
+        return names
+
+    @abstractmethod
+    def get_node(self, node_name):
+        """Return the node, or None if it does not exist"""
+
+    @abstractmethod
+    def get_nodes(self, node_names):
+        """Return the nodes that exist, in the order requested"""
+
+    @abstractmethod
+    def list_nodes(self, status=None, reserved_by=None, fields=None):
+        """Return every node matching the filters, with only the requested fields"""
+
+    @abstractmethod
+    def list_nodes_page(self, limit, cursor=None, status=None, reserved_by=None, fields=None):
+        """Return up to limit nodes and an opaque cursor for the next page (or None)"""
+
+    @abstractmethod
+    def list_changes(self, since):
+        """Return {"nodes": [...], "deleted": [...], "as_of": ...} for changes after since.
+
+        Raises ChangesExpiredError if since is older than deletions are kept.
+        """
+
+    @abstractmethod
+    def list_reservations(self):
+        """Return node and expires_at for every node that holds a reservation"""
+
+    @abstractmethod
+    def create_node(self, node_data):
+        """Create (or replace) a node as available"""
+
+    @abstractmethod
+    def delete_node(self, node_name):
+        """Delete a node and remember the deletion for list_changes"""
+
+    @abstractmethod
+    def reserve_node(self, node_name, user, expires_at_timestamp):
+        """Reserve an available node; returns message, expires_at and the updated item"""
+
+    @abstractmethod
+    def release_node(self, node_name):
+        """Make a node available; returns message and the updated item"""
+
+    @abstractmethod
+    def release_expired(self, node_name, expires_at):
+        """Release a reservation only if it still carries the given expiry; returns a bool"""
+
+    @abstractmethod
+    def release_expired_nodes(self, reservations):
+        """Release many reservations ({node, expires_at} dicts) that still carry their expiry.
+
+        Returns the names of the nodes released.
+        """
+
+    @abstractmethod
+    def write_nodes(self, create=None, delete=None, atomic=False):
+        """Create and delete many nodes; returns message and per-node results"""
+
+    @abstractmethod
+    def reserve_nodes(self, node_names, user, expires_at_timestamp, atomic=False):
+        """Reserve many nodes; returns message, expires_at and per-node results"""
+
+    @abstractmethod
+    def release_nodes(self, node_names, atomic=False):
+        """Release many nodes; returns message and per-node results"""
+
+    @abstractmethod
+    def cleanup_expired_nodes(self):
+        """Release every reservation that has already expired"""
+
+    @abstractmethod
+    def acquire_lease(self, name, owner, ttl_seconds):
+        """Take or renew a named lease; returns the current lease item (check lease_owner)"""
+
+    @abstractmethod
+    def release_lease(self, name, owner):
+        """Give up a lease held by owner; returns whether it was released"""
+
+    @abstractmethod
+    def get_lease(self, name):
+        """Return the lease item, or None"""
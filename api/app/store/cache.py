@@ -0,0 +1,108 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+
+class CachingNodeStore:
+    """Read-through LRU cache for node lookups in front of another node store.
+
+    Entries live for at most ttl_seconds and never past the node's own
+    expires_at, so an expiring reservation is always re-read. Every write
+    that goes through the wrapped store invalidates the affected node.
+    Methods other than get_node/get_nodes are passed straight through.
+    """
+
+    def __init__(self, store, max_entries=1024, ttl_seconds=30):
+        self.store = store
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # node -> (monotonic deadline, item)
+        # Bumped on every invalidation so a read that raced a write is not cached
+        self._generation = 0
+        self._lock = threading.Lock()
+        store.add_listener(self._on_store_event)
+
+    def __getattr__(self, name):
+        return getattr(self.store, name)
+
+    def _on_store_event(self, event, node_name, item):
+        self.invalidate(node_name)
+
+    def invalidate(self, node_name=None):
+        with self._lock:
+            self._generation += 1
+            if node_name is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(node_name, None)
+
+    def _lifetime(self, item):
+        lifetime = self.ttl_seconds
+        if item.get('expires_at'):
+            expires_at = datetime.fromisoformat(item['expires_at'])
+            if expires_at.tzinfo is None:
+                expires_at = expires_at.replace(tzinfo=timezone.utc)
+            remaining = (expires_at - datetime.now(timezone.utc)).total_seconds()
+            lifetime = min(lifetime, remaining)
+        return lifetime
+
+    def _lookup(self, node_name):
+        # Caller holds the lock
+        entry = self._entries.get(node_name)
+        if entry and entry[0] > time.monotonic():
+            self._entries.move_to_end(node_name)
+            self.hits += 1
+            return dict(entry[1])
+        self.misses += 1
+        return None
+
+    def _remember(self, items, generation):
+        with self._lock:
+            if generation != self._generation:
+                return
+            for item in items:
+                lifetime = self._lifetime(item)
+                if lifetime <= 0:
+                    continue
+                self._entries[item['node']] = (time.monotonic() + lifetime, dict(item))
+                self._entries.move_to_end(item['node'])
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_node(self, node_name):
+        with self._lock:
+            cached = self._lookup(node_name)
+            generation = self._generation
+        if cached:
+            return cached
+
+        item = self.store.get_node(node_name)
+        if item:
+            self._remember([item], generation)
+        return item
+
+    def get_nodes(self, node_names):
+        names = list(dict.fromkeys(node_names))
+        with self._lock:
+            cached = {name: self._lookup(name) for name in names}
+            generation = self._generation
+        missing = [name for name, item in cached.items() if not item]
+        if missing:
+            fetched = self.store.get_nodes(missing)
+            self._remember(fetched, generation)
+            for item in fetched:
+                cached[item['node']] = item
+        return [cached[name] for name in names if cached.get(name)]
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
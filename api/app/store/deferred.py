@@ -0,0 +1,79 @@
+import logging
+import threading
+import time
+from app import metrics
+from . import throttle
+
+logger = logging.getLogger(__name__)
+
+# Most releases sent to the store in one call
+MAX_BATCH = 100
+# How long the writer waits after the first queued release so a burst of reads coalesces
+LINGER_SECONDS = 0.05
+
+
+class DeferredReleaser:
+    """Writes the auto-releases found on the read path in the background.
+
+    A read that comes across an expired reservation already reports the
+    node as available; the release itself is queued here instead of being
+    written before the response. A single daemon thread (started on first
+    use) dedupes queued releases by node and sends them in batches through
+    store.release_expired_nodes at background priority, so read latency no
+    longer depends on how many reservations expired since the last sweep.
+
+    Releases are conditional on expires_at, so a stale or repeated one is a
+    no-op, and one lost to a failure is picked up by the next read or by
+    the expiry scheduler.
+    """
+
+    def __init__(self, store, max_batch=MAX_BATCH, linger=LINGER_SECONDS):
+        self.store = store
+        self.max_batch = max_batch
+        self.linger = linger
+        self._pending = {}  # node -> expires_at, in arrival order
+        self._in_flight = {}
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def submit(self, node_name, expires_at):
+        with self._cond:
+            if self._pending.get(node_name) == expires_at or self._in_flight.get(node_name) == expires_at:
+                return
+            self._pending[node_name] = expires_at
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='rebm-releaser', daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+
+    @property
+    def pending(self):
+        with self._cond:
+            return len(self._pending) + len(self._in_flight)
+
+    def flush(self, timeout=None):
+        """Wait until every queued release has been written; returns False on timeout"""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._pending and not self._in_flight, timeout)
+
+    def _take_batch(self):
+        with self._cond:
+            names = list(self._pending)[:self.max_batch]
+            self._in_flight = {name: self._pending.pop(name) for name in names}
+            return [{'node': name, 'expires_at': expires_at} for name, expires_at in self._in_flight.items()]
+
+    def _run(self):
+        with throttle.background():
+            while True:
+                with self._cond:
+                    self._cond.wait_for(lambda: self._pending)
+                time.sleep(self.linger)
+                batch = self._take_batch()
+                try:
+                    metrics.track_store_call(self.store.release_expired_nodes, batch)
+                except Exception:
+                    logger.exception(f"Deferred release of {len(batch)} expired nodes failed")
+                finally:
+                    with self._cond:
+                        self._in_flight = {}
+                        self._cond.notify_all()
@@ -1,150 +1,592 @@
 import boto3
-from datetime import datetime, timedelta, timezone
-from decimal import Decimal
-
-class DynamoDBNodeStore:
-    def __init__(self, table_name, region_name='us-west-1'):
-        self.dynamodb = boto3.resource('dynamodb', region_name=region_name)
-        self.table = self.dynamodb.Table(table_name)
-
-    def _isoformat(self, dt):
-        return dt.astimezone(timezone.utc).isoformat()
-
-    def _now(self):
-        return datetime.now(timezone.utc)
-
-    def _check_expired(self, item):
-        if item.get('expires_at'):
-            expires_at = datetime.fromisoformat(item['expires_at'])
-            if expires_at < self._now():
-                # Auto-release
-                self.table.update_item(
-                    Key={'node': item['node']},
-                    UpdateExpression="""
-                        SET #s = :s, reserved_by = :u, expires_at = :e, updated_at = :t
-                    """,
-                    ExpressionAttributeNames={'#s': 'status'},
-                    ExpressionAttributeValues={
-                        ':s': 'available',
-                        ':u': None,
-                        ':e': None,
-                        ':t': self._isoformat(self._now())
-                    }
+import contextvars
+import logging
+import random
+import threading
+import time
+from boto3.dynamodb.conditions import Attr
+from boto3.dynamodb.types import TypeDeserializer
+from botocore.config import Config
+from botocore.exceptions import ClientError
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from app import metrics
+from .base import SYSTEM_PREFIX, TOMBSTONE_TTL_SECONDS, NodeStore
+from .exceptions import NodeConflictError, NodeNotFoundError
+from .throttle import RequestGovernor
+
+logger = logging.getLogger(__name__)
+
+TOMBSTONE_PREFIX = f'{SYSTEM_PREFIX}deleted/'
+
+# DynamoDB's per-call limit for TransactWriteItems
+MAX_TRANSACT_ITEMS = 100
+TRANSACT_ATTEMPTS = 3
+TRANSACT_RETRY_DELAY = 0.05
+# Cancellation reasons worth resubmitting the item for
+RETRYABLE_CANCELLATION_CODES = ('TransactionConflict', 'ThrottlingError', 'ProvisionedThroughputExceeded')
+
+# DynamoDB's per-call limit for BatchGetItem
+MAX_BATCH_GET_ITEMS = 100
+BATCH_GET_ATTEMPTS = 5
+BATCH_GET_BACKOFF = 0.05
+
+class DynamoDBNodeStore(NodeStore):
+    def __init__(self, table_name, region_name='us-west-1', scan_segments=1, pool_connections=10,
+                 read_rate=1000, write_rate=500, scan_rate=50):
+        super().__init__()
+        self.table_name = table_name
+        self.region_name = region_name
+        # Keep-alive connections are reused across calls made from the same thread
+        self._client_config = Config(
+            max_pool_connections=pool_connections,
+            tcp_keepalive=True,
+            connect_timeout=3,
+            read_timeout=10,
+            retries={'mode': 'standard', 'max_attempts': 3}
+        )
+        # Number of parallel scan segments used by full-table scans
+        self.scan_segments = max(1, int(scan_segments))
+        self._scan_pool = None
+        self._scan_pool_lock = threading.Lock()
+        self._local = threading.local()
+        # Per-process request rates (calls/second) by operation class, lowered
+        # automatically while DynamoDB throttles
+        self.governor = RequestGovernor(read_rate=read_rate, write_rate=write_rate, scan_rate=scan_rate)
+
+    @property
+    def table(self):
+        # boto3 resources are not thread-safe, so every thread gets its own
+        table = getattr(self._local, 'table', None)
+        if table is None:
+            session = boto3.session.Session()
+            dynamodb = session.resource('dynamodb', region_name=self.region_name, config=self._client_config)
+            table = dynamodb.Table(self.table_name)
+            metrics.instrument_dynamodb_client(table.meta.client)
+            self.governor.instrument(table.meta.client)
+            self._local.table = table
+        return table
+
+    def _deserialize(self, item):
+        # Items attached to ClientErrors come back in low-level wire format
+        if not item:
+            return None
+        return {key: TypeDeserializer().deserialize(value) for key, value in item.items()}
+
+    def _is_condition_failure(self, error):
+        return error.response.get('Error', {}).get('Code') == 'ConditionalCheckFailedException'
+
+    def _scan_pages(self, **kwargs):
+        """Scan until LastEvaluatedKey is exhausted and return every item"""
+        items = []
+        while True:
+            response = self.table.scan(**kwargs)
+            items.extend(response.get('Items', []))
+            last_key = response.get('LastEvaluatedKey')
+            if not last_key:
+                return items
+            kwargs['ExclusiveStartKey'] = last_key
+
+    def _scan_segment(self, segment, kwargs):
+        return self._scan_pages(
+            Segment=segment,
+            TotalSegments=self.scan_segments,
+            **kwargs
+        )
+
+    def _scan(self, **kwargs):
+        """Full-table scan, split into parallel segments when scan_segments > 1"""
+        if self.scan_segments == 1:
+            return self._scan_pages(**kwargs)
+
+        with self._scan_pool_lock:
+            if self._scan_pool is None:
+                self._scan_pool = ThreadPoolExecutor(
+                    max_workers=self.scan_segments,
+                    thread_name_prefix='rebm-scan'
                 )
-                # Update the item in memory
-                item['status'] = 'available'
-                item['reserved_by'] = None
-                item['expires_at'] = None
-        return item
+        futures = [
+            # Segments keep the caller's context (store method, priority)
+            self._scan_pool.submit(contextvars.copy_context().run, self._scan_segment, segment, kwargs)
+            for segment in range(self.scan_segments)
+        ]
+        items = []
+        for future in futures:
+            items.extend(future.result())
+        return items
+
+    def _list_kwargs(self, status=None, reserved_by=None, fields=None):
+        """Build scan parameters that push filters and projection down to DynamoDB"""
+        kwargs = {}
+        now = self._isoformat(self._now())
+        conditions = [~Attr('node').begins_with(SYSTEM_PREFIX)]
+        if status == 'available':
+            # A reservation that already expired counts as available
+            conditions.append(Attr('status').eq('available') | Attr('expires_at').lt(now))
+        elif status == 'reserved':
+            conditions.append(Attr('status').eq('reserved') & Attr('expires_at').gte(now))
+        elif status:
+            conditions.append(Attr('status').eq(status))
+        if reserved_by:
+            conditions.append(Attr('reserved_by').eq(reserved_by) & Attr('expires_at').gte(now))
+        expression = conditions[0]
+        for condition in conditions[1:]:
+            expression = expression & condition
+        kwargs['FilterExpression'] = expression
+
+        if fields:
+            # node, status and expires_at are always read so expiry can be applied
+            names = ['node', 'status', 'expires_at']
+            names += [f for f in fields if f not in names]
+            placeholders = {f'#p{i}': name for i, name in enumerate(names)}
+            kwargs['ProjectionExpression'] = ', '.join(placeholders)
+            kwargs['ExpressionAttributeNames'] = placeholders
+        return kwargs
+
+    def release_expired(self, node_name, expires_at):
+        """Release a reservation only if it still carries the given expiry.
+
+        Conditioning on expires_at keeps an auto-release from clobbering a
+        reservation that another request made in the meantime.
+        """
+        try:
+            self.table.update_item(**self._release_expired_update(node_name, expires_at))
+        except ClientError as e:
+            if not self._is_condition_failure(e):
+                raise
+            return False
+        self._notify('expire', node_name)
+        return True
+
+    def _release_expired_update(self, node_name, expires_at):
+        return {
+            'Key': {'node': node_name},
+            'UpdateExpression': 'SET #s = :s, reserved_by = :u, expires_at = :e, updated_at = :t',
+            'ConditionExpression': 'expires_at = :expected',
+            'ExpressionAttributeNames': {'#s': 'status'},
+            'ExpressionAttributeValues': {
+                ':s': 'available',
+                ':u': None,
+                ':e': None,
+                ':t': self._isoformat(self._now()),
+                ':expected': expires_at
+            }
+        }
+
+    def release_expired_nodes(self, reservations):
+        """Release many expired reservations with best-effort TransactWriteItems.
+
+        Releases whose condition fails (renewed, released or deleted since)
+        are dropped without retrying the rest of their chunk.
+        """
+        reservations = list({r['node']: r for r in reservations}.values())
+        ops = [
+            (r['node'], self._transact_item('Update', self._release_expired_update(r['node'], r['expires_at'])),
+             lambda old: NodeConflictError("Reservation changed"))
+            for r in reservations
+        ]
+        errors = self._transact(ops, atomic=False)
+        released = [r['node'] for r in reservations if r['node'] not in errors]
+        for name in released:
+            self._notify('expire', name)
+        return released
+
+    def list_reservations(self):
+        """Return node and expires_at for every node that holds a reservation"""
+        return self._scan(
+            FilterExpression=Attr('expires_at').attribute_type('S'),
+            ProjectionExpression='#n, expires_at',
+            ExpressionAttributeNames={'#n': 'node'}
+        )
 
     def get_node(self, node_name):
+        if node_name.startswith(SYSTEM_PREFIX):
+            return None
         response = self.table.get_item(Key={'node': node_name})
         item = response.get('Item')
         if not item:
             return None
         return self._check_expired(item)
 
-    def list_nodes(self):
-        response = self.table.scan()
-        items = response.get('Items', [])
-        return [self._check_expired(item) for item in items]
+    def get_nodes(self, node_names):
+        """Fetch many nodes by name using chunked BatchGetItem.
+
+        Returns the nodes that exist, in the order they were requested, with
+        the same expiry handling as get_node.
+        """
+        names = [name for name in dict.fromkeys(node_names) if not name.startswith(SYSTEM_PREFIX)]
+        client = self.table.meta.client
+        found = {}
+        for start in range(0, len(names), MAX_BATCH_GET_ITEMS):
+            chunk = names[start:start + MAX_BATCH_GET_ITEMS]
+            request = {self.table_name: {'Keys': [{'node': name} for name in chunk]}}
+            attempt = 0
+            while request:
+                response = client.batch_get_item(RequestItems=request)
+                for item in response.get('Responses', {}).get(self.table_name, []):
+                    found[item['node']] = item
+                request = response.get('UnprocessedKeys')
+                if request:
+                    # DynamoDB was short on capacity; back off with jitter and retry the rest
+                    attempt += 1
+                    if attempt >= BATCH_GET_ATTEMPTS:
+                        raise Exception("Could not read all requested nodes, try again later")
+                    time.sleep(random.uniform(0, BATCH_GET_BACKOFF * 2 ** attempt))
+        return [self._check_expired(found[name]) for name in names if name in found]
+
+    def list_nodes(self, status=None, reserved_by=None, fields=None):
+        items = self._scan(**self._list_kwargs(status, reserved_by, fields))
+        return [self._present(item, fields) for item in items]
+
+    def list_nodes_page(self, limit, cursor=None, status=None, reserved_by=None, fields=None):
+        """Return up to limit nodes and an opaque cursor for the next page (or None)"""
+        kwargs = self._list_kwargs(status, reserved_by, fields)
+        if cursor:
+            kwargs['ExclusiveStartKey'] = self._decode_cursor(cursor)
+
+        items = []
+        while True:
+            # Read at least a modest page so selective filters don't cost a round trip per item
+            kwargs['Limit'] = max(limit - len(items), 100)
+            response = self.table.scan(**kwargs)
+            items.extend(response.get('Items', []))
+            last_key = response.get('LastEvaluatedKey')
+            if len(items) >= limit or not last_key:
+                break
+            kwargs['ExclusiveStartKey'] = last_key
+
+        if len(items) > limit:
+            # Resume right after the last item we hand out
+            items = items[:limit]
+            last_key = {'node': items[-1]['node']}
+        nodes = [self._present(item, fields) for item in items]
+        return nodes, self._encode_cursor(last_key)
+
+    def list_changes(self, since):
+        """Return the nodes changed after since and the names of nodes deleted since then.
+
+        since is an ISO timestamp or Unix timestamp, normally the as_of of
+        the previous call. as_of is taken before the scan and moved back by
+        CHANGES_CLOCK_SKEW_SECONDS so no write is missed; a client may see
+        the same change twice. Reservations that ran out after since count
+        as changed even if the release has not been written yet.
+        """
+        since, now, as_of = self._changes_window(since)
+        changed = (
+            ~Attr('node').begins_with(SYSTEM_PREFIX)
+            & (Attr('updated_at').gt(since) | Attr('expires_at').between(since, now))
+        )
+        deleted = Attr('node').begins_with(TOMBSTONE_PREFIX) & Attr('deleted_at').gt(since)
+        items = self._scan(FilterExpression=changed | deleted)
+
+        nodes = [self._present(item) for item in items if not item['node'].startswith(SYSTEM_PREFIX)]
+        present = {node['node'] for node in nodes}
+        # A node that was deleted and created again is reported as a change only
+        deleted_names = sorted(
+            item['node'][len(TOMBSTONE_PREFIX):] for item in items
+            if item['node'].startswith(TOMBSTONE_PREFIX) and item['node'][len(TOMBSTONE_PREFIX):] not in present
+        )
+        return {"nodes": nodes, "deleted": deleted_names, "as_of": as_of}
 
     def create_node(self, node_data):
-        # Set default values for new nodes
-        node_data['status'] = 'available'  # Nodes are unreserved by default
-        node_data['reserved_by'] = None
-        node_data['expires_at'] = None
-        node_data['updated_at'] = self._isoformat(self._now())
-        
+        node_data = self._new_node(node_data)
         self.table.put_item(Item=node_data)
+        self._notify('create', node_data['node'], node_data)
         return {"message": "Node created", "status": "available"}
 
+    def _write_tombstones(self, node_names):
+        """Remember deletions so delta sync can report them"""
+        now = self._now()
+        try:
+            with self.table.batch_writer(overwrite_by_pkeys=['node']) as batch:
+                for name in node_names:
+                    batch.put_item(Item={
+                        'node': f'{TOMBSTONE_PREFIX}{name}',
+                        'deleted_at': self._isoformat(now),
+                        # Lets DynamoDB TTL (if enabled on "ttl") purge old tombstones
+                        'ttl': int(now.timestamp()) + TOMBSTONE_TTL_SECONDS
+                    })
+        except Exception as e:
+            logger.error(f"Error recording deletion of {len(node_names)} nodes: {e}")
+
     def delete_node(self, node_name):
-        self.table.delete_item(Key={'node': node_name})
+        self._check_name(node_name)
+        try:
+            self.table.delete_item(
+                Key={'node': node_name},
+                ConditionExpression='attribute_exists(#n)',
+                ExpressionAttributeNames={'#n': 'node'}
+            )
+        except ClientError as e:
+            if not self._is_condition_failure(e):
+                raise
+            raise NodeNotFoundError("Node does not exist")
+        self._write_tombstones([node_name])
+        self._notify('delete', node_name)
         return {"message": "Node deleted"}
 
-    def reserve_node(self, node_name, user, expires_at_timestamp):
-        node = self.get_node(node_name)
-        if not node:
-            raise Exception("Node does not exist")
-        if node['status'] != 'available':
-            raise Exception("Node is already reserved")
-
-        # Parse the timestamp - expect ISO format string
-        try:
-            if isinstance(expires_at_timestamp, str):
-                # Handle both timezone-aware and timezone-naive ISO strings
-                expires_at = datetime.fromisoformat(expires_at_timestamp)
-                # If the datetime is timezone-naive, assume it's in UTC
-                if expires_at.tzinfo is None:
-                    expires_at = expires_at.replace(tzinfo=timezone.utc)
-            else:
-                expires_at = datetime.fromtimestamp(expires_at_timestamp, tz=timezone.utc)
-        except (ValueError, TypeError):
-            raise Exception("Invalid timestamp format. Use ISO format string or Unix timestamp")
-
-        # Check if the expiration time is in the future
-        if expires_at <= self._now():
-            raise Exception("Expiration time must be in the future")
-
-        self.table.update_item(
-            Key={'node': node_name},
-            UpdateExpression="""
-                SET #s = :s, reserved_by = :u, expires_at = :e, updated_at = :t
-            """,
-            ExpressionAttributeNames={'#s': 'status'},
-            ExpressionAttributeValues={
+    def _reserve_update(self, node_name, user, expires_at):
+        # The node must exist and be available, or hold a reservation that
+        # has already expired
+        return {
+            'Key': {'node': node_name},
+            'UpdateExpression': 'SET #s = :s, reserved_by = :u, expires_at = :e, updated_at = :t',
+            'ConditionExpression': 'attribute_exists(#n) AND (#s = :available OR expires_at < :t)',
+            'ExpressionAttributeNames': {'#s': 'status', '#n': 'node'},
+            'ExpressionAttributeValues': {
                 ':s': 'reserved',
                 ':u': user,
                 ':e': self._isoformat(expires_at),
-                ':t': self._isoformat(self._now())
-            }
-        )
-        return {"message": "Node reserved", "expires_at": self._isoformat(expires_at)}
+                ':t': self._isoformat(self._now()),
+                ':available': 'available'
+            },
+            'ReturnValuesOnConditionCheckFailure': 'ALL_OLD'
+        }
 
-    def release_node(self, node_name):
-        node = self.get_node(node_name)
-        if not node:
-            raise Exception("Node does not exist")
-
-        self.table.update_item(
-            Key={'node': node_name},
-            UpdateExpression="""
-                SET #s = :s, reserved_by = :u, expires_at = :e, updated_at = :t
-            """,
-            ExpressionAttributeNames={'#s': 'status'},
-            ExpressionAttributeValues={
+    def _release_update(self, node_name):
+        return {
+            'Key': {'node': node_name},
+            'UpdateExpression': 'SET #s = :s, reserved_by = :u, expires_at = :e, updated_at = :t',
+            'ConditionExpression': 'attribute_exists(#n)',
+            'ExpressionAttributeNames': {'#s': 'status', '#n': 'node'},
+            'ExpressionAttributeValues': {
                 ':s': 'available',
                 ':u': None,
                 ':e': None,
                 ':t': self._isoformat(self._now())
             }
-        )
-        return {"message": "Node released"}
+        }
+
+    def reserve_node(self, node_name, user, expires_at_timestamp):
+        self._check_name(node_name)
+        expires_at = self._parse_expires_at(expires_at_timestamp)
+        try:
+            response = self.table.update_item(
+                ReturnValues='ALL_NEW',
+                **self._reserve_update(node_name, user, expires_at)
+            )
+        except ClientError as e:
+            if not self._is_condition_failure(e):
+                raise
+            raise self._reserve_failure(e.response.get('Item'))
+        self._notify('reserve', node_name, response['Attributes'])
+        return {
+            "message": "Node reserved",
+            "expires_at": self._isoformat(expires_at),
+            "item": response['Attributes']
+        }
+
+    def release_node(self, node_name):
+        self._check_name(node_name)
+        try:
+            response = self.table.update_item(
+                ReturnValues='ALL_NEW',
+                **self._release_update(node_name)
+            )
+        except ClientError as e:
+            if not self._is_condition_failure(e):
+                raise
+            raise NodeNotFoundError("Node does not exist")
+        self._notify('release', node_name, response['Attributes'])
+        return {"message": "Node released", "item": response['Attributes']}
+
+    def _transact_item(self, kind, params):
+        # The resource's client serializes attribute values itself
+        return {kind: {'TableName': self.table_name, **params}}
+
+    def _transact(self, ops, atomic):
+        """Run (node_name, transact_item, on_condition_failure) ops as transactions.
+
+        Atomic mode sends everything in one all-or-nothing transaction.
+        Best-effort mode sends chunks of MAX_TRANSACT_ITEMS, drops the items
+        whose condition failed and resubmits the rest. Returns a dict of
+        node name -> error message for the items that were not applied.
+        """
+        if atomic and len(ops) > MAX_TRANSACT_ITEMS:
+            raise Exception(f"Atomic batches are limited to {MAX_TRANSACT_ITEMS} nodes")
+
+        client = self.table.meta.client
+        errors = {}
+        for start in range(0, len(ops), MAX_TRANSACT_ITEMS):
+            chunk = ops[start:start + MAX_TRANSACT_ITEMS]
+            for attempt in range(TRANSACT_ATTEMPTS):
+                try:
+                    client.transact_write_items(TransactItems=[op[1] for op in chunk])
+                    break
+                except ClientError as e:
+                    if e.response.get('Error', {}).get('Code') != 'TransactionCanceledException':
+                        raise
+                    reasons = e.response.get('CancellationReasons') or [{}] * len(chunk)
+
+                retry = []
+                for op, reason in zip(chunk, reasons):
+                    code = reason.get('Code', 'None')
+                    if code == 'ConditionalCheckFailed':
+                        errors[op[0]] = str(op[2](self._deserialize(reason.get('Item'))))
+                    elif code == 'None' or code in RETRYABLE_CANCELLATION_CODES:
+                        retry.append(op)
+                    else:
+                        errors[op[0]] = reason.get('Message') or code
+                if atomic:
+                    for op in chunk:
+                        errors.setdefault(op[0], "Transaction cancelled")
+                    return errors
+                chunk = retry
+                if not chunk:
+                    break
+                time.sleep(TRANSACT_RETRY_DELAY * (attempt + 1))
+            else:
+                for op in chunk:
+                    errors[op[0]] = "Gave up after repeated transaction conflicts"
+        return errors
+
+    def write_nodes(self, create=None, delete=None, atomic=False):
+        """Create and delete many nodes at once.
+
+        Best-effort mode goes through BatchWriteItem (25 items per request,
+        unprocessed items retried). Deletes there are unconditional, so a
+        missing node is not reported. Atomic mode uses one TransactWriteItems
+        call and fails as a whole if any node to delete does not exist.
+        """
+        create = [self._new_node(dict(node)) for node in (create or [])]
+        delete = list(dict.fromkeys(delete or []))
+        names = self._batch_names(create, delete)
+
+        if atomic:
+            ops = [
+                (node['node'], self._transact_item('Put', {'Item': node}), None)
+                for node in create
+            ]
+            ops += [
+                (name, self._transact_item('Delete', {
+                    'Key': {'node': name},
+                    'ConditionExpression': 'attribute_exists(#n)',
+                    'ExpressionAttributeNames': {'#n': 'node'}
+                }), lambda old: NodeNotFoundError("Node does not exist"))
+                for name in delete
+            ]
+            errors = self._transact(ops, atomic=True)
+        else:
+            errors = {}
+            with self.table.batch_writer() as batch:
+                for node in create:
+                    batch.put_item(Item=node)
+                for name in delete:
+                    batch.delete_item(Key={'node': name})
+
+        if not errors:
+            if delete:
+                self._write_tombstones(delete)
+            for node in create:
+                self._notify('create', node['node'], node)
+            for name in delete:
+                self._notify('delete', name)
+        return {
+            "message": f"Applied {len(names) - len(errors)} of {len(names)} changes",
+            "results": self._results(names, errors)
+        }
+
+    def reserve_nodes(self, node_names, user, expires_at_timestamp, atomic=False):
+        """Reserve many nodes using conditional TransactWriteItems"""
+        expires_at = self._parse_expires_at(expires_at_timestamp)
+        names = self._node_names(node_names)
+        ops = [
+            (name, self._transact_item('Update', self._reserve_update(name, user, expires_at)), self._reserve_failure)
+            for name in names
+        ]
+        errors = self._transact(ops, atomic)
+
+        reserved = [name for name in names if name not in errors]
+        for name in reserved:
+            self._notify('reserve', name, {
+                'node': name,
+                'status': 'reserved',
+                'reserved_by': user,
+                'expires_at': self._isoformat(expires_at)
+            })
+        return {
+            "message": f"Reserved {len(reserved)} of {len(names)} nodes",
+            "expires_at": self._isoformat(expires_at),
+            "results": self._results(names, errors)
+        }
+
+    def release_nodes(self, node_names, atomic=False):
+        """Release many nodes using conditional TransactWriteItems"""
+        names = self._node_names(node_names)
+        ops = [
+            (name, self._transact_item('Update', self._release_update(name)),
+             lambda old: NodeNotFoundError("Node does not exist"))
+            for name in names
+        ]
+        errors = self._transact(ops, atomic)
+
+        released = [name for name in names if name not in errors]
+        for name in released:
+            self._notify('release', name, {'node': name, 'status': 'available'})
+        return {
+            "message": f"Released {len(released)} of {len(names)} nodes",
+            "results": self._results(names, errors)
+        }
 
     def cleanup_expired_nodes(self):
         """Manually trigger cleanup of expired nodes"""
-        response = self.table.scan()
-        items = response.get('Items', [])
+        items = self._scan()
         cleaned_count = 0
         
         for item in items:
             if item.get('expires_at'):
                 expires_at = datetime.fromisoformat(item['expires_at'])
-                if expires_at < self._now():
-                    self.table.update_item(
-                        Key={'node': item['node']},
-                        UpdateExpression="""
-                            SET #s = :s, reserved_by = :u, expires_at = :e, updated_at = :t
-                        """,
-                        ExpressionAttributeNames={'#s': 'status'},
-                        ExpressionAttributeValues={
-                            ':s': 'available',
-                            ':u': None,
-                            ':e': None,
-                            ':t': self._isoformat(self._now())
-                        }
-                    )
+                if expires_at < self._now() and self.release_expired(item['node'], item['expires_at']):
                     cleaned_count += 1
         
         return {"message": f"Cleaned up {cleaned_count} expired nodes"}
+
+    def _lease_key(self, name):
+        return {'node': f'{SYSTEM_PREFIX}lease/{name}'}
+
+    def acquire_lease(self, name, owner, ttl_seconds):
+        """Take or renew a named lease.
+
+        Succeeds when the lease is free, already held by owner, or expired.
+        Returns the current lease item either way; check lease_owner to see
+        who holds it.
+        """
+        now = self._now()
+        expires_at = now + timedelta(seconds=ttl_seconds)
+        item = {
+            **self._lease_key(name),
+            'lease_owner': owner,
+            'lease_expires_at': self._isoformat(expires_at),
+            # Lets DynamoDB TTL (if enabled on "ttl") purge abandoned leases
+            'ttl': int(expires_at.timestamp()) + ttl_seconds
+        }
+        try:
+            self.table.put_item(
+                Item=item,
+                ConditionExpression='attribute_not_exists(#n) OR lease_owner = :owner OR lease_expires_at < :now',
+                ExpressionAttributeNames={'#n': 'node'},
+                ExpressionAttributeValues={':owner': owner, ':now': self._isoformat(now)},
+                ReturnValuesOnConditionCheckFailure='ALL_OLD'
+            )
+        except ClientError as e:
+            if not self._is_condition_failure(e):
+                raise
+            return self._deserialize(e.response.get('Item'))
+        return item
+
+    def release_lease(self, name, owner):
+        """Give up a lease early so another process can take over immediately"""
+        try:
+            self.table.delete_item(
+                Key=self._lease_key(name),
+                ConditionExpression='lease_owner = :owner',
+                ExpressionAttributeValues={':owner': owner}
+            )
+        except ClientError as e:
+            if not self._is_condition_failure(e):
+                raise
+            return False
+        return True
+
+    def get_lease(self, name):
+        return self.table.get_item(Key=self._lease_key(name)).get('Item')
@@ -0,0 +1,14 @@
+class NodeNotFoundError(Exception):
+    """The node targeted by an operation does not exist"""
+
+
+class NodeConflictError(Exception):
+    """A conditional write lost to the node's current state"""
+
+
+class ChangesExpiredError(Exception):
+    """Changes were requested from further back than deletions are kept"""
+
+
+class StoreThrottledError(Exception):
+    """The backing store is over its request rate; the call may be retried later"""
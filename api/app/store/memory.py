@@ -0,0 +1,332 @@
+import bisect
+import copy
+import threading
+from datetime import timedelta
+from .base import TOMBSTONE_TTL_SECONDS, NodeStore
+from .exceptions import NodeConflictError, NodeNotFoundError
+
+
+class InMemoryNodeStore(NodeStore):
+    """Node store kept in process memory, for development, tests and benchmarks.
+
+    Besides the nodes it keeps secondary indexes by status, by reserving
+    user and by expiry time (a sorted list), so filtered listings and
+    expiry scans only touch the nodes they return. Nothing is persisted and
+    nothing is shared between processes, so run a single API worker.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._nodes = {}
+        self._by_status = {}  # status -> set of node names
+        self._by_user = {}  # reserved_by -> set of node names
+        self._by_expiry = []  # sorted (expires_at, node name)
+        self._tombstones = {}  # node name -> deleted_at
+        self._leases = {}
+        # Reentrant: expiry handling on reads may write while a read holds it
+        self._lock = threading.RLock()
+
+    def _index(self, item):
+        name = item['node']
+        self._by_status.setdefault(item['status'], set()).add(name)
+        if item.get('reserved_by'):
+            self._by_user.setdefault(item['reserved_by'], set()).add(name)
+        if item.get('expires_at'):
+            bisect.insort(self._by_expiry, (item['expires_at'], name))
+
+    def _unindex(self, item):
+        name = item['node']
+        self._by_status.get(item['status'], set()).discard(name)
+        if item.get('reserved_by'):
+            self._by_user.get(item['reserved_by'], set()).discard(name)
+        if item.get('expires_at'):
+            entry = (item['expires_at'], name)
+            index = bisect.bisect_left(self._by_expiry, entry)
+            if index < len(self._by_expiry) and self._by_expiry[index] == entry:
+                del self._by_expiry[index]
+
+    def _put(self, item):
+        # Caller holds the lock
+        old = self._nodes.get(item['node'])
+        if old:
+            self._unindex(old)
+        self._nodes[item['node']] = item
+        self._index(item)
+
+    def _remove(self, node_name):
+        # Caller holds the lock
+        item = self._nodes.pop(node_name, None)
+        if item:
+            self._unindex(item)
+        return item
+
+    def _expiring(self, start=None, end=None):
+        """Names of nodes whose expires_at lies in [start, end)"""
+        low = 0 if start is None else bisect.bisect_left(self._by_expiry, (start,))
+        high = len(self._by_expiry) if end is None else bisect.bisect_left(self._by_expiry, (end,))
+        return {name for _, name in self._by_expiry[low:high]}
+
+    def _matching(self, status=None, reserved_by=None):
+        """Sorted names of the nodes matching the list filters"""
+        now = self._isoformat(self._now())
+        names = None
+        if status == 'available':
+            # A reservation that already expired counts as available
+            names = self._by_status.get('available', set()) | self._expiring(end=now)
+        elif status == 'reserved':
+            names = self._by_status.get('reserved', set()) & self._expiring(start=now)
+        elif status:
+            names = set(self._by_status.get(status, ()))
+        if reserved_by:
+            held = self._by_user.get(reserved_by, set()) & self._expiring(start=now)
+            names = held if names is None else names & held
+        return sorted(self._nodes if names is None else names)
+
+    def get_node(self, node_name):
+        with self._lock:
+            item = self._nodes.get(node_name)
+            item = dict(item) if item else None
+        return self._check_expired(item) if item else None
+
+    def get_nodes(self, node_names):
+        with self._lock:
+            items = [dict(self._nodes[name]) for name in dict.fromkeys(node_names) if name in self._nodes]
+        return [self._check_expired(item) for item in items]
+
+    def list_nodes(self, status=None, reserved_by=None, fields=None):
+        with self._lock:
+            items = [dict(self._nodes[name]) for name in self._matching(status, reserved_by)]
+        return [self._present(item, fields) for item in items]
+
+    def list_nodes_page(self, limit, cursor=None, status=None, reserved_by=None, fields=None):
+        """Return up to limit nodes in name order and a cursor for the next page (or None)"""
+        after = self._decode_cursor(cursor)['node'] if cursor else None
+        with self._lock:
+            names = self._matching(status, reserved_by)
+            if after is not None:
+                names = names[bisect.bisect_right(names, after):]
+            items = [dict(self._nodes[name]) for name in names[:limit]]
+        last_key = {'node': items[-1]['node']} if len(names) > limit else None
+        nodes = [self._present(item, fields) for item in items]
+        return nodes, self._encode_cursor(last_key)
+
+    def list_changes(self, since):
+        since, now, as_of = self._changes_window(since)
+        with self._lock:
+            items = [
+                dict(item) for item in self._nodes.values()
+                if (item.get('updated_at') or '') > since
+                or since <= (item.get('expires_at') or '') <= now
+            ]
+            # A node that was deleted and created again is reported as a change only
+            deleted = sorted(
+                name for name, deleted_at in self._tombstones.items()
+                if deleted_at > since and name not in self._nodes
+            )
+        items.sort(key=lambda item: item['node'])
+        return {"nodes": [self._present(item) for item in items], "deleted": deleted, "as_of": as_of}
+
+    def list_reservations(self):
+        with self._lock:
+            return [{'node': name, 'expires_at': expires_at} for expires_at, name in self._by_expiry]
+
+    def _forget(self, node_names):
+        # Caller holds the lock; records deletions for list_changes
+        now = self._now()
+        deleted_at = self._isoformat(now)
+        for name in node_names:
+            self._tombstones[name] = deleted_at
+        cutoff = self._isoformat(now - timedelta(seconds=TOMBSTONE_TTL_SECONDS))
+        for name in [n for n, at in self._tombstones.items() if at < cutoff]:
+            del self._tombstones[name]
+
+    def create_node(self, node_data):
+        node_data = self._new_node(node_data)
+        with self._lock:
+            self._put(copy.deepcopy(node_data))
+        self._notify('create', node_data['node'], node_data)
+        return {"message": "Node created", "status": "available"}
+
+    def delete_node(self, node_name):
+        self._check_name(node_name)
+        with self._lock:
+            if not self._remove(node_name):
+                raise NodeNotFoundError("Node does not exist")
+            self._forget([node_name])
+        self._notify('delete', node_name)
+        return {"message": "Node deleted"}
+
+    def _reserve(self, node_name, user, expires_at):
+        # Caller holds the lock. The node must exist and be available, or
+        # hold a reservation that has already expired
+        item = self._nodes.get(node_name)
+        now = self._isoformat(self._now())
+        if not item or not (item['status'] == 'available' or (item.get('expires_at') and item['expires_at'] < now)):
+            raise self._reserve_failure(item)
+        updated = dict(item, status='reserved', reserved_by=user, expires_at=self._isoformat(expires_at), updated_at=now)
+        self._put(updated)
+        return dict(updated)
+
+    def _release(self, node_name):
+        # Caller holds the lock
+        item = self._nodes.get(node_name)
+        if not item:
+            raise NodeNotFoundError("Node does not exist")
+        updated = dict(item, status='available', reserved_by=None, expires_at=None,
+                       updated_at=self._isoformat(self._now()))
+        self._put(updated)
+        return dict(updated)
+
+    def reserve_node(self, node_name, user, expires_at_timestamp):
+        self._check_name(node_name)
+        expires_at = self._parse_expires_at(expires_at_timestamp)
+        with self._lock:
+            item = self._reserve(node_name, user, expires_at)
+        self._notify('reserve', node_name, item)
+        return {
+            "message": "Node reserved",
+            "expires_at": self._isoformat(expires_at),
+            "item": item
+        }
+
+    def release_node(self, node_name):
+        self._check_name(node_name)
+        with self._lock:
+            item = self._release(node_name)
+        self._notify('release', node_name, item)
+        return {"message": "Node released", "item": item}
+
+    def release_expired(self, node_name, expires_at):
+        with self._lock:
+            item = self._nodes.get(node_name)
+            if not item or item.get('expires_at') != expires_at:
+                return False
+            self._release(node_name)
+        self._notify('expire', node_name)
+        return True
+
+    def release_expired_nodes(self, reservations):
+        released = []
+        with self._lock:
+            for reservation in reservations:
+                item = self._nodes.get(reservation['node'])
+                if item and item.get('expires_at') == reservation['expires_at']:
+                    self._release(reservation['node'])
+                    released.append(reservation['node'])
+        for name in released:
+            self._notify('expire', name)
+        return released
+
+    def _batch(self, names, apply, atomic):
+        """Run apply(name) for every name under the lock.
+
+        Returns (node name -> error message, node name -> result). In atomic
+        mode a single failure restores every node touched by the batch.
+        """
+        errors, results = {}, {}
+        with self._lock:
+            saved = {name: self._nodes.get(name) for name in names} if atomic else None
+            for name in names:
+                try:
+                    results[name] = apply(name)
+                except (NodeConflictError, NodeNotFoundError) as e:
+                    errors[name] = str(e)
+            if atomic and errors:
+                for name, item in saved.items():
+                    self._remove(name)
+                    if item:
+                        self._put(item)
+                for name in names:
+                    errors.setdefault(name, "Transaction cancelled")
+                results = {}
+        return errors, results
+
+    def write_nodes(self, create=None, delete=None, atomic=False):
+        """Create and delete many nodes at once.
+
+        Like the DynamoDB store, best-effort deletes of missing nodes are
+        not reported; atomic mode fails as a whole if one does not exist.
+        """
+        create = [self._new_node(copy.deepcopy(node)) for node in (create or [])]
+        delete = list(dict.fromkeys(delete or []))
+        names = self._batch_names(create, delete)
+        new = {node['node']: node for node in create}
+
+        def apply(name):
+            if name in new:
+                self._put(copy.deepcopy(new[name]))
+            elif not self._remove(name) and atomic:
+                raise NodeNotFoundError("Node does not exist")
+
+        with self._lock:
+            errors, _ = self._batch(names, apply, atomic)
+            if not errors and delete:
+                self._forget(delete)
+        if not errors:
+            for node in create:
+                self._notify('create', node['node'], node)
+            for name in delete:
+                self._notify('delete', name)
+        return {
+            "message": f"Applied {len(names) - len(errors)} of {len(names)} changes",
+            "results": self._results(names, errors)
+        }
+
+    def reserve_nodes(self, node_names, user, expires_at_timestamp, atomic=False):
+        expires_at = self._parse_expires_at(expires_at_timestamp)
+        names = self._node_names(node_names)
+        errors, items = self._batch(names, lambda name: self._reserve(name, user, expires_at), atomic)
+        for name in names:
+            if name in items:
+                self._notify('reserve', name, items[name])
+        return {
+            "message": f"Reserved {len(items)} of {len(names)} nodes",
+            "expires_at": self._isoformat(expires_at),
+            "results": self._results(names, errors)
+        }
+
+    def release_nodes(self, node_names, atomic=False):
+        names = self._node_names(node_names)
+        errors, items = self._batch(names, self._release, atomic)
+        for name in names:
+            if name in items:
+                self._notify('release', name, items[name])
+        return {
+            "message": f"Released {len(items)} of {len(names)} nodes",
+            "results": self._results(names, errors)
+        }
+
+    def cleanup_expired_nodes(self):
+        """Manually trigger cleanup of expired nodes"""
+        now = self._isoformat(self._now())
+        with self._lock:
+            high = bisect.bisect_left(self._by_expiry, (now,))
+            expired = self._by_expiry[:high]
+        cleaned_count = sum(1 for expires_at, name in expired if self.release_expired(name, expires_at))
+        return {"message": f"Cleaned up {cleaned_count} expired nodes"}
+
+    def acquire_lease(self, name, owner, ttl_seconds):
+        now = self._now()
+        with self._lock:
+            lease = self._leases.get(name)
+            if lease and lease['lease_owner'] != owner and lease['lease_expires_at'] >= self._isoformat(now):
+                return dict(lease)
+            lease = {
+                'lease_owner': owner,
+                'lease_expires_at': self._isoformat(now + timedelta(seconds=ttl_seconds))
+            }
+            self._leases[name] = lease
+            return dict(lease)
+
+    def release_lease(self, name, owner):
+        with self._lock:
+            lease = self._leases.get(name)
+            if not lease or lease['lease_owner'] != owner:
+                return False
+            del self._leases[name]
+            return True
+
+    def get_lease(self, name):
+        with self._lock:
+            lease = self._leases.get(name)
+            return dict(lease) if lease else None
@@ -0,0 +1,385 @@
+import json
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import timedelta
+from .base import TOMBSTONE_TTL_SECONDS, NodeStore
+from .exceptions import NodeConflictError, NodeNotFoundError
+
+# Attributes stored in their own columns; everything else goes in attributes (JSON)
+COLUMNS = ('node', 'status', 'reserved_by', 'expires_at', 'updated_at')
+
+# How long a writer waits for another connection's write lock
+BUSY_TIMEOUT_SECONDS = 5
+
+# Stay under SQLITE_MAX_VARIABLE_NUMBER on older SQLite builds
+MAX_QUERY_PARAMETERS = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS nodes (
+    node TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    reserved_by TEXT,
+    expires_at TEXT,
+    updated_at TEXT,
+    attributes TEXT NOT NULL DEFAULT '{}'
+);
+CREATE INDEX IF NOT EXISTS nodes_status ON nodes (status);
+CREATE INDEX IF NOT EXISTS nodes_expires_at ON nodes (expires_at);
+CREATE INDEX IF NOT EXISTS nodes_reserved_by ON nodes (reserved_by);
+CREATE INDEX IF NOT EXISTS nodes_updated_at ON nodes (updated_at);
+CREATE TABLE IF NOT EXISTS tombstones (
+    node TEXT PRIMARY KEY,
+    deleted_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS tombstones_deleted_at ON tombstones (deleted_at);
+CREATE TABLE IF NOT EXISTS leases (
+    name TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires_at TEXT NOT NULL
+);
+"""
+
+# Statements are fixed strings so each connection's statement cache keeps them prepared
+SELECT_NODE = "SELECT * FROM nodes WHERE node = ?"
+PUT_NODE = """
+    INSERT OR REPLACE INTO nodes (node, status, reserved_by, expires_at, updated_at, attributes)
+    VALUES (?, ?, ?, ?, ?, ?)
+"""
+DELETE_NODE = "DELETE FROM nodes WHERE node = ?"
+RESERVE_NODE = """
+    UPDATE nodes SET status = 'reserved', reserved_by = ?, expires_at = ?, updated_at = ?
+    WHERE node = ? AND (status = 'available' OR expires_at < ?)
+"""
+RELEASE_NODE = """
+    UPDATE nodes SET status = 'available', reserved_by = NULL, expires_at = NULL, updated_at = ?
+    WHERE node = ?
+"""
+RELEASE_EXPIRED = """
+    UPDATE nodes SET status = 'available', reserved_by = NULL, expires_at = NULL, updated_at = ?
+    WHERE node = ? AND expires_at = ?
+"""
+SELECT_RESERVATIONS = "SELECT node, expires_at FROM nodes WHERE expires_at IS NOT NULL"
+SELECT_EXPIRED = "SELECT node, expires_at FROM nodes WHERE expires_at < ?"
+SELECT_CHANGED = """
+    SELECT * FROM nodes WHERE updated_at > ? OR expires_at BETWEEN ? AND ? ORDER BY node
+"""
+SELECT_DELETED = """
+    SELECT node FROM tombstones
+    WHERE deleted_at > ? AND node NOT IN (SELECT node FROM nodes)
+    ORDER BY node
+"""
+PUT_TOMBSTONE = "INSERT OR REPLACE INTO tombstones (node, deleted_at) VALUES (?, ?)"
+PURGE_TOMBSTONES = "DELETE FROM tombstones WHERE deleted_at < ?"
+ACQUIRE_LEASE = """
+    INSERT INTO leases (name, owner, expires_at) VALUES (?, ?, ?)
+    ON CONFLICT (name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at
+    WHERE leases.owner = excluded.owner OR leases.expires_at < ?
+"""
+SELECT_LEASE = "SELECT owner, expires_at FROM leases WHERE name = ?"
+RELEASE_LEASE = "DELETE FROM leases WHERE name = ? AND owner = ?"
+
+
+class _BatchCancelled(Exception):
+    """Raised inside an atomic batch to roll back every change made so far"""
+
+
+class SQLiteNodeStore(NodeStore):
+    """Node store in a local SQLite database, for single-host deployments.
+
+    The database runs in WAL mode so readers never block the writer, and
+    every thread gets its own connection. Conditional writes are UPDATEs
+    whose WHERE clause carries the condition; batches run in one
+    transaction. Several API workers on the same host can share the file.
+    """
+
+    def __init__(self, path='rebm.db'):
+        super().__init__()
+        self.path = path
+        self._local = threading.local()
+        self.db.executescript(SCHEMA)
+
+    @property
+    def db(self):
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            # Autocommit; multi-statement writes open transactions explicitly
+            db = sqlite3.connect(
+                self.path,
+                timeout=BUSY_TIMEOUT_SECONDS,
+                isolation_level=None,
+                check_same_thread=False,
+                cached_statements=256
+            )
+            db.row_factory = sqlite3.Row
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            self._local.db = db
+        return db
+
+    @contextmanager
+    def _transaction(self):
+        db = self.db
+        # Take the write lock up front so conditions checked here still hold at commit
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            yield db
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+
+    def _item(self, row):
+        item = json.loads(row['attributes'])
+        item.update({column: row[column] for column in COLUMNS})
+        return item
+
+    def _select(self, db, node_name):
+        row = db.execute(SELECT_NODE, (node_name,)).fetchone()
+        return self._item(row) if row else None
+
+    def _put(self, db, node):
+        attributes = {k: v for k, v in node.items() if k not in COLUMNS}
+        db.execute(PUT_NODE, (
+            node['node'], node['status'], node['reserved_by'], node['expires_at'], node['updated_at'],
+            json.dumps(attributes)
+        ))
+
+    def _forget(self, db, node_names):
+        # Records deletions for list_changes and drops ones nobody can ask for anymore
+        now = self._now()
+        db.executemany(PUT_TOMBSTONE, [(name, self._isoformat(now)) for name in node_names])
+        db.execute(PURGE_TOMBSTONES, (self._isoformat(now - timedelta(seconds=TOMBSTONE_TTL_SECONDS)),))
+
+    def _filters(self, status=None, reserved_by=None):
+        """WHERE clauses and parameters for the list filters"""
+        now = self._isoformat(self._now())
+        clauses, params = [], []
+        if status == 'available':
+            # A reservation that already expired counts as available
+            clauses.append("(status = 'available' OR expires_at < ?)")
+            params.append(now)
+        elif status == 'reserved':
+            clauses.append("status = 'reserved' AND expires_at >= ?")
+            params.append(now)
+        elif status:
+            clauses.append("status = ?")
+            params.append(status)
+        if reserved_by:
+            clauses.append("reserved_by = ? AND expires_at >= ?")
+            params += [reserved_by, now]
+        return clauses, params
+
+    def _query(self, clauses, params, suffix=''):
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ''
+        rows = self.db.execute(f"SELECT * FROM nodes{where} ORDER BY node{suffix}", params).fetchall()
+        return [self._item(row) for row in rows]
+
+    def get_node(self, node_name):
+        item = self._select(self.db, node_name)
+        return self._check_expired(item) if item else None
+
+    def get_nodes(self, node_names):
+        names = list(dict.fromkeys(node_names))
+        found = {}
+        for start in range(0, len(names), MAX_QUERY_PARAMETERS):
+            chunk = names[start:start + MAX_QUERY_PARAMETERS]
+            placeholders = ', '.join('?' * len(chunk))
+            for row in self.db.execute(f"SELECT * FROM nodes WHERE node IN ({placeholders})", chunk):
+                found[row['node']] = self._item(row)
+        return [self._check_expired(found[name]) for name in names if name in found]
+
+    def list_nodes(self, status=None, reserved_by=None, fields=None):
+        clauses, params = self._filters(status, reserved_by)
+        return [self._present(item, fields) for item in self._query(clauses, params)]
+
+    def list_nodes_page(self, limit, cursor=None, status=None, reserved_by=None, fields=None):
+        """Return up to limit nodes in name order and a cursor for the next page (or None)"""
+        clauses, params = self._filters(status, reserved_by)
+        if cursor:
+            clauses.append("node > ?")
+            params.append(self._decode_cursor(cursor)['node'])
+        # One extra row tells us whether there is a next page
+        items = self._query(clauses, params + [limit + 1], suffix=' LIMIT ?')
+        last_key = None
+        if len(items) > limit:
+            items = items[:limit]
+            last_key = {'node': items[-1]['node']}
+        nodes = [self._present(item, fields) for item in items]
+        return nodes, self._encode_cursor(last_key)
+
+    def list_changes(self, since):
+        since, now, as_of = self._changes_window(since)
+        db = self.db
+        items = [self._item(row) for row in db.execute(SELECT_CHANGED, (since, since, now))]
+        deleted = [row['node'] for row in db.execute(SELECT_DELETED, (since,))]
+        return {"nodes": [self._present(item) for item in items], "deleted": deleted, "as_of": as_of}
+
+    def list_reservations(self):
+        return [dict(row) for row in self.db.execute(SELECT_RESERVATIONS)]
+
+    def create_node(self, node_data):
+        node_data = self._new_node(node_data)
+        self._put(self.db, node_data)
+        self._notify('create', node_data['node'], node_data)
+        return {"message": "Node created", "status": "available"}
+
+    def delete_node(self, node_name):
+        self._check_name(node_name)
+        with self._transaction() as db:
+            if db.execute(DELETE_NODE, (node_name,)).rowcount == 0:
+                raise NodeNotFoundError("Node does not exist")
+            self._forget(db, [node_name])
+        self._notify('delete', node_name)
+        return {"message": "Node deleted"}
+
+    def _reserve(self, db, node_name, user, expires_at):
+        # The node must exist and be available, or hold a reservation that
+        # has already expired
+        now = self._isoformat(self._now())
+        updated = db.execute(RESERVE_NODE, (user, self._isoformat(expires_at), now, node_name, now)).rowcount
+        if not updated:
+            raise self._reserve_failure(self._select(db, node_name))
+        return self._select(db, node_name)
+
+    def _release(self, db, node_name):
+        if not db.execute(RELEASE_NODE, (self._isoformat(self._now()), node_name)).rowcount:
+            raise NodeNotFoundError("Node does not exist")
+        return self._select(db, node_name)
+
+    def reserve_node(self, node_name, user, expires_at_timestamp):
+        self._check_name(node_name)
+        expires_at = self._parse_expires_at(expires_at_timestamp)
+        with self._transaction() as db:
+            item = self._reserve(db, node_name, user, expires_at)
+        self._notify('reserve', node_name, item)
+        return {
+            "message": "Node reserved",
+            "expires_at": self._isoformat(expires_at),
+            "item": item
+        }
+
+    def release_node(self, node_name):
+        self._check_name(node_name)
+        with self._transaction() as db:
+            item = self._release(db, node_name)
+        self._notify('release', node_name, item)
+        return {"message": "Node released", "item": item}
+
+    def release_expired(self, node_name, expires_at):
+        released = self.db.execute(RELEASE_EXPIRED, (self._isoformat(self._now()), node_name, expires_at)).rowcount
+        if not released:
+            return False
+        self._notify('expire', node_name)
+        return True
+
+    def release_expired_nodes(self, reservations):
+        now = self._isoformat(self._now())
+        with self._transaction() as db:
+            released = [
+                reservation['node'] for reservation in reservations
+                if db.execute(RELEASE_EXPIRED, (now, reservation['node'], reservation['expires_at'])).rowcount
+            ]
+        for name in released:
+            self._notify('expire', name)
+        return released
+
+    def _batch(self, names, apply, atomic, after=None):
+        """Run apply(db, name) for every name in one transaction.
+
+        Returns (node name -> error message, node name -> result). In atomic
+        mode a single failure rolls the whole batch back. after(db) runs in
+        the same transaction when every change applied.
+        """
+        errors, results = {}, {}
+        try:
+            with self._transaction() as db:
+                for name in names:
+                    try:
+                        results[name] = apply(db, name)
+                    except (NodeConflictError, NodeNotFoundError) as e:
+                        errors[name] = str(e)
+                if atomic and errors:
+                    raise _BatchCancelled()
+                if after and not errors:
+                    after(db)
+        except _BatchCancelled:
+            for name in names:
+                errors.setdefault(name, "Transaction cancelled")
+            results = {}
+        return errors, results
+
+    def write_nodes(self, create=None, delete=None, atomic=False):
+        """Create and delete many nodes in one transaction.
+
+        Like the DynamoDB store, best-effort deletes of missing nodes are
+        not reported; atomic mode fails as a whole if one does not exist.
+        """
+        create = [self._new_node(dict(node)) for node in (create or [])]
+        delete = list(dict.fromkeys(delete or []))
+        names = self._batch_names(create, delete)
+        new = {node['node']: node for node in create}
+
+        def apply(db, name):
+            if name in new:
+                self._put(db, new[name])
+            elif not db.execute(DELETE_NODE, (name,)).rowcount and atomic:
+                raise NodeNotFoundError("Node does not exist")
+
+        errors, _ = self._batch(names, apply, atomic, after=lambda db: self._forget(db, delete) if delete else None)
+        if not errors:
+            for node in create:
+                self._notify('create', node['node'], node)
+            for name in delete:
+                self._notify('delete', name)
+        return {
+            "message": f"Applied {len(names) - len(errors)} of {len(names)} changes",
+            "results": self._results(names, errors)
+        }
+
+    def reserve_nodes(self, node_names, user, expires_at_timestamp, atomic=False):
+        expires_at = self._parse_expires_at(expires_at_timestamp)
+        names = self._node_names(node_names)
+        errors, items = self._batch(names, lambda db, name: self._reserve(db, name, user, expires_at), atomic)
+        for name in names:
+            if name in items:
+                self._notify('reserve', name, items[name])
+        return {
+            "message": f"Reserved {len(items)} of {len(names)} nodes",
+            "expires_at": self._isoformat(expires_at),
+            "results": self._results(names, errors)
+        }
+
+    def release_nodes(self, node_names, atomic=False):
+        names = self._node_names(node_names)
+        errors, items = self._batch(names, self._release, atomic)
+        for name in names:
+            if name in items:
+                self._notify('release', name, items[name])
+        return {
+            "message": f"Released {len(items)} of {len(names)} nodes",
+            "results": self._results(names, errors)
+        }
+
+    def cleanup_expired_nodes(self):
+        """Manually trigger cleanup of expired nodes"""
+        expired = self.db.execute(SELECT_EXPIRED, (self._isoformat(self._now()),)).fetchall()
+        cleaned_count = sum(1 for row in expired if self.release_expired(row['node'], row['expires_at']))
+        return {"message": f"Cleaned up {cleaned_count} expired nodes"}
+
+    def acquire_lease(self, name, owner, ttl_seconds):
+        now = self._now()
+        expires_at = self._isoformat(now + timedelta(seconds=ttl_seconds))
+        with self._transaction() as db:
+            db.execute(ACQUIRE_LEASE, (name, owner, expires_at, self._isoformat(now)))
+            row = db.execute(SELECT_LEASE, (name,)).fetchone()
+        return {'lease_owner': row['owner'], 'lease_expires_at': row['expires_at']}
+
+    def release_lease(self, name, owner):
+        return self.db.execute(RELEASE_LEASE, (name, owner)).rowcount > 0
+
+    def get_lease(self, name):
+        row = self.db.execute(SELECT_LEASE, (name,)).fetchone()
+        if not row:
+            return None
+        return {'lease_owner': row['owner'], 'lease_expires_at': row['expires_at']}
@@ -0,0 +1,174 @@
+import contextlib
+import contextvars
+import random
+import threading
+import time
+from app import metrics
+from .exceptions import StoreThrottledError
+
+# Error codes DynamoDB returns when a table, index or the account is over its limits
+THROTTLE_CODES = frozenset((
+    'ProvisionedThroughputExceededException', 'ThrottlingException', 'RequestLimitExceeded',
+))
+
+READ_OPERATIONS = frozenset(('GetItem', 'BatchGetItem', 'Query', 'TransactGetItems'))
+SCAN_OPERATIONS = frozenset(('Scan',))
+
+# Priority of the store calls made in this context. Maintenance work (expiry
+# releases, resyncs, cleanup sweeps) runs as 'background' so interactive
+# reserve/release requests keep most of the capacity when DynamoDB throttles
+PRIORITY = contextvars.ContextVar('store_priority', default='interactive')
+
+# Share of a bucket's burst background calls must leave for interactive ones
+BACKGROUND_RESERVE = 0.5
+# Longest a call waits for a token before giving up with StoreThrottledError
+MAX_WAIT_SECONDS = {'interactive': 2.0, 'background': 30.0}
+# Attempts per call when DynamoDB throttles, and the full-jitter backoff base and cap
+THROTTLE_ATTEMPTS = {'interactive': 5, 'background': 8}
+BACKOFF_BASE_SECONDS = {'interactive': 0.05, 'background': 0.25}
+BACKOFF_CAP_SECONDS = {'interactive': 1.0, 'background': 10.0}
+
+# Rate adaptation: cut the rate on throttling (at most once per interval),
+# recover additively on every call that goes through
+RATE_DECREASE = 0.7
+RATE_DECREASE_INTERVAL = 1.0
+RATE_RECOVERY = 0.01
+MIN_RATE = 1.0
+
+
+@contextlib.contextmanager
+def background():
+    """Run the store calls made inside the block at background priority"""
+    token = PRIORITY.set('background')
+    try:
+        yield
+    finally:
+        PRIORITY.reset(token)
+
+
+def operation_class(operation_name):
+    if operation_name in SCAN_OPERATIONS:
+        return 'scan'
+    if operation_name in READ_OPERATIONS:
+        return 'read'
+    return 'write'
+
+
+class TokenBucket:
+    """Token bucket whose refill rate adapts to throttling.
+
+    The rate starts at max_rate, drops multiplicatively whenever DynamoDB
+    throttles and climbs back additively as calls succeed, so sustained
+    overload settles just below what the table accepts instead of retrying
+    into a wall of errors.
+    """
+
+    def __init__(self, max_rate, burst=None):
+        self.max_rate = float(max_rate)
+        self.rate = self.max_rate
+        self.burst = float(burst or max(1.0, max_rate))
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._decreased = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        # Caller holds the lock
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, reserve=0.0, timeout=None):
+        """Take a token, leaving reserve tokens in the bucket; False if none came within timeout"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens - 1 >= reserve:
+                    self._tokens -= 1
+                    return True
+                wait = (reserve + 1 - self._tokens) / self.rate
+            if deadline is not None and now + wait > deadline:
+                return False
+            time.sleep(wait)
+
+    def on_throttle(self):
+        with self._lock:
+            now = time.monotonic()
+            if now - self._decreased < RATE_DECREASE_INTERVAL:
+                return
+            self._decreased = now
+            self._refill(now)
+            self.rate = max(MIN_RATE, self.rate * RATE_DECREASE)
+            # Pause everyone briefly instead of letting the remaining burst through
+            self._tokens = min(self._tokens, 0.0)
+
+    def on_success(self):
+        if self.rate < self.max_rate:
+            with self._lock:
+                self.rate = min(self.max_rate, self.rate + self.max_rate * RATE_RECOVERY)
+
+
+class RequestGovernor:
+    """Rate limits and retries a DynamoDB client's calls.
+
+    Hooks into botocore's event system, so it covers every call, including
+    the ones made by the resource layer and batch writers:
+
+    - before-send takes a token from the bucket of the operation's class
+      (read, write or scan) for every attempt, including retries
+    - needs-retry retries throttled attempts with full-jitter exponential
+      backoff (longer for background calls) and slows the bucket down; other
+      errors are left to botocore's own retry handler
+    - after-call turns a throttling error that outlived its retries into
+      StoreThrottledError, which the API reports as 503
+    """
+
+    def __init__(self, read_rate=1000, write_rate=500, scan_rate=50):
+        self.buckets = {
+            'read': TokenBucket(read_rate),
+            'write': TokenBucket(write_rate),
+            'scan': TokenBucket(scan_rate),
+        }
+
+    def instrument(self, client):
+        events = client.meta.events
+        events.register('before-send.dynamodb', self._before_send)
+        # First, so throttles get our backoff rather than botocore's
+        events.register_first('needs-retry.dynamodb', self._needs_retry)
+        events.register('after-call.dynamodb', self._after_call)
+
+    def _before_send(self, event_name, **kwargs):
+        # before-send.dynamodb.<Operation>
+        operation = event_name.rsplit('.', 1)[-1]
+        priority = PRIORITY.get()
+        bucket = self.buckets[operation_class(operation)]
+        reserve = bucket.burst * BACKGROUND_RESERVE if priority == 'background' else 0.0
+        started = time.monotonic()
+        if not bucket.acquire(reserve=reserve, timeout=MAX_WAIT_SECONDS[priority]):
+            metrics.DYNAMODB_THROTTLED.inc(operation, priority, 'shed')
+            raise StoreThrottledError("DynamoDB request rate limit reached, retry later")
+        metrics.DYNAMODB_RATE_LIMIT_WAIT.observe(time.monotonic() - started, operation_class(operation), priority)
+
+    def _needs_retry(self, response, attempts, operation, caught_exception=None, **kwargs):
+        if response is None:
+            return None
+        code = response[1].get('Error', {}).get('Code')
+        if code not in THROTTLE_CODES:
+            if response[0].status_code < 300:
+                self.buckets[operation_class(operation.name)].on_success()
+            return None
+        priority = PRIORITY.get()
+        self.buckets[operation_class(operation.name)].on_throttle()
+        metrics.DYNAMODB_THROTTLED.inc(operation.name, priority, 'throttled')
+        if attempts >= THROTTLE_ATTEMPTS[priority]:
+            return None
+        cap = min(BACKOFF_CAP_SECONDS[priority], BACKOFF_BASE_SECONDS[priority] * 2 ** (attempts - 1))
+        return random.uniform(0, cap)
+
+    def _after_call(self, parsed, model, **kwargs):
+        if parsed.get('Error', {}).get('Code') in THROTTLE_CODES:
+            raise StoreThrottledError("DynamoDB is throttling requests, retry later")
+
+    def rates(self):
+        return {(name,): bucket.rate for name, bucket in self.buckets.items()}
@@ -0,0 +1,155 @@
+import asyncio
+import math
+import re
+import time
+from array import array
+from app.store.base import LoopListener
+
+# Sample fields and how samples that fall in the same time bucket are combined
+FIELDS = ('load1', 'mem_used', 'users', 'last_activity')
+AGGREGATES = {'load1': 'mean', 'mem_used': 'mean', 'users': 'max', 'last_activity': 'max'}
+# Unix timestamps; stored relative to their bucket's start, as float32 is too coarse for epoch seconds
+TIME_FIELDS = frozenset(('last_activity',))
+INTEGER_FIELDS = frozenset(('users', 'last_activity'))
+# (resolution seconds, points kept): 1 minute for 6 hours, 15 minutes for 7 days
+TIERS = ((60, 360), (900, 672))
+# Largest sample value accepted; values are kept as float32
+MAX_VALUE = 1e12
+# Samples stamped further ahead than this (agent clock skew) are dropped
+MAX_FUTURE_SECONDS = 300
+
+_WINDOW = re.compile(r'^(\d+)([smhd]?)$')
+_UNITS = {'': 1, 's': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_window(window):
+    """Seconds in a window like "90s", "15m", "6h", "7d" or "3600"; ValueError if malformed"""
+    match = _WINDOW.match(window.strip().lower())
+    if not match or int(match.group(1)) == 0:
+        raise ValueError("window must be a positive number of seconds, or a number followed by s, m, h or d")
+    return int(match.group(1)) * _UNITS[match.group(2)]
+
+
+class _Ring:
+    """Fixed-size ring of time buckets at one resolution.
+
+    Slot i holds the bucket whose number is congruent to i modulo the
+    capacity, so writing a bucket overwrites the one a full span earlier and
+    memory never grows. Values are float32 (NaN when no sample had the
+    field), with a per-field sample count for running means.
+    """
+
+    def __init__(self, resolution, capacity):
+        self.resolution = resolution
+        self.capacity = capacity
+        self.times = array('I', [0]) * capacity  # bucket start; 0 = empty
+        self.values = array('f', [math.nan]) * (capacity * len(FIELDS))
+        self.counts = array('H', [0]) * (capacity * len(FIELDS))
+
+    def add(self, t, sample):
+        start = t - t % self.resolution
+        slot = start // self.resolution % self.capacity
+        if self.times[slot] > start:
+            return
+        base = slot * len(FIELDS)
+        if self.times[slot] != start:
+            self.times[slot] = start
+            for i in range(base, base + len(FIELDS)):
+                self.values[i] = math.nan
+                self.counts[i] = 0
+        for i, field in enumerate(FIELDS):
+            value = sample.get(field)
+            if value is None:
+                continue
+            if field in TIME_FIELDS:
+                value -= start
+            current, n = self.values[base + i], self.counts[base + i]
+            if n == 0:
+                self.values[base + i] = value
+            elif AGGREGATES[field] == 'mean':
+                self.values[base + i] = current + (value - current) / (n + 1)
+            else:
+                self.values[base + i] = max(current, value)
+            self.counts[base + i] = min(n + 1, 0xFFFF)
+
+    def points(self, since):
+        rows = []
+        for slot in range(self.capacity):
+            start = self.times[slot]
+            if start and start + self.resolution > since:
+                values = self.values[slot * len(FIELDS):(slot + 1) * len(FIELDS)]
+                rows.append([start] + [_output(field, v, start) for field, v in zip(FIELDS, values)])
+        rows.sort()
+        return rows
+
+
+def _output(field, value, start):
+    if math.isnan(value):
+        return None
+    if field in TIME_FIELDS:
+        value += start
+    return round(value) if field in INTEGER_FIELDS else round(value, 3)
+
+
+class _Series:
+    __slots__ = ('rings', 'latest')
+
+    def __init__(self):
+        self.rings = [_Ring(resolution, capacity) for resolution, capacity in TIERS]
+        self.latest = 0  # newest sample time accepted
+
+
+class TelemetryStore(LoopListener):
+    """Bounded, downsampled host metrics per node, reported by node agents.
+
+    Every sample goes into each tier's ring, so recent history is kept at
+    one-minute resolution and older history in coarser buckets, in constant
+    memory per node (under 30 KB). Samples at or before a node's newest
+    accepted timestamp are ignored, which makes resending a batch harmless.
+    Used from the event loop only; series are per process and are not
+    persisted, like the change stream.
+    """
+
+    def __init__(self):
+        self._series = {}
+        self._loop = None
+
+    def __len__(self):
+        return len(self._series)
+
+    def start(self, loop=None):
+        self._loop = loop or asyncio.get_running_loop()
+
+    def _apply_event(self, event, node_name, item):
+        """Drop the series of deleted nodes"""
+        if event == 'delete':
+            self._series.pop(node_name, None)
+
+    def add(self, node_name, samples):
+        """Record samples (dicts with 'time' in Unix seconds); returns how many were accepted"""
+        series = self._series.get(node_name)
+        if series is None:
+            series = self._series[node_name] = _Series()
+        latest_allowed = time.time() + MAX_FUTURE_SECONDS
+        accepted = 0
+        for sample in sorted(samples, key=lambda s: s['time']):
+            t = int(sample['time'])
+            if t <= series.latest or t > latest_allowed:
+                continue
+            for ring in series.rings:
+                ring.add(t, sample)
+            series.latest = t
+            accepted += 1
+        return accepted
+
+    def query(self, node_name, window):
+        """Points covering the last window seconds from the finest tier that spans it"""
+        tier = next((i for i, (resolution, capacity) in enumerate(TIERS) if resolution * capacity >= window), len(TIERS) - 1)
+        series = self._series.get(node_name)
+        return {
+            "node": node_name,
+            "window": window,
+            "resolution": TIERS[tier][0],
+            "fields": ["time", *FIELDS],
+            "points": series.rings[tier].points(time.time() - window) if series else [],
+        }
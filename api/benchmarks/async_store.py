@@ -0,0 +1,98 @@
+"""
+Compare request latency when blocking store calls run on the event loop
+versus through AsyncNodeStore's worker pool.
+
+A fake store sleeps for a fixed time per call to stand in for a DynamoDB
+round trip. Requires httpx:
+
+    cd api
+    python -m benchmarks.async_store --requests 400 --concurrency 50
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+from fastapi import FastAPI
+
+from app.routes import nodes
+from app.store.async_store import AsyncNodeStore
+from benchmarks._util import percentile
+
+
+class SlowStore:
+    def __init__(self, latency):
+        self.latency = latency
+
+    def get_node(self, node_name):
+        time.sleep(self.latency)
+        return {"node": node_name, "status": "available"}
+
+    def add_listener(self, listener):
+        # Read-only: there are no writes to report
+        pass
+
+    def flush_releases(self, timeout=None):
+        # Reads here never find expired reservations, so nothing is queued
+        return True
+
+
+class BlockingStore:
+    """The old behaviour: sync store calls made directly from async handlers"""
+
+    def __init__(self, store):
+        self.store = store
+
+    async def get_node(self, node_name):
+        return self.store.get_node(node_name)
+
+
+async def run(store, total, concurrency):
+    app = FastAPI()
+    app.include_router(nodes.get_router(store), prefix="/nodes")
+    transport = httpx.ASGITransport(app=app)
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        # Every request arrives at once, so latency includes time spent queued
+        # behind other requests (including a blocked event loop)
+        start = time.perf_counter()
+
+        async def one(i):
+            async with semaphore:
+                response = await client.get(f"/nodes/node-{i}")
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - start)
+
+        await asyncio.gather(*(one(i) for i in range(total)))
+        elapsed = time.perf_counter() - start
+
+    return {
+        "ops_per_sec": total / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=10.0)
+    parser.add_argument("--workers", type=int, default=32)
+    args = parser.parse_args()
+
+    slow = SlowStore(args.latency_ms / 1000)
+    async_store = AsyncNodeStore(slow, max_workers=args.workers)
+    for name, store in (("blocking", BlockingStore(slow)), ("executor", async_store)):
+        result = asyncio.run(run(store, args.requests, args.concurrency))
+        print(f"{name:>9}: {result['ops_per_sec']:8.1f} ops/s  "
+              f"p50 {result['p50_ms']:7.1f} ms  p99 {result['p99_ms']:7.1f} ms")
+    async_store.shutdown()
+
+
+if __name__ == "__main__":
+    main()
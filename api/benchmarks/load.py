@@ -0,0 +1,272 @@
+"""
+Load-test the node API in-process and record the results.
+
+The app's routes run over an in-process ASGI client against a local
+store, so numbers reflect the API and store code rather than the network
+or AWS. Scenarios:
+
+    list_<n>           GET /nodes/ with n nodes in the store (--sizes)
+    get                GET /nodes/{node} over 1000 nodes
+    reserve_contended  every client races to reserve one hot node; winners release it
+    release            POST /nodes/{node}/release on reserved nodes
+    expire             GET /nodes/{node} on nodes whose reservation just expired
+
+Each scenario reports ops/sec and p50/p95/p99 latency. Results are written
+as JSON (with the git commit) so runs can be compared with --compare.
+Requires httpx, and moto for --backend moto:
+
+    cd api
+    python -m benchmarks.load --backend memory
+    python -m benchmarks.load --backend moto --sizes 100,1000 --compare benchmarks/results/<earlier>.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+import httpx
+from fastapi import FastAPI
+
+from app.responses import FastJSONResponse
+from app.routes import nodes
+from app.store.async_store import AsyncNodeStore
+from app.store.memory import InMemoryNodeStore
+from app.store.sqlite import SQLiteNodeStore
+from benchmarks._util import percentile
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+GET_NODES = 1000
+EXPIRE_AFTER_SECONDS = 1
+
+
+class Backends:
+    """Creates a fresh, empty store per scenario"""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.count = 0
+        self._mock = None
+        self._dir = None
+        if backend == "moto":
+            # Credentials and region must be set before moto patches boto3
+            os.environ.setdefault("AWS_ACCESS_KEY_ID", "benchmark")
+            os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "benchmark")
+            os.environ.setdefault("AWS_DEFAULT_REGION", "us-west-1")
+            from moto import mock_aws
+            self._mock = mock_aws()
+            self._mock.start()
+        elif backend == "sqlite":
+            self._dir = tempfile.TemporaryDirectory()
+
+    def create(self):
+        self.count += 1
+        if self.backend == "memory":
+            return InMemoryNodeStore()
+        if self.backend == "sqlite":
+            return SQLiteNodeStore(os.path.join(self._dir.name, f"bench-{self.count}.db"))
+
+        import boto3
+        from app.store.dynamodb import DynamoDBNodeStore
+        name = f"rebm-bench-{self.count}"
+        boto3.resource("dynamodb", region_name="us-west-1").create_table(
+            TableName=name,
+            KeySchema=[{"AttributeName": "node", "KeyType": "HASH"}],
+            AttributeDefinitions=[{"AttributeName": "node", "AttributeType": "S"}],
+            BillingMode="PAY_PER_REQUEST"
+        )
+        return DynamoDBNodeStore(table_name=name)
+
+    def close(self):
+        if self._mock:
+            self._mock.stop()
+        if self._dir:
+            self._dir.cleanup()
+
+
+def seed(store, count, reserve_seconds=None):
+    """Create count nodes, optionally reserved for reserve_seconds; returns names and the last expiry"""
+    names = [f"node-{i:05}" for i in range(count)]
+    for start in range(0, count, 1000):
+        store.write_nodes(create=[{"node": name, "hostname": f"{name}.lab"} for name in names[start:start + 1000]])
+    expires_at = None
+    if reserve_seconds:
+        for start in range(0, count, 100):
+            # Relative to each chunk, so slow stores don't reserve into the past
+            expires_at = datetime.now(timezone.utc) + timedelta(seconds=reserve_seconds)
+            store.reserve_nodes(names[start:start + 100], "bench", expires_at.isoformat())
+    return names, expires_at
+
+
+async def measure(app, request, total, concurrency, warmup=0):
+    """Send total requests from concurrency clients; request(client, i) returns the response"""
+    transport = httpx.ASGITransport(app=app)
+    latencies = []
+    statuses = Counter()
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for i in range(warmup):
+            await request(client, i)
+
+        next_index = iter(range(total))
+
+        async def worker():
+            for i in next_index:
+                started = time.perf_counter()
+                response = await request(client, i)
+                latencies.append(time.perf_counter() - started)
+                statuses[response.status_code] += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return {
+        "ops": total,
+        "ops_per_sec": total / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "statuses": {str(code): count for code, count in sorted(statuses.items())},
+    }
+
+
+def make_app(store):
+    async_store = AsyncNodeStore(store)
+    app = FastAPI(default_response_class=FastJSONResponse)
+    app.include_router(nodes.get_router(async_store), prefix="/nodes")
+    return app, async_store
+
+
+async def run_scenario(name, backends, args):
+    store = backends.create()
+    if name.startswith("list_"):
+        seed(store, int(name.split("_")[1]))
+        total = args.list_requests
+
+        def request(client, i):
+            return client.get("/nodes/")
+    elif name == "get":
+        names, _ = seed(store, GET_NODES)
+        total = args.requests
+
+        def request(client, i):
+            return client.get(f"/nodes/{names[i * 7919 % len(names)]}")
+    elif name == "reserve_contended":
+        seed(store, 1)
+        total = args.requests
+        expires_at = (datetime.now(timezone.utc) + timedelta(hours=1)).isoformat()
+
+        async def request(client, i):
+            response = await client.post("/nodes/node-00000/reserve", json={"user": f"user-{i}", "expires_at": expires_at})
+            if response.status_code == 200:
+                await client.post("/nodes/node-00000/release")
+            return response
+    elif name == "release":
+        names, _ = seed(store, args.requests, reserve_seconds=3600)
+        total = args.requests
+
+        def request(client, i):
+            return client.post(f"/nodes/{names[i]}/release")
+    elif name == "expire":
+        names, expires_at = seed(store, args.requests, reserve_seconds=EXPIRE_AFTER_SECONDS)
+        await asyncio.sleep(max(0, (expires_at - datetime.now(timezone.utc)).total_seconds()) + 0.1)
+        total = args.requests
+
+        def request(client, i):
+            return client.get(f"/nodes/{names[i]}")
+    else:
+        raise ValueError(f"Unknown scenario {name}")
+
+    app, async_store = make_app(store)
+    try:
+        # Scenarios that consume their nodes cannot afford warm-up requests
+        warmup = 5 if name.startswith("list_") or name in ("get", "reserve_contended") else 0
+        return await measure(app, request, total, args.concurrency, warmup=warmup)
+    finally:
+        async_store.shutdown()
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results, baseline=None):
+    previous = baseline["scenarios"] if baseline else {}
+    for name, result in results.items():
+        line = (f"{name:>18}: {result['ops_per_sec']:9.1f} ops/s  p50 {result['p50_ms']:7.2f} ms  "
+                f"p95 {result['p95_ms']:7.2f} ms  p99 {result['p99_ms']:7.2f} ms")
+        if name in previous:
+            change = (result["ops_per_sec"] / previous[name]["ops_per_sec"] - 1) * 100
+            line += f"  ({change:+.1f}% ops/s vs {baseline.get('commit') or 'baseline'})"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=("memory", "sqlite", "moto"), default="memory")
+    parser.add_argument("--sizes", default="100,1000,10000", help="node counts for the list scenarios")
+    parser.add_argument("--scenarios", help="comma-separated subset of scenarios to run")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--list-requests", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--output", help="results file (default: benchmarks/results/<time>-<commit>.json)")
+    parser.add_argument("--compare", help="earlier results file to compare ops/sec against")
+    args = parser.parse_args()
+
+    scenarios = [f"list_{int(size)}" for size in args.sizes.split(",") if size]
+    scenarios += ["get", "reserve_contended", "release", "expire"]
+    if args.scenarios:
+        wanted = args.scenarios.split(",")
+        scenarios = [name for name in scenarios if name in wanted]
+
+    backends = Backends(args.backend)
+    results = {}
+    try:
+        for name in scenarios:
+            results[name] = asyncio.run(run_scenario(name, backends, args))
+    finally:
+        backends.close()
+
+    commit = git_commit()
+    report = {
+        "commit": commit,
+        "recorded_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "backend": args.backend,
+        "concurrency": args.concurrency,
+        "scenarios": results,
+    }
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline.get("backend") != args.backend or baseline.get("concurrency") != args.concurrency:
+            print(f"Note: baseline used backend {baseline.get('backend')} "
+                  f"and concurrency {baseline.get('concurrency')}")
+    print_results(results, baseline)
+
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        output = os.path.join(RESULTS_DIR, f"{stamp}-{commit or 'local'}.json")
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
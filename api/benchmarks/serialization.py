@@ -0,0 +1,102 @@
+"""
+Measure CPU time per GET /nodes/ for a large node list, comparing the old
+path (handler returns raw items, FastAPI runs jsonable_encoder and the
+stdlib JSON renderer) with the current route (items rendered straight
+to bytes by FastJSONResponse). Items carry Decimal attributes the way
+DynamoDB returns them. Requires httpx:
+
+    cd api
+    python -m benchmarks.serialization --nodes 5000 --requests 50
+"""
+
+import argparse
+import asyncio
+import time
+from decimal import Decimal
+
+import httpx
+from fastapi import FastAPI
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse
+
+from app.responses import FastJSONResponse
+from app.routes import nodes
+
+
+class StaticStore:
+    def __init__(self, count):
+        self.items = [
+            {
+                "node": f"node-{i:05}",
+                "hostname": f"node-{i:05}.lab.example.com",
+                "status": "reserved" if i % 3 == 0 else "available",
+                "reserved_by": "alice" if i % 3 == 0 else None,
+                "expires_at": "2030-01-01T00:00:00+00:00" if i % 3 == 0 else None,
+                "updated_at": "2024-06-01T12:00:00.123456+00:00",
+                "cpus": Decimal(64),
+                "memory_gb": Decimal("503.5"),
+            }
+            for i in range(count)
+        ]
+
+    async def list_nodes(self, status=None, reserved_by=None, fields=None):
+        return self.items
+
+
+def legacy_app(store):
+    app = FastAPI(default_response_class=JSONResponse)
+
+    @app.get("/nodes/")
+    async def list_nodes():
+        return await store.list_nodes()
+
+    return app
+
+
+def current_app(store, gzip):
+    app = FastAPI(default_response_class=FastJSONResponse)
+    if gzip:
+        app.add_middleware(GZipMiddleware, minimum_size=1000)
+    app.include_router(nodes.get_router(store), prefix="/nodes")
+    return app
+
+
+async def run(app, total, gzip):
+    transport = httpx.ASGITransport(app=app)
+    headers = {"Accept-Encoding": "gzip" if gzip else "identity"}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        # Warm up (route compilation, first-call caches)
+        response = await client.get("/nodes/", headers=headers)
+        response.raise_for_status()
+        size = len(response.content) if not gzip else int(response.headers.get("content-length", 0))
+
+        cpu = time.process_time()
+        wall = time.perf_counter()
+        for _ in range(total):
+            response = await client.get("/nodes/", headers=headers)
+            response.raise_for_status()
+        cpu = time.process_time() - cpu
+        wall = time.perf_counter() - wall
+    return {"cpu_ms": cpu / total * 1000, "wall_ms": wall / total * 1000, "bytes": size}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--nodes", type=int, default=5000)
+    parser.add_argument("--requests", type=int, default=50)
+    args = parser.parse_args()
+
+    store = StaticStore(args.nodes)
+    cases = (
+        ("legacy", legacy_app(store), False),
+        ("orjson", current_app(store, gzip=False), False),
+        ("orjson+gzip", current_app(store, gzip=True), True),
+    )
+    for name, app, gzip in cases:
+        result = asyncio.run(run(app, args.requests, gzip))
+        print(f"{name:>12}: {result['cpu_ms']:7.2f} ms CPU/request  "
+              f"{result['wall_ms']:7.2f} ms wall  {result['bytes']:>9} bytes")
+
+
+if __name__ == "__main__":
+    main()
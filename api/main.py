@@ -4,11 +4,24 @@ Copyright (c) 2024 Oscar Baeza
 Licensed under the MIT License
 """
 
-from fastapi import FastAPI, BackgroundTasks
+from fastapi import FastAPI, BackgroundTasks, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from app import metrics
+from app.events import EventBroker
+from app.allocator import NodeAllocator
+from app.telemetry import TelemetryStore
+from app.expiry import ExpiryScheduler
+from app.idempotency import IdempotencyCache, IdempotencyMiddleware
+from app.lease import LeaderLease
+from app.responses import FastJSONResponse
 from app.routes import nodes
+from app.store.async_store import AsyncNodeStore
+from app.store.cache import CachingNodeStore
 from app.store.dynamodb import DynamoDBNodeStore
-# from app.store.memory import InMemoryNodeStore
+from app.store.exceptions import StoreThrottledError
+from app.store.memory import InMemoryNodeStore
+from app.store.sqlite import SQLiteNodeStore
 import os
 import asyncio
 import logging
@@ -20,7 +33,8 @@ logger = logging.getLogger(__name__)
 
 app = FastAPI(
     title="ReBM API",
-    version="0.0.1"
+    version="0.0.1",
+    default_response_class=FastJSONResponse
 )
 
 # Add CORS middleware
@@ -32,44 +46,170 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Replay kept responses for retried writes carrying an Idempotency-Key. Inside
+# compression, so a replay is encoded for the client that sent it
+idempotency_ttl_seconds = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+idempotency_max_entries = int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", "10000"))
+idempotency_cache = None
+if idempotency_max_entries > 0:
+    idempotency_cache = IdempotencyCache(max_entries=idempotency_max_entries, ttl_seconds=idempotency_ttl_seconds)
+    app.add_middleware(IdempotencyMiddleware, cache=idempotency_cache)
+
+# Compress large responses (node lists) for clients that accept gzip; 0 disables
+gzip_min_size = int(os.getenv("GZIP_MIN_SIZE", "1000"))
+if gzip_min_size > 0:
+    app.add_middleware(GZipMiddleware, minimum_size=gzip_min_size)
+
+# Outermost, so recorded latency includes compression
+app.add_middleware(metrics.MetricsMiddleware)
+
 # Choose your backend via ENV or config
 backend = os.getenv("NODE_STORE_BACKEND", "dynamodb")
 table = os.getenv("NODE_STORE_TABLE_NAME", "ReBM-dev")
+sqlite_path = os.getenv("NODE_STORE_SQLITE_PATH", "rebm.db")
+scan_segments = int(os.getenv("NODE_STORE_SCAN_SEGMENTS", "1"))
+max_workers = int(os.getenv("NODE_STORE_MAX_WORKERS", "32"))
+dynamodb_read_rate = float(os.getenv("DYNAMODB_READ_RATE", "1000"))
+dynamodb_write_rate = float(os.getenv("DYNAMODB_WRITE_RATE", "500"))
+dynamodb_scan_rate = float(os.getenv("DYNAMODB_SCAN_RATE", "50"))
+expiry_resync_seconds = int(os.getenv("EXPIRY_RESYNC_SECONDS", "0"))
+lease_ttl_seconds = int(os.getenv("LEADER_LEASE_TTL_SECONDS", "30"))
+cache_size = int(os.getenv("NODE_CACHE_SIZE", "1024"))
+cache_ttl_seconds = float(os.getenv("NODE_CACHE_TTL_SECONDS", "30"))
+event_history = int(os.getenv("EVENT_HISTORY_SIZE", "1000"))
+event_queue_size = int(os.getenv("EVENT_QUEUE_SIZE", "100"))
+event_sync_seconds = float(os.getenv("EVENT_SYNC_SECONDS", "0"))
+allocator_resync_seconds = int(os.getenv("ALLOCATOR_RESYNC_SECONDS", "60"))
 
 if backend == "dynamodb":
-    store = DynamoDBNodeStore(table_name=table)
-# else:
-#     store = InMemoryNodeStore()
+    sync_store = DynamoDBNodeStore(
+        table_name=table,
+        scan_segments=scan_segments,
+        read_rate=dynamodb_read_rate,
+        write_rate=dynamodb_write_rate,
+        scan_rate=dynamodb_scan_rate
+    )
+    metrics.REGISTRY.register(metrics.CallbackMetric(
+        'rebm_dynamodb_rate_limit', 'Current DynamoDB request rate limit (calls/second) by operation class',
+        sync_store.governor.rates, labelnames=('operation_class',)
+    ))
+elif backend == "sqlite":
+    sync_store = SQLiteNodeStore(path=sqlite_path)
+elif backend == "memory":
+    sync_store = InMemoryNodeStore()
+else:
+    raise ValueError(f"Unknown NODE_STORE_BACKEND: {backend}")
+
+# Serve repeated single-node reads from memory (NODE_CACHE_SIZE=0 disables)
+cache = None
+if cache_size > 0:
+    cache = CachingNodeStore(sync_store, max_entries=cache_size, ttl_seconds=cache_ttl_seconds)
+    sync_store = cache
+
+# Run blocking store calls off the event loop
+store = AsyncNodeStore(sync_store, max_workers=max_workers)
+store.add_listener(metrics.on_store_event)
+
+# Only one process across workers and replicas runs background maintenance
+leader_lease = LeaderLease(store, ttl_seconds=lease_ttl_seconds)
+
+# Release reservations exactly when they expire
+expiry_scheduler = ExpiryScheduler(
+    store,
+    resync_interval=expiry_resync_seconds,
+    is_active=lambda: leader_lease.is_leader
+)
+store.add_listener(expiry_scheduler.on_store_event)
+
+# Push node changes to streaming clients
+event_broker = EventBroker(history=event_history, queue_size=event_queue_size)
+store.add_listener(event_broker.on_store_event)
+
+# Serve POST /nodes/allocate from an index of free nodes by attribute
+allocator = NodeAllocator(store, resync_interval=allocator_resync_seconds)
+store.add_listener(allocator.on_store_event)
+
+# Host metrics reported by node agents, served by GET /nodes/{node}/metrics
+telemetry = TelemetryStore()
+store.add_listener(telemetry.on_store_event)
+background_tasks = []
+
+metrics.REGISTRY.register(metrics.CallbackMetric(
+    'rebm_expiry_pending', 'Reservations tracked by the expiry scheduler', lambda: expiry_scheduler.pending
+))
+metrics.REGISTRY.register(metrics.CallbackMetric(
+    'rebm_deferred_releases_pending', 'Expired reservations found by reads and not yet released',
+    lambda: sync_store.pending_releases
+))
+if idempotency_cache:
+    metrics.REGISTRY.register(metrics.CallbackMetric(
+        'rebm_idempotency_entries', 'Responses kept for Idempotency-Key replays', lambda: len(idempotency_cache)
+    ))
+metrics.REGISTRY.register(metrics.CallbackMetric(
+    'rebm_leader', 'Whether this process holds the maintenance lease', lambda: int(leader_lease.is_leader)
+))
+metrics.REGISTRY.register(metrics.CallbackMetric(
+    'rebm_telemetry_series', 'Nodes with reported host metrics', lambda: len(telemetry)
+))
+metrics.REGISTRY.register(metrics.CallbackMetric(
+    'rebm_event_subscribers', 'Open change stream subscriptions', lambda: event_broker.subscriber_count
+))
+if cache:
+    metrics.REGISTRY.register(metrics.CallbackMetric(
+        'rebm_cache_requests_total', 'Node cache lookups by result',
+        lambda: {('hit',): cache.hits, ('miss',): cache.misses}, type='counter', labelnames=('result',)
+    ))
+    metrics.REGISTRY.register(metrics.CallbackMetric(
+        'rebm_cache_hit_ratio', 'Share of node cache lookups served from memory', lambda: cache.stats()['hit_rate']
+    ))
+    metrics.REGISTRY.register(metrics.CallbackMetric(
+        'rebm_cache_entries', 'Nodes held in the node cache', lambda: cache.stats()['size']
+    ))
 
 # Include your node routes, injecting store
-app.include_router(nodes.get_router(store), prefix="/nodes")
+app.include_router(nodes.get_router(store, events=event_broker, allocator=allocator, telemetry=telemetry), prefix="/nodes")
+
+@app.exception_handler(StoreThrottledError)
+async def store_throttled(request, exc):
+    """The store shed load; clients should back off and retry"""
+    return FastJSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(nodes.THROTTLED_RETRY_AFTER_SECONDS)}
+    )
 
 # Add a simple health check
 @app.get("/health")
 async def health():
-    return {"status": "ok"}
-
-# Background task to clean up expired nodes
-async def cleanup_expired_nodes_task():
-    """Background task to periodically clean up expired nodes"""
-    while True:
-        try:
-            result = store.cleanup_expired_nodes()
-            if result["message"] != "Cleaned up 0 expired nodes":
-                logger.info(f"Background cleanup: {result['message']}")
-        except Exception as e:
-            logger.error(f"Error in background cleanup: {e}")
-        
-        # Wait for 5 minutes before next cleanup
-        await asyncio.sleep(300)
+    return {
+        "status": "ok",
+        "lease": leader_lease.status(),
+        "cache": cache.stats() if cache else None
+    }
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Prometheus metrics in the text exposition format"""
+    return Response(metrics.REGISTRY.render(), media_type="text/plain; version=0.0.4")
 
 @app.on_event("startup")
 async def startup_event():
     """Start background tasks when the application starts"""
-    asyncio.create_task(cleanup_expired_nodes_task())
-    logger.info("Background cleanup task started")
+    event_broker.start()
+    telemetry.start()
+    background_tasks.append(asyncio.create_task(leader_lease.run()))
+    background_tasks.append(asyncio.create_task(expiry_scheduler.run()))
+    if event_sync_seconds > 0:
+        # Stream writes handled by other workers and replicas too
+        background_tasks.append(asyncio.create_task(event_broker.follow_changes(store, event_sync_seconds)))
+    logger.info(f"Background tasks started (lease owner {leader_lease.owner})")
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Clean up when the application shuts down"""
     logger.info("Application shutting down")
+    for task in background_tasks:
+        task.cancel()
+    # Hand maintenance to another process right away
+    await leader_lease.release()
+    store.shutdown()
@@ -0,0 +1,114 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.allocator import AllocationError, NodeAllocator
+from app.store.async_store import AsyncNodeStore
+from app.store.memory import InMemoryNodeStore
+
+
+def in_hours(hours):
+    return (datetime.now(timezone.utc) + timedelta(hours=hours)).timestamp()
+
+
+@pytest.fixture
+def store():
+    inner = InMemoryNodeStore()
+    for i in range(12):
+        inner.create_node({"node": f"node-{i:02}", "gpu": "h100" if i < 8 else "a100"})
+    store = AsyncNodeStore(inner, max_workers=8)
+    yield store
+    store.shutdown()
+
+
+def listening(store, resync_interval=3600):
+    allocator = NodeAllocator(store, resync_interval=resync_interval)
+    store.add_listener(allocator.on_store_event)
+    return allocator
+
+
+def reserved_by(store, user):
+    return {node["node"] for node in store.store.list_nodes(reserved_by=user)}
+
+
+def test_allocates_matching_nodes(store):
+    result = asyncio.run(listening(store).allocate(3, {"gpu": "a100"}, "alice", in_hours(1)))
+    names = {node["node"] for node in result["nodes"]}
+    assert len(names) == 3
+    assert all(node["gpu"] == "a100" and node["reserved_by"] == "alice" for node in result["nodes"])
+    assert reserved_by(store, "alice") == names
+
+
+def test_concurrent_allocations_never_share_a_node(store):
+    # Two processes: one sees every write, the other only its own rebuilds
+    allocators = [listening(store), NodeAllocator(store, resync_interval=3600)]
+
+    async def scenario():
+        return await asyncio.gather(*(
+            allocators[i % 2].allocate(2, {"gpu": "h100"}, f"user-{i}", in_hours(1))
+            for i in range(6)
+        ), return_exceptions=True)
+
+    results = asyncio.run(scenario())
+    granted = [r for r in results if not isinstance(r, Exception)]
+    assert all(isinstance(r, AllocationError) for r in results if r not in granted)
+    # Eight nodes fill four requests at most; lost races may leave fewer filled
+    assert 1 <= len(granted) <= 4
+    for i, result in enumerate(results):
+        if result in granted:
+            assert reserved_by(store, f"user-{i}") == {node["node"] for node in result["nodes"]}
+        else:
+            # A request that could not be filled keeps nothing
+            assert reserved_by(store, f"user-{i}") == set()
+    claimed = [node["node"] for result in granted for node in result["nodes"]]
+    assert len(claimed) == len(set(claimed)) == 2 * len(granted)
+    assert {node["node"] for node in store.store.list_nodes(status="reserved")} == set(claimed)
+
+
+def test_lost_claims_are_replaced_in_later_rounds(store):
+    allocator = NodeAllocator(store, resync_interval=3600)
+    asyncio.run(allocator.rebuild())
+    # Another process takes most of the a100 nodes behind the index's back
+    store.store.reserve_nodes(["node-08", "node-09", "node-10"], "bob", in_hours(1))
+
+    result = asyncio.run(allocator.allocate(1, {"gpu": "a100"}, "alice", in_hours(1)))
+    assert [node["node"] for node in result["nodes"]] == ["node-11"]
+
+
+def test_shortfall_rebuilds_to_find_nodes_released_elsewhere(store):
+    store.store.reserve_nodes(["node-08", "node-09", "node-10", "node-11"], "bob", in_hours(1))
+    allocator = NodeAllocator(store, resync_interval=3600)
+    asyncio.run(allocator.rebuild())
+    store.store.release_nodes(["node-08", "node-09"])
+
+    result = asyncio.run(allocator.allocate(2, {"gpu": "a100"}, "alice", in_hours(1)))
+    assert {node["node"] for node in result["nodes"]} == {"node-08", "node-09"}
+
+
+def test_unfilled_request_releases_what_it_got(store):
+    allocator = listening(store)
+    with pytest.raises(AllocationError):
+        asyncio.run(allocator.allocate(5, {"gpu": "a100"}, "alice", in_hours(1)))
+    assert reserved_by(store, "alice") == set()
+
+    result = asyncio.run(allocator.allocate(5, {"gpu": "a100"}, "alice", in_hours(1), partial=True))
+    assert len(result["nodes"]) == 4
+    assert result["message"] == "Reserved 4 of 5 nodes"
+
+
+def test_expired_reservations_are_candidates(store):
+    allocator = listening(store)
+    store.store.reserve_nodes(["node-08", "node-09", "node-10", "node-11"], "bob", in_hours(1))
+    asyncio.run(allocator.rebuild())
+    # An expired reservation that nothing has released yet
+    node = store.store._nodes["node-11"]
+    node["expires_at"] = (datetime.now(timezone.utc) - timedelta(minutes=1)).isoformat()
+
+    result = asyncio.run(allocator.allocate(1, {"gpu": "a100"}, "alice", in_hours(1)))
+    assert [node["node"] for node in result["nodes"]] == ["node-11"]
+
+
+def test_rejects_unindexable_match_values(store):
+    with pytest.raises(ValueError):
+        asyncio.run(listening(store).allocate(1, {"gpu": ["h100"]}, "alice", in_hours(1)))
@@ -0,0 +1,115 @@
+import asyncio
+import threading
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.store.async_store import AsyncNodeStore
+from app.store.memory import InMemoryNodeStore
+
+
+class GatedStore(InMemoryNodeStore):
+    """Counts get_node and list_nodes calls and holds them until the gate opens"""
+
+    def __init__(self):
+        super().__init__()
+        self.gate = threading.Event()
+        self.calls = 0
+        self.fail = False
+
+    def get_node(self, node_name):
+        self.calls += 1
+        self.gate.wait(5)
+        if self.fail:
+            raise RuntimeError("backend down")
+        return super().get_node(node_name)
+
+    def list_nodes(self, status=None, reserved_by=None, fields=None):
+        self.calls += 1
+        self.gate.wait(5)
+        return super().list_nodes(status=status, reserved_by=reserved_by, fields=fields)
+
+
+@pytest.fixture
+def store():
+    inner = GatedStore()
+    inner.create_node({"node": "node-1"})
+    store = AsyncNodeStore(inner, max_workers=8)
+    yield store
+    inner.gate.set()
+    store.shutdown()
+
+
+async def started(store, *calls):
+    """Start calls and give them time to reach the store"""
+    tasks = [asyncio.ensure_future(call) for call in calls]
+    await asyncio.sleep(0.05)
+    return tasks
+
+
+def test_concurrent_reads_share_one_call(store):
+    async def scenario():
+        tasks = await started(store, *(store.get_node("node-1") for _ in range(10)))
+        store.store.gate.set()
+        results = await asyncio.gather(*tasks)
+        assert store.store.calls == 1
+        assert all(result is results[0] for result in results)
+        # The flight has landed, so the next read is a new call
+        await store.get_node("node-1")
+        assert store.store.calls == 2
+
+    asyncio.run(scenario())
+
+
+def test_different_keys_do_not_share(store):
+    async def scenario():
+        tasks = await started(
+            store, store.get_node("node-1"), store.get_node("node-2"),
+            store.list_nodes(), store.list_nodes(status="available"),
+        )
+        store.store.gate.set()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        assert store.store.calls == 4
+
+    asyncio.run(scenario())
+
+
+def test_write_stops_callers_joining_an_older_read(store):
+    async def scenario():
+        before = await started(store, store.get_node("node-1"), store.list_nodes())
+        expires = (datetime.now(timezone.utc) + timedelta(hours=1)).timestamp()
+        await store.reserve_node("node-1", "alice", expires)
+        after = await started(store, store.get_node("node-1"), store.list_nodes())
+        store.store.gate.set()
+        await asyncio.gather(*before)
+        node, nodes = await asyncio.gather(*after)
+        assert store.store.calls == 4
+        assert node["reserved_by"] == "alice"
+        assert nodes[0]["reserved_by"] == "alice"
+
+    asyncio.run(scenario())
+
+
+def test_failure_is_shared_and_not_cached(store):
+    async def scenario():
+        store.store.fail = True
+        tasks = await started(store, *(store.get_node("node-1") for _ in range(3)))
+        store.store.gate.set()
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        assert store.store.calls == 1
+        assert all(isinstance(result, RuntimeError) for result in results)
+        store.store.fail = False
+        assert (await store.get_node("node-1"))["node"] == "node-1"
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_caller_does_not_cancel_the_others(store):
+    async def scenario():
+        first, second = await started(store, store.get_node("node-1"), store.get_node("node-1"))
+        first.cancel()
+        store.store.gate.set()
+        assert (await second)["node"] == "node-1"
+        assert store.store.calls == 1
+
+    asyncio.run(scenario())
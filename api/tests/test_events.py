@@ -0,0 +1,114 @@
+import asyncio
+
+from app.events import EventBroker
+from app.store.async_store import AsyncNodeStore
+from app.store.sqlite import SQLiteNodeStore
+
+
+def test_subscribers_get_live_events_for_their_node():
+    async def scenario():
+        broker = EventBroker()
+        everything, _ = broker.subscribe()
+        one_node, _ = broker.subscribe(node="node-1")
+        broker.publish("reserve", "node-2", {"node": "node-2"})
+        broker.publish("release", "node-1", {"node": "node-1"})
+        assert [(await everything.next(1))["node"] for _ in range(2)] == ["node-2", "node-1"]
+        event = await one_node.next(1)
+        assert (event["seq"], event["type"], event["node"]) == (2, "release", "node-1")
+        assert await one_node.next(0.01) is None
+
+    asyncio.run(scenario())
+
+
+def test_reconnect_replays_events_after_since():
+    broker = EventBroker()
+    for i in range(5):
+        broker.publish("reserve", f"node-{i % 2}")
+    _, backlog = broker.subscribe(since=2)
+    assert [event["seq"] for event in backlog] == [3, 4, 5]
+    _, backlog = broker.subscribe(node="node-0", since=2)
+    assert [event["seq"] for event in backlog] == [3, 5]
+    _, backlog = broker.subscribe(since=5)
+    assert backlog == []
+
+
+def test_reconnect_outside_history_gets_a_reset():
+    broker = EventBroker(history=3)
+    for i in range(5):
+        broker.publish("reserve", "node-1")
+    # Events 1 and 2 have been dropped, event 6 has not happened yet
+    for since in (1, 6):
+        _, backlog = broker.subscribe(since=since)
+        assert [event["type"] for event in backlog] == ["reset"]
+        assert backlog[0]["seq"] == 5
+    _, backlog = broker.subscribe(since=2)
+    assert [event["seq"] for event in backlog] == [3, 4, 5]
+
+
+def test_slow_subscriber_is_cut_off_without_blocking_others():
+    async def scenario():
+        broker = EventBroker(queue_size=2)
+        slow, _ = broker.subscribe()
+        fast, _ = broker.subscribe(node="node-9")
+        for i in range(3):
+            broker.publish("reserve", f"node-{i}")
+        assert slow.overflowed
+        assert not fast.overflowed
+        assert broker.subscriber_count == 1
+        # The reader is woken to tell its client to resync
+        await slow.next(1)
+        assert await slow.next(1) is None
+        broker.publish("reserve", "node-9")
+        assert (await fast.next(1))["node"] == "node-9"
+
+    asyncio.run(scenario())
+
+
+def test_store_events_are_published_on_the_loop():
+    async def scenario():
+        broker = EventBroker()
+        broker.start()
+        subscription, _ = broker.subscribe()
+        await asyncio.to_thread(broker.on_store_event, "delete", "node-1", None)
+        event = await subscription.next(1)
+        assert (event["type"], event["node"]) == ("delete", "node-1")
+
+    asyncio.run(scenario())
+
+
+def test_sse_format():
+    broker = EventBroker()
+    event = broker.publish("create", "node-1", {"node": "node-1"})
+    text = EventBroker.format_sse(event)
+    assert text.startswith("id: 1\nevent: create\ndata: {")
+    assert text.endswith("}\n\n")
+
+
+def test_follow_changes_publishes_writes_made_elsewhere(tmp_path):
+    # Two workers sharing one SQLite database
+    local = AsyncNodeStore(SQLiteNodeStore(path=str(tmp_path / "rebm.db")))
+    other = SQLiteNodeStore(path=str(tmp_path / "rebm.db"))
+
+    async def scenario():
+        broker = EventBroker()
+        broker.start()
+        local.add_listener(broker.on_store_event)
+        subscription, _ = broker.subscribe()
+        follower = asyncio.ensure_future(broker.follow_changes(local, 0.05))
+        await asyncio.sleep(0.01)
+        await local.create_node({"node": "local"})
+        other.create_node({"node": "remote"})
+        other.delete_node("local")
+        await asyncio.sleep(0.2)
+        follower.cancel()
+
+        events = []
+        while (event := await subscription.next(0.01)) is not None:
+            events.append((event["type"], event["node"]))
+        return events
+
+    events = asyncio.run(scenario())
+    local.shutdown()
+    # The local create is published once, by the listener
+    assert events[0] == ("create", "local")
+    assert sorted(events[1:]) == [("delete", "local"), ("update", "remote")]
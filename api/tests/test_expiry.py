@@ -0,0 +1,68 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from app.expiry import ExpiryScheduler
+
+
+def at(seconds):
+    return (datetime.now(timezone.utc) + timedelta(seconds=seconds)).isoformat()
+
+
+class FakeStore:
+    """Async store stand-in whose reservation listing waits until released"""
+
+    def __init__(self, reservations):
+        self.reservations = reservations
+        self.listing = asyncio.Event()
+        self.proceed = asyncio.Event()
+        self.listings = 0
+        self.released = []
+
+    async def list_reservations(self):
+        self.listings += 1
+        self.listing.set()
+        await self.proceed.wait()
+        return list(self.reservations)
+
+    async def release_expired(self, node_name, expires_at):
+        self.released.append(node_name)
+        return True
+
+
+def test_events_during_a_rebuild_are_kept():
+    async def scenario():
+        store = FakeStore([{"node": "old", "expires_at": at(60)}, {"node": "gone", "expires_at": at(60)}])
+        scheduler = ExpiryScheduler(store)
+        scheduler._loop = asyncio.get_running_loop()
+        rebuild = asyncio.ensure_future(scheduler.rebuild())
+        await store.listing.wait()
+        # Written while the listing was in flight, which predates them
+        scheduler.on_store_event("reserve", "new", {"node": "new", "expires_at": at(30)})
+        scheduler.on_store_event("release", "gone", None)
+        await asyncio.sleep(0)
+        store.proceed.set()
+        await rebuild
+        return scheduler
+
+    scheduler = asyncio.run(scenario())
+    assert sorted(scheduler._deadlines) == ["new", "old"]
+
+
+def test_resyncs_when_elected_and_not_periodically():
+    async def scenario():
+        store = FakeStore([{"node": "a", "expires_at": at(0.1)}])
+        store.proceed.set()
+        leader = False
+        scheduler = ExpiryScheduler(store, is_active=lambda: leader)
+        task = asyncio.ensure_future(scheduler._run())
+        await asyncio.sleep(0.05)
+        assert store.listings == 0
+        leader = True
+        scheduler._wakeup.set()
+        await asyncio.sleep(0.3)
+        task.cancel()
+        return store
+
+    store = asyncio.run(scenario())
+    assert store.listings == 1
+    assert store.released == ["a"]
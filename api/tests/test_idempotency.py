@@ -0,0 +1,101 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+
+from app.idempotency import IdempotencyCache, IdempotencyMiddleware
+
+
+def make_app(cache=None):
+    app = FastAPI()
+    app.state.calls = 0
+
+    @app.post("/reserve/{name}")
+    async def reserve(name: str, body: dict):
+        app.state.calls += 1
+        await asyncio.sleep(body.get("delay", 0))
+        if body.get("fail"):
+            raise HTTPException(status_code=503, detail="store unavailable")
+        return {"node": name, "call": app.state.calls}
+
+    app.add_middleware(IdempotencyMiddleware, cache=cache or IdempotencyCache())
+    return app
+
+
+@pytest.fixture
+def app():
+    return make_app()
+
+
+@pytest.fixture
+def client(app):
+    with TestClient(app) as client:
+        yield client
+
+
+def post(client, path, body, key="key-1"):
+    return client.post(path, json=body, headers={"Idempotency-Key": key} if key else {})
+
+
+def test_retry_replays_the_first_response(app, client):
+    first = post(client, "/reserve/node-1", {})
+    again = post(client, "/reserve/node-1", {})
+    assert first.status_code == again.status_code == 200
+    assert again.json() == first.json() == {"node": "node-1", "call": 1}
+    assert again.headers["idempotent-replayed"] == "true"
+    assert "idempotent-replayed" not in first.headers
+    assert app.state.calls == 1
+
+
+def test_requests_without_a_key_always_run(app, client):
+    post(client, "/reserve/node-1", {}, key=None)
+    post(client, "/reserve/node-1", {}, key=None)
+    assert app.state.calls == 2
+
+
+def test_key_reused_for_a_different_request_is_rejected(app, client):
+    post(client, "/reserve/node-1", {})
+    for path, body in (("/reserve/node-2", {}), ("/reserve/node-1", {"delay": 0})):
+        response = post(client, path, body)
+        assert response.status_code == 422
+        assert "different request" in response.json()["detail"]
+    assert app.state.calls == 1
+
+
+def test_overlong_key_is_rejected(client):
+    assert post(client, "/reserve/node-1", {}, key="k" * 256).status_code == 400
+
+
+def test_server_errors_are_not_kept(app, client):
+    assert post(client, "/reserve/node-1", {"fail": True}).status_code == 503
+    assert post(client, "/reserve/node-1", {"fail": True}).status_code == 503
+    assert app.state.calls == 2
+
+
+def test_concurrent_retry_waits_for_the_first_attempt(app):
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await asyncio.gather(*(
+                client.post("/reserve/node-1", json={"delay": 0.1}, headers={"Idempotency-Key": "key-1"})
+                for _ in range(3)
+            ))
+
+    responses = asyncio.run(scenario())
+    assert app.state.calls == 1
+    assert [r.json()["call"] for r in responses] == [1, 1, 1]
+    assert sum(r.headers.get("idempotent-replayed") == "true" for r in responses) == 2
+
+
+def test_cache_is_bounded_by_size_and_age():
+    cache = IdempotencyCache(max_entries=2, ttl_seconds=60)
+    for key in ("a", "b", "c"):
+        cache.start(key, "fingerprint")
+    assert len(cache) == 2
+    assert cache.get("a") is None
+
+    expired = IdempotencyCache(ttl_seconds=0)
+    expired.start("a", "fingerprint")
+    assert expired.get("a") is None
@@ -0,0 +1,359 @@
+"""
+Behaviour every NodeStore backend must share.
+
+Each test runs against the in-memory, SQLite and DynamoDB stores. The
+DynamoDB store talks to moto's mock and is skipped when moto is not
+installed (pip install pytest moto httpx).
+
+    cd api
+    pytest
+"""
+
+import contextlib
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.store.exceptions import ChangesExpiredError, NodeConflictError, NodeNotFoundError
+from app.store.memory import InMemoryNodeStore
+from app.store.sqlite import SQLiteNodeStore
+
+TABLE_NAME = "rebm-conformance"
+REGION = "us-west-1"
+
+
+@pytest.fixture(params=["memory", "sqlite", "dynamodb"])
+def store(request, tmp_path, monkeypatch):
+    with contextlib.ExitStack() as stack:
+        if request.param == "memory":
+            store = InMemoryNodeStore()
+        elif request.param == "sqlite":
+            store = SQLiteNodeStore(path=str(tmp_path / "rebm.db"))
+        else:
+            moto = pytest.importorskip("moto")
+            import boto3
+            from app.store.dynamodb import DynamoDBNodeStore
+
+            for name in ("AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY"):
+                monkeypatch.setenv(name, "testing")
+            stack.enter_context(moto.mock_aws())
+            boto3.resource("dynamodb", region_name=REGION).create_table(
+                TableName=TABLE_NAME,
+                KeySchema=[{"AttributeName": "node", "KeyType": "HASH"}],
+                AttributeDefinitions=[{"AttributeName": "node", "AttributeType": "S"}],
+                BillingMode="PAY_PER_REQUEST",
+            )
+            store = DynamoDBNodeStore(table_name=TABLE_NAME, region_name=REGION)
+        yield store
+        # Auto-releases queued by reads must land before the backend goes away
+        store.flush_releases(5)
+
+
+def in_hours(hours):
+    return (datetime.now(timezone.utc) + timedelta(hours=hours)).isoformat()
+
+
+def names(nodes):
+    return sorted(node["node"] for node in nodes)
+
+
+def create(store, *node_names):
+    for name in node_names:
+        store.create_node({"node": name, "hostname": f"{name}.example", "cpus": 4})
+
+
+# Conditional reserve and release
+
+def test_reserve_keeps_attributes(store):
+    create(store, "a")
+    result = store.reserve_node("a", "alice", in_hours(1))
+    assert result["item"]["status"] == "reserved"
+    assert result["item"]["reserved_by"] == "alice"
+    assert result["item"]["hostname"] == "a.example"
+    assert store.get_node("a")["expires_at"] == result["expires_at"]
+
+
+def test_reserve_reserved_node_conflicts(store):
+    create(store, "a")
+    store.reserve_node("a", "alice", in_hours(1))
+    with pytest.raises(NodeConflictError):
+        store.reserve_node("a", "bob", in_hours(1))
+    assert store.get_node("a")["reserved_by"] == "alice"
+
+
+def test_reserve_and_release_missing_node(store):
+    with pytest.raises(NodeNotFoundError):
+        store.reserve_node("missing", "alice", in_hours(1))
+    with pytest.raises(NodeNotFoundError):
+        store.release_node("missing")
+    with pytest.raises(NodeNotFoundError):
+        store.delete_node("missing")
+    assert store.get_node("missing") is None
+
+
+def test_reserve_rejects_past_expiry(store):
+    create(store, "a")
+    with pytest.raises(Exception, match="future"):
+        store.reserve_node("a", "alice", in_hours(-1))
+
+
+def test_internal_names_are_rejected(store):
+    store.acquire_lease("maintenance", "owner-1", 30)
+    lease_row = "__rebm__/lease/maintenance"
+    calls = [
+        lambda: store.create_node({"node": lease_row}),
+        lambda: store.delete_node(lease_row),
+        lambda: store.reserve_node(lease_row, "alice", in_hours(1)),
+        lambda: store.release_node(lease_row),
+        lambda: store.write_nodes(delete=[lease_row]),
+        lambda: store.reserve_nodes([lease_row], "alice", in_hours(1)),
+        lambda: store.release_nodes([lease_row]),
+    ]
+    for call in calls:
+        with pytest.raises(Exception, match="Invalid node name"):
+            call()
+    assert store.get_lease("maintenance")["lease_owner"] == "owner-1"
+
+
+def test_release(store):
+    create(store, "a")
+    store.reserve_node("a", "alice", in_hours(1))
+    item = store.release_node("a")["item"]
+    assert (item["status"], item["reserved_by"], item["expires_at"]) == ("available", None, None)
+
+
+# Listing: filters, projection and paging
+
+def test_list_filters(store):
+    create(store, "a", "b", "c")
+    store.reserve_node("a", "alice", in_hours(1))
+    store.reserve_node("b", "bob", in_hours(1))
+    assert names(store.list_nodes()) == ["a", "b", "c"]
+    assert names(store.list_nodes(status="reserved")) == ["a", "b"]
+    assert names(store.list_nodes(status="available")) == ["c"]
+    assert names(store.list_nodes(reserved_by="alice")) == ["a"]
+    assert names(store.list_nodes(status="available", reserved_by="alice")) == []
+
+
+def test_list_fields_projection(store):
+    create(store, "a", "b")
+    nodes = store.list_nodes(fields=["status", "cpus"])
+    assert all(set(node) == {"node", "status", "cpus"} for node in nodes)
+    assert {node["cpus"] for node in nodes} == {4}
+
+
+def test_paging_visits_every_node_once(store):
+    create(store, *[f"n{i:02}" for i in range(7)])
+    seen, cursor, pages = [], None, 0
+    while True:
+        page, cursor = store.list_nodes_page(3, cursor)
+        assert len(page) <= 3
+        seen += [node["node"] for node in page]
+        pages += 1
+        if not cursor:
+            break
+        assert pages < 10
+    assert sorted(seen) == [f"n{i:02}" for i in range(7)]
+    assert len(seen) == len(set(seen))
+
+
+def test_paging_with_filters_and_fields(store):
+    create(store, *[f"n{i}" for i in range(5)])
+    for name in ("n1", "n3"):
+        store.reserve_node(name, "alice", in_hours(1))
+    seen, cursor = [], None
+    while True:
+        page, cursor = store.list_nodes_page(1, cursor, status="reserved", fields=["status"])
+        seen += page
+        if not cursor:
+            break
+    assert names(seen) == ["n1", "n3"]
+    assert all(set(node) == {"node", "status"} for node in seen)
+
+
+def test_get_nodes_keeps_request_order(store):
+    create(store, "a", "b", "c")
+    assert [node["node"] for node in store.get_nodes(["c", "missing", "a", "c"])] == ["c", "a"]
+
+
+# Batches
+
+def test_best_effort_batch_reserve(store):
+    create(store, "a", "b")
+    store.reserve_node("b", "bob", in_hours(1))
+    result = store.reserve_nodes(["a", "b", "missing"], "alice", in_hours(1))
+    assert [r["ok"] for r in result["results"]] == [True, False, False]
+    assert store.get_node("a")["reserved_by"] == "alice"
+    assert store.get_node("b")["reserved_by"] == "bob"
+
+
+def test_atomic_batch_reserve_rolls_back(store):
+    create(store, "a", "b")
+    store.reserve_node("b", "bob", in_hours(1))
+    result = store.reserve_nodes(["a", "b"], "alice", in_hours(1), atomic=True)
+    assert not any(r["ok"] for r in result["results"])
+    assert store.get_node("a")["status"] == "available"
+    assert store.get_node("b")["reserved_by"] == "bob"
+
+
+def test_atomic_batch_release(store):
+    create(store, "a", "b")
+    store.reserve_nodes(["a", "b"], "alice", in_hours(1))
+    result = store.release_nodes(["a", "b", "missing"], atomic=True)
+    assert not any(r["ok"] for r in result["results"])
+    assert names(store.list_nodes(status="reserved")) == ["a", "b"]
+    result = store.release_nodes(["a", "b"], atomic=True)
+    assert all(r["ok"] for r in result["results"])
+    assert names(store.list_nodes(status="available")) == ["a", "b"]
+
+
+def test_atomic_write_rolls_back(store):
+    create(store, "a")
+    result = store.write_nodes(create=[{"node": "new"}], delete=["a", "missing"], atomic=True)
+    assert not any(r["ok"] for r in result["results"])
+    assert store.get_node("new") is None
+    assert store.get_node("a") is not None
+
+
+def test_best_effort_write(store):
+    create(store, "a")
+    result = store.write_nodes(create=[{"node": "new"}], delete=["a"])
+    assert all(r["ok"] for r in result["results"])
+    assert names(store.list_nodes()) == ["new"]
+    with pytest.raises(Exception):
+        store.write_nodes(create=[{"node": "x"}], delete=["x"])
+
+
+# Tombstones and delta sync
+
+def test_list_changes_reports_writes_and_deletions(store):
+    create(store, "a", "b", "c")
+    since = time.time() - 1
+    store.reserve_node("a", "alice", in_hours(1))
+    store.delete_node("b")
+    store.write_nodes(create=[{"node": "d"}], delete=["c"])
+    changes = store.list_changes(since)
+    assert "a" in names(changes["nodes"]) and "d" in names(changes["nodes"])
+    assert sorted(changes["deleted"]) == ["b", "c"]
+    assert changes["as_of"]
+    assert store.get_node("b") is None
+    assert names(store.list_nodes()) == ["a", "d"]
+
+
+def test_list_changes_after_recreate(store):
+    create(store, "a")
+    since = time.time() - 1
+    store.delete_node("a")
+    create(store, "a")
+    changes = store.list_changes(since)
+    assert names(changes["nodes"]) == ["a"]
+    assert "a" not in changes["deleted"]
+
+
+def test_list_changes_outside_tombstone_window(store):
+    with pytest.raises(ChangesExpiredError):
+        store.list_changes((datetime.now(timezone.utc) - timedelta(days=30)).isoformat())
+    with pytest.raises(Exception):
+        store.list_changes("not a time")
+
+
+# Leases
+
+def test_lease_acquire_renew_and_release(store):
+    assert store.acquire_lease("maintenance", "owner-1", 30)["lease_owner"] == "owner-1"
+    # Held: another owner sees the current holder, the holder renews
+    assert store.acquire_lease("maintenance", "owner-2", 30)["lease_owner"] == "owner-1"
+    assert store.acquire_lease("maintenance", "owner-1", 30)["lease_owner"] == "owner-1"
+    assert not store.release_lease("maintenance", "owner-2")
+    assert store.release_lease("maintenance", "owner-1")
+    assert store.get_lease("maintenance") is None
+    assert store.acquire_lease("maintenance", "owner-2", 30)["lease_owner"] == "owner-2"
+
+
+def test_leases_are_not_nodes(store):
+    create(store, "a")
+    store.acquire_lease("maintenance", "owner-1", 30)
+    assert names(store.list_nodes()) == ["a"]
+    page, _ = store.list_nodes_page(10)
+    assert names(page) == ["a"]
+
+
+# Expired reservations
+
+def test_release_expired_requires_matching_expiry(store):
+    create(store, "a")
+    store.reserve_node("a", "alice", in_hours(1))
+    [reservation] = store.list_reservations()
+    assert reservation["node"] == "a"
+    assert not store.release_expired("a", in_hours(2))
+    assert store.get_node("a")["status"] == "reserved"
+    assert store.release_expired("a", reservation["expires_at"])
+    assert store.get_node("a")["status"] == "available"
+    assert store.list_reservations() == []
+
+
+def test_release_expired_skips_renewed_reservation(store):
+    create(store, "a")
+    old = store.reserve_node("a", "alice", in_hours(1))["expires_at"]
+    store.release_node("a")
+    store.reserve_node("a", "bob", in_hours(2))
+    assert not store.release_expired("a", old)
+    assert store.get_node("a")["reserved_by"] == "bob"
+    assert not store.release_expired("missing", old)
+
+
+def test_release_expired_nodes_batch(store):
+    create(store, "a", "b", "c")
+    reservations = {}
+    for name in ("a", "b"):
+        reservations[name] = store.reserve_node(name, "alice", in_hours(1))["expires_at"]
+    released = store.release_expired_nodes([
+        {"node": "a", "expires_at": reservations["a"]},
+        {"node": "b", "expires_at": in_hours(5)},
+        {"node": "missing", "expires_at": reservations["a"]},
+    ])
+    assert sorted(released) == ["a"]
+    assert store.get_node("a")["status"] == "available"
+    assert store.get_node("b")["status"] == "reserved"
+
+
+def test_listeners_see_writes(store):
+    events = []
+    store.add_listener(lambda event, node_name, item: events.append((event, node_name)))
+    create(store, "a", "b")
+    expires_at = store.reserve_node("a", "alice", in_hours(1))["expires_at"]
+    store.release_expired("a", expires_at)
+    store.delete_node("b")
+    assert events == [("create", "a"), ("create", "b"), ("reserve", "a"), ("expire", "a"), ("delete", "b")]
+
+
+# HTTP status codes the routes map store errors to
+
+@pytest.fixture
+def client(store):
+    pytest.importorskip("httpx")
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from app.routes import nodes
+    from app.store.async_store import AsyncNodeStore
+
+    async_store = AsyncNodeStore(store, max_workers=4)
+    app = FastAPI()
+    app.include_router(nodes.get_router(async_store), prefix="/nodes")
+    with TestClient(app) as client:
+        yield client
+    async_store.shutdown()
+
+
+def test_route_status_codes(client):
+    assert client.post("/nodes/", json={"node": "a"}).status_code == 200
+    body = {"user": "alice", "duration_hours": 1}
+    assert client.post("/nodes/a/reserve", json=body).status_code == 200
+    assert client.post("/nodes/a/reserve", json=body).status_code == 409
+    assert client.post("/nodes/missing/reserve", json=body).status_code == 404
+    assert client.post("/nodes/missing/release").status_code == 404
+    assert client.get("/nodes/missing").status_code == 404
+    assert client.get("/nodes/", params={"since": "2000-01-01T00:00:00Z"}).status_code == 410
+    response = client.post("/nodes/batch", json={"delete": ["__rebm__/lease/maintenance"]})
+    assert response.status_code == 400
@@ -0,0 +1,114 @@
+import importlib
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.store import throttle
+from app.store.exceptions import StoreThrottledError
+from app.store.throttle import RequestGovernor, TokenBucket
+
+
+def slow_bucket(burst):
+    # Refills so slowly that no token comes back while a test runs
+    return TokenBucket(0.01, burst=burst)
+
+
+def test_bucket_serves_its_burst_then_sheds():
+    bucket = slow_bucket(3)
+    assert all(bucket.acquire(timeout=0) for _ in range(3))
+    assert not bucket.acquire(timeout=0)
+
+
+def test_background_reserve_is_left_for_interactive_calls():
+    bucket = slow_bucket(10)
+    background = 0
+    while bucket.acquire(reserve=5, timeout=0):
+        background += 1
+    assert background == 5
+    assert all(bucket.acquire(timeout=0) for _ in range(5))
+    assert not bucket.acquire(timeout=0)
+
+
+def test_throttle_cuts_rate_once_per_interval_and_success_recovers():
+    bucket = TokenBucket(100)
+    bucket.on_throttle()
+    assert bucket.rate == pytest.approx(100 * throttle.RATE_DECREASE)
+    assert not bucket.acquire(timeout=0)
+    bucket.on_throttle()
+    assert bucket.rate == pytest.approx(100 * throttle.RATE_DECREASE)
+    for _ in range(1000):
+        bucket.on_success()
+    assert bucket.rate == 100
+
+
+def test_rate_never_drops_below_minimum(monkeypatch):
+    monkeypatch.setattr(throttle, 'RATE_DECREASE_INTERVAL', 0)
+    bucket = TokenBucket(2)
+    for _ in range(10):
+        bucket.on_throttle()
+    assert bucket.rate == throttle.MIN_RATE
+
+
+def test_governor_sheds_when_no_token_comes_in_time(monkeypatch):
+    monkeypatch.setattr(throttle, 'MAX_WAIT_SECONDS', {'interactive': 0, 'background': 0})
+    governor = RequestGovernor()
+    governor.buckets['write'] = slow_bucket(4)
+    for _ in range(2):
+        with throttle.background():
+            governor._before_send('before-send.dynamodb.UpdateItem')
+    with pytest.raises(StoreThrottledError), throttle.background():
+        governor._before_send('before-send.dynamodb.UpdateItem')
+    # Interactive calls still get the half of the burst background work left
+    for _ in range(2):
+        governor._before_send('before-send.dynamodb.UpdateItem')
+    with pytest.raises(StoreThrottledError):
+        governor._before_send('before-send.dynamodb.UpdateItem')
+    # Reads draw from their own bucket
+    governor._before_send('before-send.dynamodb.GetItem')
+
+
+def response(code=None, status=400):
+    parsed = {'Error': {'Code': code}} if code else {}
+    return (SimpleNamespace(status_code=status if code else 200), parsed)
+
+
+def test_governor_retries_throttles_with_bounded_backoff():
+    governor = RequestGovernor(write_rate=100)
+    operation = SimpleNamespace(name='PutItem')
+    throttled = response('ProvisionedThroughputExceededException')
+    delay = governor._needs_retry(throttled, 1, operation)
+    assert 0 <= delay <= throttle.BACKOFF_BASE_SECONDS['interactive']
+    assert governor.buckets['write'].rate < 100
+    assert governor._needs_retry(throttled, throttle.THROTTLE_ATTEMPTS['interactive'], operation) is None
+    # Other errors are left to botocore
+    assert governor._needs_retry(response('ConditionalCheckFailedException'), 1, operation) is None
+    assert governor._needs_retry(None, 1, operation) is None
+
+
+def test_governor_reports_exhausted_throttling_as_store_error():
+    governor = RequestGovernor()
+    with pytest.raises(StoreThrottledError):
+        governor._after_call(response('ThrottlingException')[1], None)
+    governor._after_call(response()[1], None)
+
+
+def test_throttled_store_calls_are_503_from_every_route(monkeypatch):
+    monkeypatch.setenv("NODE_STORE_BACKEND", "memory")
+    main = importlib.import_module("main")
+
+    async def throttled(*args, **kwargs):
+        raise StoreThrottledError("DynamoDB request rate limit reached, retry later")
+
+    for method in ("get_node", "list_nodes_page", "create_node", "reserve_nodes"):
+        monkeypatch.setattr(main.store, method, throttled)
+    client = TestClient(main.app)
+    responses = [
+        client.get("/nodes/node-1"),
+        client.get("/nodes/", params={"limit": 10}),
+        client.post("/nodes/", json={"node": "node-1"}),
+        client.post("/nodes/batch/reserve", json={"nodes": ["node-1"], "user": "alice", "duration_hours": 1}),
+    ]
+    for response in responses:
+        assert response.status_code == 503, response.request.url
+        assert response.headers["retry-after"] == "1"
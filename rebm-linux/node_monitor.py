@@ -6,8 +6,13 @@ Licensed under the MIT License
 
 import os
 import sys
+import json
 import time
+import random
 import socket
+import subprocess
+import threading
+import uuid
 import requests
 from datetime import datetime, timezone
 
@@ -15,136 +20,443 @@ from datetime import datetime, timezone
 API_URL = os.getenv('REBM_API_URL', 'http://localhost:8000')
 NODE_NAME = os.getenv('NODE_NAME', socket.gethostname())
 CHECK_INTERVAL = int(os.getenv('CHECK_INTERVAL_SECONDS', '300'))  # 5 minutes
+# Bounds for the adaptive interval: faster near a reservation's expiry, slower when idle
+MIN_CHECK_INTERVAL = int(os.getenv('MIN_CHECK_INTERVAL_SECONDS', '30'))
+MAX_CHECK_INTERVAL = int(os.getenv('MAX_CHECK_INTERVAL_SECONDS', '1200'))
+# Random spread applied to every wait (0.2 = +/-20%) so agents don't poll in lockstep
+CHECK_JITTER = float(os.getenv('CHECK_JITTER', '0.2'))
+CREATE_ATTEMPTS = 3
+# While the API fails, wait a random time in [0, min(BACKOFF_MAX, BACKOFF_BASE * 2^n)]
+# (full jitter) before the next attempt, n being the number of consecutive failures
+BACKOFF_BASE = float(os.getenv('BACKOFF_BASE_SECONDS', '10'))
+BACKOFF_MAX = float(os.getenv('BACKOFF_MAX_SECONDS', '900'))
+# Last known node state, shown while the API is unreachable
+CACHE_FILE = os.getenv('REBM_CACHE_FILE', '/var/lib/rebm-linux/state.json')
+MOTD_FILE = os.getenv('MOTD_FILE', '/etc/motd')
+# Current status for local readers (shell prompts, login hooks), no API call needed
+STATUS_FILE = os.getenv('REBM_STATUS_FILE', '/run/rebm/status.json')
+# 'poll' checks every interval; 'push' follows the API's change stream and only
+# falls back to polling while the stream is unavailable
+MONITOR_MODE = os.getenv('MONITOR_MODE', 'poll')
+# The API sends a keepalive every 15s, so a stream this quiet is dead
+STREAM_READ_TIMEOUT = 45
+# Host metrics reporting: sample every interval (0 disables), send every TELEMETRY_BATCH_SIZE samples
+TELEMETRY_INTERVAL = int(os.getenv('TELEMETRY_INTERVAL_SECONDS', '60'))
+TELEMETRY_BATCH = int(os.getenv('TELEMETRY_BATCH_SIZE', '5'))
+TELEMETRY_FIELDS = ['time', 'load1', 'mem_used', 'users', 'last_activity']
+# Samples kept while the API is unreachable, and most sent in one request
+MAX_PENDING_SAMPLES = 1440
+MAX_REPORT_SAMPLES = 1000
 
-def get_node_status():
-    """Get current node status from API"""
+# Keep-alive connection reused across polls
+session = requests.Session()
+# Last node state and its ETag, for conditional requests
+last_etag = None
+last_node = None
+# Content last written to MOTD_FILE and STATUS_FILE
+written = {}
+
+class ApiError(Exception):
+    """The API could not be reached or answered with an error"""
+
+def backoff_delay(failures):
+    """Full-jitter exponential backoff"""
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** min(failures - 1, 30)))
+
+class CircuitBreaker:
+    """Stops calling a failing API until a backoff delay has passed.
+
+    Each failure opens the circuit for a full-jitter backoff delay that
+    doubles its range with every consecutive failure. Once it passes, one
+    trial request goes through: success closes the circuit, failure opens
+    it again for longer. Agents waiting on a recovering API come back
+    spread over the whole window instead of all at once.
+    """
+
+    def __init__(self):
+        self.failures = 0
+        self.retry_at = 0.0
+
+    def allow(self):
+        return time.monotonic() >= self.retry_at
+
+    def seconds_until_retry(self):
+        return max(0.0, self.retry_at - time.monotonic())
+
+    def record_success(self):
+        if self.failures:
+            print(f"API reachable again after {self.failures} failed attempts")
+        self.failures = 0
+        self.retry_at = 0.0
+
+    def record_failure(self):
+        self.failures += 1
+        delay = backoff_delay(self.failures)
+        self.retry_at = time.monotonic() + delay
+        print(f"API unavailable ({self.failures} consecutive failures), next attempt in {delay:.0f}s")
+
+breaker = CircuitBreaker()
+
+def load_cache():
+    """Restore the last known node state saved by a previous run"""
+    global last_etag, last_node
     try:
-        response = requests.get(f"{API_URL}/nodes/{NODE_NAME}", timeout=5)
-        if response.status_code == 200:
-            return response.json()
-        elif response.status_code == 404:
-            # Create node if it doesn't exist
-            create_node()
-            return get_node_status()
-        else:
-            print(f"API error: {response.status_code}")
-            return None
-    except Exception as e:
-        print(f"Connection error: {e}")
+        with open(CACHE_FILE) as f:
+            cached = json.load(f)
+        last_node, last_etag = cached.get('node'), cached.get('etag')
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError, AttributeError) as e:
+        print(f"Ignoring unreadable cache file {CACHE_FILE}: {e}")
+
+def write_file(path, content):
+    """Replace path with content atomically, so readers never see a partial file.
+
+    Skipped when content is what was last written (or what the file already
+    holds at startup); returns whether the file was written.
+    """
+    if path not in written:
+        try:
+            with open(path) as f:
+                written[path] = f.read()
+        except (OSError, UnicodeDecodeError):
+            written[path] = None
+    if written[path] == content:
+        return False
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp = f"{path}.tmp"
+    try:
+        with open(tmp, 'w') as f:
+            f.write(content)
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+    written[path] = content
+    return True
+
+def save_cache():
+    """Persist the last known node state"""
+    try:
+        write_file(CACHE_FILE, json.dumps({'node': last_node, 'etag': last_etag}))
+    except OSError as e:
+        print(f"Could not write cache file {CACHE_FILE}: {e}")
+
+def fetch_node_status(allow_create=True):
+    """Get current node status from API; None if the node does not exist"""
+    global last_etag, last_node
+    headers = {"If-None-Match": last_etag} if last_etag and last_node else None
+    try:
+        response = session.get(f"{API_URL}/nodes/{NODE_NAME}", headers=headers, timeout=5)
+    except requests.RequestException as e:
+        raise ApiError(f"Connection error: {e}")
+    if response.status_code == 304:
+        # Unchanged since the last poll: no body was sent
+        return last_node
+    if response.status_code == 200:
+        last_node = response.json()
+        last_etag = response.headers.get("ETag")
+        return last_node
+    if response.status_code == 404:
+        # Create node if it doesn't exist, then look once more. The last known
+        # state stays cached until that settles: ApiError keeps serving it
+        if allow_create and create_node():
+            return fetch_node_status(allow_create=False)
+        last_etag = last_node = None
         return None
+    raise ApiError(f"API error: {response.status_code}")
+
+def get_node_status():
+    """Return (node data, stale); stale data is the last known state, served while the API fails"""
+    if not breaker.allow():
+        return last_node, True
+    previous = (last_node, last_etag)
+    try:
+        node_data = fetch_node_status()
+    except ApiError as e:
+        print(e)
+        breaker.record_failure()
+        return last_node, True
+    breaker.record_success()
+    if (last_node, last_etag) != previous:
+        save_cache()
+    return node_data, False
 
 def create_node():
-    """Create node in system if it doesn't exist"""
+    """Create node in system if it doesn't exist; returns whether it was created.
+
+    Raises ApiError if the API kept failing (5xx or connection errors).
+    """
+    data = {"node": NODE_NAME, "hostname": socket.gethostname()}
+    # Same key on every attempt, so a retry after a timeout is not applied twice
+    headers = {"Idempotency-Key": str(uuid.uuid4())}
+    for attempt in range(CREATE_ATTEMPTS):
+        try:
+            response = session.post(f"{API_URL}/nodes/", json=data, headers=headers, timeout=5)
+            if response.status_code == 200:
+                print(f"Created node: {NODE_NAME}")
+                return True
+            if response.status_code < 500:
+                print(f"Failed to create node: {response.status_code}")
+                return False
+            print(f"Failed to create node (attempt {attempt + 1}/{CREATE_ATTEMPTS}): {response.status_code}")
+        except requests.RequestException as e:
+            print(f"Error creating node (attempt {attempt + 1}/{CREATE_ATTEMPTS}): {e}")
+        if attempt + 1 < CREATE_ATTEMPTS:
+            time.sleep(backoff_delay(attempt + 1))
+    raise ApiError(f"Could not create node after {CREATE_ATTEMPTS} attempts")
+
+def follow_events():
+    """Refresh the MOTD whenever the API reports a change to this node.
+
+    Holds one streaming connection to /nodes/events filtered to NODE_NAME and
+    re-reads the node (a conditional GET) on every event, plus once per
+    regular interval so expiry countdowns stay current. Returns when the
+    stream ends; raises ApiError if it cannot be opened.
+    """
     try:
-        data = {"node": NODE_NAME, "hostname": socket.gethostname()}
-        response = requests.post(f"{API_URL}/nodes/", json=data, timeout=5)
-        if response.status_code == 200:
-            print(f"Created node: {NODE_NAME}")
-        else:
-            print(f"Failed to create node: {response.status_code}")
-    except Exception as e:
-        print(f"Error creating node: {e}")
+        response = session.get(f"{API_URL}/nodes/events", params={"node": NODE_NAME},
+                               stream=True, timeout=(5, STREAM_READ_TIMEOUT))
+    except requests.RequestException as e:
+        raise ApiError(f"Connection error: {e}")
+    with response:
+        if response.status_code != 200:
+            raise ApiError(f"Event stream error: {response.status_code}")
+        print("Following node events")
+        # The first event (ready) triggers a refresh, so nothing between that read and the subscription is missed
+        changed, refresh_at = False, 0.0
+        try:
+            for line in response.iter_lines(decode_unicode=True):
+                if line.startswith("event:"):
+                    changed = True
+                    continue
+                # A blank line ends an event or a keepalive
+                if line or not (changed or time.monotonic() >= refresh_at):
+                    continue
+                node_data, stale = get_node_status()
+                update_motd(node_data, stale)
+                if stale:
+                    return
+                changed, refresh_at = False, time.monotonic() + next_interval(node_data)
+        except requests.RequestException as e:
+            print(f"Event stream interrupted: {e}")
+
+def memory_used():
+    """Share of memory in use, from /proc/meminfo"""
+    info = {}
+    with open('/proc/meminfo') as f:
+        for line in f:
+            key, value = line.split(':', 1)
+            info[key] = int(value.split()[0])
+    return round(1 - info['MemAvailable'] / info['MemTotal'], 3)
+
+def sessions():
+    """Logged-in user count and the last input time (Unix seconds) on any of their terminals"""
+    output = subprocess.run(['who'], capture_output=True, text=True, timeout=5).stdout
+    users, last_activity = set(), None
+    for line in output.splitlines():
+        parts = line.split()
+        if len(parts) < 2:
+            continue
+        users.add(parts[0])
+        try:
+            # A terminal's access time moves on every keystroke (what `w` shows as IDLE)
+            active = int(os.stat(f"/dev/{parts[1]}").st_atime)
+        except OSError:
+            continue
+        last_activity = max(last_activity or 0, active)
+    return len(users), last_activity
+
+def sample_host():
+    """One telemetry sample in TELEMETRY_FIELDS order; None for what cannot be read"""
+    load1 = mem_used = users = last_activity = None
+    try:
+        load1 = round(os.getloadavg()[0], 2)
+    except OSError:
+        pass
+    try:
+        mem_used = memory_used()
+    except (OSError, KeyError, ValueError, ZeroDivisionError):
+        pass
+    try:
+        users, last_activity = sessions()
+    except (OSError, subprocess.SubprocessError):
+        pass
+    return [int(time.time()), load1, mem_used, users, last_activity]
+
+def report_telemetry():
+    """Sample the host every TELEMETRY_INTERVAL and send the samples to the API in batches.
+
+    Runs in its own thread with its own connection. Unsent samples are kept
+    (up to MAX_PENDING_SAMPLES) and go with the next batch; the API ignores
+    samples it already has, so resending after a timeout is harmless.
+    """
+    telemetry_session = requests.Session()
+    pending = []
+    # Start at a random point of the interval, so a fleet's batches arrive spread out
+    time.sleep(random.uniform(0, TELEMETRY_INTERVAL))
+    while True:
+        pending.append(sample_host())
+        del pending[:-MAX_PENDING_SAMPLES]
+        if len(pending) >= TELEMETRY_BATCH and breaker.allow():
+            batch = pending[:MAX_REPORT_SAMPLES]
+            try:
+                response = telemetry_session.post(f"{API_URL}/nodes/{NODE_NAME}/metrics",
+                                                  json={"fields": TELEMETRY_FIELDS, "samples": batch}, timeout=10)
+                if response.status_code == 200 or response.status_code in (400, 422):
+                    # Sent, or rejected in a way a retry would not fix
+                    del pending[:len(batch)]
+                if response.status_code != 200:
+                    print(f"Failed to report telemetry: {response.status_code}")
+            except requests.RequestException as e:
+                print(f"Error reporting telemetry: {e}")
+        time.sleep(TELEMETRY_INTERVAL)
+
+def parse_time(time_str):
+    """Parse an API timestamp, or None"""
+    try:
+        parsed = datetime.fromisoformat(time_str.replace('Z', '+00:00'))
+    except (AttributeError, ValueError):
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+def next_interval(node_data):
+    """Seconds until the next poll, adapted to the node's state and jittered"""
+    interval = CHECK_INTERVAL
+    now = datetime.now(timezone.utc)
+    if node_data and node_data.get('status') == 'reserved':
+        expires_at = parse_time(node_data.get('expires_at'))
+        if expires_at and expires_at > now:
+            # Halve the remaining time each poll, so the MOTD catches the expiry
+            interval = min(interval, (expires_at - now).total_seconds() / 2)
+    elif node_data and node_data.get('status') == 'available':
+        updated_at = parse_time(node_data.get('updated_at'))
+        if updated_at:
+            idle = (now - updated_at).total_seconds()
+            if idle > 24 * 3600:
+                interval *= 4
+            elif idle > 3600:
+                interval *= 2
+    interval = min(max(interval, MIN_CHECK_INTERVAL), MAX_CHECK_INTERVAL)
+    return interval * random.uniform(1 - CHECK_JITTER, 1 + CHECK_JITTER)
 
 def format_time(time_str):
-    """Format time duration"""
+    """Format a timestamp in local time.
+
+    Absolute rather than relative ("5m ago"), so the MOTD stays correct
+    until it is read and only changes when the node does.
+    """
     if not time_str:
         return "unknown"
     try:
-        start = datetime.fromisoformat(time_str.replace('Z', '+00:00'))
-        now = datetime.now(timezone.utc)
-        duration = now - start
-        
-        if duration.days > 0:
-            return f"{duration.days}d {duration.seconds // 3600}h"
-        elif duration.seconds > 3600:
-            return f"{duration.seconds // 3600}h {(duration.seconds % 3600) // 60}m"
-        else:
-            return f"{duration.seconds // 60}m"
+        return parse_time(time_str).astimezone().strftime('%Y-%m-%d %H:%M %Z')
     except:
         return "unknown"
 
-def format_expiry(expires_at):
-    """Format expiry time"""
-    if not expires_at:
-        return ""
-    try:
-        expiry = datetime.fromisoformat(expires_at.replace('Z', '+00:00'))
-        now = datetime.now(timezone.utc)
-        
-        if expiry <= now:
-            return "EXPIRED"
-        
-        time_left = expiry - now
-        if time_left.days > 0:
-            return f"{time_left.days}d {time_left.seconds // 3600}h left"
-        elif time_left.seconds > 3600:
-            return f"{time_left.seconds // 3600}h {time_left.seconds % 3600 // 60}m left"
+def render_motd(node_data, stale=False):
+    """MOTD text for the node status"""
+    motd = []
+    motd.append("=" * 50)
+    motd.append(f"ReBM Node: {NODE_NAME}")
+    motd.append("=" * 50)
+    motd.append("")
+    
+    if stale:
+        motd.append("⚠️  ReBM API unreachable, showing last known state")
+        motd.append("")
+    
+    if not node_data:
+        motd.append("❓ Status unknown" if stale else "❌ Node not found")
+    else:
+        status = node_data.get('status', 'unknown')
+        if status == 'available':
+            motd.append("🟢 AVAILABLE")
+            if node_data.get('updated_at'):
+                motd.append(f"   Since: {format_time(node_data['updated_at'])}")
+        elif status == 'reserved':
+            motd.append("🔴 RESERVED")
+            if node_data.get('reserved_by'):
+                motd.append(f"   By: {node_data['reserved_by']}")
+            if node_data.get('expires_at'):
+                motd.append(f"   Expires: {format_time(node_data['expires_at'])}")
         else:
-            return f"{time_left.seconds // 60}m left"
-    except:
-        return "unknown"
+            motd.append(f"❓ Status: {status}")
+    
+    motd.append("")
+    motd.append("=" * 50)
+    motd.append("")
+    return '\n'.join(motd)
+
+def render_status(node_data, stale=False):
+    """JSON status document for local readers"""
+    node_data = node_data or {}
+    return json.dumps({
+        "node": NODE_NAME,
+        "status": node_data.get('status', 'unknown' if stale else 'not_found'),
+        "reserved_by": node_data.get('reserved_by'),
+        "expires_at": node_data.get('expires_at'),
+        "updated_at": node_data.get('updated_at'),
+        "stale": stale,
+    }, indent=2) + "\n"
 
-def update_motd(node_data):
-    """Update MOTD with node status"""
+def update_motd(node_data, stale=False):
+    """Update MOTD and the local status file, rewriting only what changed"""
+    status = node_data.get('status') if node_data else 'not found'
     try:
-        motd = []
-        motd.append("=" * 50)
-        motd.append(f"ReBM Node: {NODE_NAME}")
-        motd.append("=" * 50)
-        motd.append("")
-        
-        if not node_data:
-            motd.append("❌ Node not found")
-        else:
-            status = node_data.get('status', 'unknown')
-            if status == 'available':
-                motd.append("🟢 AVAILABLE")
-                if node_data.get('updated_at'):
-                    motd.append(f"   Updated: {format_time(node_data['updated_at'])} ago")
-            elif status == 'reserved':
-                motd.append("🔴 RESERVED")
-                if node_data.get('reserved_by'):
-                    motd.append(f"   By: {node_data['reserved_by']}")
-                if node_data.get('expires_at'):
-                    motd.append(f"   Expires: {format_expiry(node_data['expires_at'])}")
-            else:
-                motd.append(f"❓ Status: {status}")
-        
-        motd.append("")
-        motd.append("=" * 50)
-        motd.append("")
-        
-        with open('/etc/motd', 'w') as f:
-            f.write('\n'.join(motd))
-            
-        print(f"Updated MOTD - Status: {node_data.get('status') if node_data else 'not found'}")
-        
+        if write_file(MOTD_FILE, render_motd(node_data, stale)):
+            print(f"Updated MOTD - Status: {status}")
     except PermissionError:
         print("Permission denied writing to MOTD")
     except Exception as e:
         print(f"Error updating MOTD: {e}")
+    try:
+        write_file(STATUS_FILE, render_status(node_data, stale))
+    except Exception as e:
+        print(f"Error updating status file {STATUS_FILE}: {e}")
 
 def main():
     """Main function"""
     print(f"Starting monitor for node: {NODE_NAME}")
     print(f"API: {API_URL}")
-    print(f"Check interval: {CHECK_INTERVAL}s")
+    print(f"Check interval: {CHECK_INTERVAL}s (adaptive, {MIN_CHECK_INTERVAL}-{MAX_CHECK_INTERVAL}s)")
+    print(f"Mode: {MONITOR_MODE}")
     
+    load_cache()
+    if TELEMETRY_INTERVAL > 0:
+        threading.Thread(target=report_telemetry, name='telemetry', daemon=True).start()
     while True:
         try:
-            node_data = get_node_status()
-            update_motd(node_data)
-            time.sleep(CHECK_INTERVAL)
+            if MONITOR_MODE == 'push' and breaker.allow():
+                try:
+                    follow_events()
+                    # Stream dropped (API restart?): reconnect soon, spread across the fleet
+                    time.sleep(backoff_delay(1))
+                    continue
+                except ApiError as e:
+                    print(f"Event stream unavailable, polling instead: {e}")
+            node_data, stale = get_node_status()
+            update_motd(node_data, stale)
+            if breaker.failures:
+                time.sleep(breaker.seconds_until_retry())
+            else:
+                time.sleep(next_interval(node_data))
         except KeyboardInterrupt:
             print("Stopping monitor")
             break
         except Exception as e:
             print(f"Error: {e}")
-            time.sleep(60)
+            time.sleep(60 * random.uniform(1 - CHECK_JITTER, 1 + CHECK_JITTER))
 
 if __name__ == "__main__":
     if len(sys.argv) > 1 and sys.argv[1] == '--once':
-        node_data = get_node_status()
-        update_motd(node_data)
+        load_cache()
+        node_data, stale = get_node_status()
+        update_motd(node_data, stale)
     else:
         main() 
\ No newline at end of file
@@ -9,6 +9,7 @@ class Config:
     SLACK_APP_TOKEN = os.getenv("SLACK_APP_TOKEN")
     REBM_API_URL = os.getenv("REBM_API_URL", "http://localhost:8000")
     REBM_API_TIMEOUT = int(os.getenv("REBM_API_TIMEOUT", "30"))
+    REBM_API_RETRIES = int(os.getenv("REBM_API_RETRIES", "2"))
     BOT_NAME = os.getenv("BOT_NAME", "ReBM Bot")
 
     @classmethod
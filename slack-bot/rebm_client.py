@@ -1,13 +1,19 @@
 import aiohttp
+import asyncio
 import logging
+import uuid
 from config import Config
 
 logger = logging.getLogger(__name__)
 
+# Seconds before the first retry; later retries wait proportionally longer
+RETRY_DELAY = 1
+
 class ReBMClient:
-    def __init__(self, api_url=None, timeout=None):
+    def __init__(self, api_url=None, timeout=None, retries=None):
         self.api_url = api_url or Config.REBM_API_URL
         self.timeout = timeout or Config.REBM_API_TIMEOUT
+        self.retries = Config.REBM_API_RETRIES if retries is None else retries
         self.session = None
 
     async def _get_session(self):
@@ -16,27 +22,45 @@ class ReBMClient:
             self.session = aiohttp.ClientSession(timeout=timeout)
         return self.session
 
-    async def _make_request(self, method, endpoint, data=None):
+    async def _make_request(self, method, endpoint, data=None, params=None):
         session = await self._get_session()
         url = f"{self.api_url}{endpoint}"
-        try:
-            async with session.request(method, url, json=data) as resp:
-                try:
-                    resp.raise_for_status()
-                    return await resp.json()
-                except aiohttp.ClientResponseError as cre:
-                    # Try to get error details from the response
+        headers = None
+        if method in ("POST", "DELETE"):
+            # The same key on every attempt: if an attempt that timed out did go
+            # through, the API replays its response instead of applying it again
+            headers = {"Idempotency-Key": str(uuid.uuid4())}
+        for attempt in range(self.retries + 1):
+            try:
+                async with session.request(method, url, json=data, params=params, headers=headers) as resp:
                     try:
-                        error_json = await resp.json()
-                    except Exception:
-                        error_json = None
-                    return {"error": str(cre), "status": resp.status, "details": error_json}
-        except Exception as e:
-            logger.error(f"API request failed: {e}")
-            return {"error": str(e)}
+                        resp.raise_for_status()
+                        return await resp.json()
+                    except aiohttp.ClientResponseError as cre:
+                        # Try to get error details from the response
+                        try:
+                            error_json = await resp.json()
+                        except Exception:
+                            error_json = None
+                        return {"error": str(cre), "status": resp.status, "details": error_json}
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                if attempt < self.retries:
+                    logger.warning(f"API request failed ({e!r}), retrying")
+                    await asyncio.sleep(RETRY_DELAY * (attempt + 1))
+                    continue
+                logger.error(f"API request failed: {e!r}")
+                return {"error": str(e) or type(e).__name__}
+            except Exception as e:
+                logger.error(f"API request failed: {e}")
+                return {"error": str(e)}
 
-    async def get_nodes(self):
-        resp = await self._make_request("GET", "/nodes/")
+    async def get_nodes(self, status=None, fields=None):
+        params = {}
+        if status:
+            params["status"] = status
+        if fields:
+            params["fields"] = ",".join(fields)
+        resp = await self._make_request("GET", "/nodes/", params=params or None)
         if isinstance(resp, list):
             return resp
         if isinstance(resp, dict):
@@ -46,6 +70,12 @@ class ReBMClient:
     async def get_node(self, node_name):
         return await self._make_request("GET", f"/nodes/{node_name}")
 
+    async def get_nodes_by_name(self, node_names):
+        resp = await self._make_request("POST", "/nodes/batch/get", {"names": list(node_names)})
+        if isinstance(resp, dict):
+            return resp.get("nodes", [])
+        return []
+
     async def create_node(self, node_name, description=""):
         return await self._make_request("POST", "/nodes/", {"name": node_name, "description": description})
 
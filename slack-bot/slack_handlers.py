@@ -106,7 +106,7 @@ class SlackBot:
             return
         node_response = await self.rebm_client.get_node(node_name)
         if not node_response or node_response.get("error"):
-            all_nodes = await self.rebm_client.get_nodes()
+            all_nodes = await self.rebm_client.get_nodes(fields=["node"])
             available_names = []
             for n in all_nodes:
                 if isinstance(n, dict):
@@ -230,29 +230,21 @@ class SlackBot:
                 except Exception as e:
                     logger.warning(f"Could not fetch real name for user {user_id}: {e}")
         
-        # Try to find the node name by checking different combinations of arguments
+        # The node name may contain spaces: look up every prefix of the arguments
+        # in one batch and take the shortest one that is a node
         node_name = None
         duration_args = []
-        
-        # First try just the first argument as node name
-        potential_node = args[0]
-        node_response = await self.rebm_client.get_node(potential_node)
-        if node_response and not node_response.get("error"):
-            node_name = potential_node
-            duration_args = args[1:]
-        else:
-            # If first argument isn't a node, try joining multiple arguments
-            for i in range(1, len(args) + 1):
-                potential_node = " ".join(args[:i])
-                node_response = await self.rebm_client.get_node(potential_node)
-                if node_response and not node_response.get("error"):
-                    node_name = potential_node
-                    duration_args = args[i:]
-                    break
+        candidates = [" ".join(args[:i]) for i in range(1, len(args) + 1)]
+        existing = {n.get("node") for n in await self.rebm_client.get_nodes_by_name(candidates)}
+        for i, potential_node in enumerate(candidates, start=1):
+            if potential_node in existing:
+                node_name = potential_node
+                duration_args = args[i:]
+                break
         
         # If no valid node found, show error
         if not node_name:
-            all_nodes = await self.rebm_client.get_nodes()
+            all_nodes = await self.rebm_client.get_nodes(fields=["node"])
             available_names = []
             for n in all_nodes:
                 if isinstance(n, dict):
@@ -288,7 +280,7 @@ class SlackBot:
             error_msg = result.get("error", "").lower()
             details = result.get("details")
             if "not found" in error_msg or "404" in str(result.get("status", "")):
-                all_nodes = await self.rebm_client.get_nodes()
+                all_nodes = await self.rebm_client.get_nodes(fields=["node"])
                 available_names = []
                 for n in all_nodes:
                     if isinstance(n, dict):
@@ -313,7 +305,7 @@ class SlackBot:
                     await say(text=f"❌ Node `{node_name}` is already reserved.")
                     return
                 elif "not found" in detail_msg.lower():
-                    all_nodes = await self.rebm_client.get_nodes()
+                    all_nodes = await self.rebm_client.get_nodes(fields=["node"])
                     available_names = []
                     for n in all_nodes:
                         if isinstance(n, dict):
@@ -374,7 +366,7 @@ class SlackBot:
         
         node_response = await self.rebm_client.get_node(node_name)
         if not node_response or node_response.get("error"):
-            all_nodes = await self.rebm_client.get_nodes()
+            all_nodes = await self.rebm_client.get_nodes(fields=["node"])
             available_names = []
             for n in all_nodes:
                 if isinstance(n, dict):
@@ -450,7 +442,7 @@ class SlackBot:
         
         node_response = await self.rebm_client.get_node(node_name)
         if not node_response or node_response.get("error"):
-            all_nodes = await self.rebm_client.get_nodes()
+            all_nodes = await self.rebm_client.get_nodes(fields=["node"])
             available_names = []
             for n in all_nodes:
                 if isinstance(n, dict):
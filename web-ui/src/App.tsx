@@ -1,6 +1,38 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { nodeService } from './services/api';
-import { Node } from './types';
+import { Node, NodeChanges, NodeEvent } from './types';
+
+// How often to catch up from the API, for changes the stream did not carry
+const RESYNC_INTERVAL_MS = 60 * 1000;
+// Start delta syncs this far before a full load, to allow for clock differences with the API
+const SYNC_OVERLAP_MS = 60 * 1000;
+
+// Apply a change pushed by the API to the current node list
+const applyNodeEvent = (nodes: Node[], event: NodeEvent): Node[] => {
+  if (!event.node) return nodes;
+  if (event.type === 'delete') {
+    return nodes.filter((n) => n.node !== event.node);
+  }
+  const update: Partial<Node> =
+    event.type === 'expire'
+      ? { status: 'available', reserved_by: null, expires_at: null }
+      : event.item || {};
+  if (!nodes.some((n) => n.node === event.node)) {
+    return [...nodes, { node: event.node, status: 'available', updated_at: event.at || '', ...update } as Node];
+  }
+  return nodes.map((n) => (n.node === event.node ? { ...n, ...update } : n));
+};
+
+// Apply a delta sync result to the current node list
+const applyNodeChanges = (nodes: Node[], changes: NodeChanges): Node[] => {
+  const gone = new Set(changes.deleted);
+  const changed = new Map(changes.nodes.map((n) => [n.node, n]));
+  const kept = nodes
+    .filter((n) => !gone.has(n.node))
+    .map((n) => changed.get(n.node) || n);
+  const known = new Set(nodes.map((n) => n.node));
+  return [...kept, ...changes.nodes.filter((n) => !known.has(n.node))];
+};
 
 function App() {
   const [nodes, setNodes] = useState<Node[]>([]);
@@ -11,6 +43,8 @@ function App() {
   const [selectedNode, setSelectedNode] = useState<string>('');
   const [actionLoading, setActionLoading] = useState(false);
   const [apiStatus, setApiStatus] = useState<'online' | 'offline' | 'checking'>('checking');
+  // as_of of the last sync, for the next GET /nodes/?since=
+  const syncedAt = useRef<string | null>(null);
 
   // Form states
   const [newNodeName, setNewNodeName] = useState('');
@@ -23,6 +57,24 @@ function App() {
     checkApiHealth();
   }, []);
 
+  // Keep the list current from the change stream instead of re-fetching.
+  // Events can be missed (a reset, or a write handled by another API process),
+  // so also catch up from the delta sync on a reset and on a slow timer
+  useEffect(() => {
+    const unsubscribe = nodeService.subscribeToEvents((event) => {
+      if (event.type === 'reset') {
+        syncNodes();
+        return;
+      }
+      setNodes((current) => applyNodeEvent(current, event));
+    });
+    const timer = setInterval(syncNodes, RESYNC_INTERVAL_MS);
+    return () => {
+      clearInterval(timer);
+      unsubscribe();
+    };
+  }, []);
+
   const checkApiHealth = async () => {
     try {
       await nodeService.healthCheck();
@@ -36,8 +88,10 @@ function App() {
     try {
       setLoading(true);
       setError(null);
+      const since = new Date(Date.now() - SYNC_OVERLAP_MS).toISOString();
       const data = await nodeService.listNodes();
       setNodes(data);
+      syncedAt.current = since;
     } catch (err: any) {
       setError(err.response?.data?.detail || 'Failed to load nodes');
     } finally {
@@ -45,6 +99,23 @@ function App() {
     }
   };
 
+  // Fetch only what changed since the last sync; reload everything when that is too far back
+  const syncNodes = async () => {
+    if (!syncedAt.current) {
+      await loadNodes();
+      return;
+    }
+    try {
+      const changes = await nodeService.listChanges(syncedAt.current);
+      syncedAt.current = changes.as_of;
+      setNodes((current) => applyNodeChanges(current, changes));
+    } catch (err: any) {
+      if (err.response?.status === 410) {
+        await loadNodes();
+      }
+    }
+  };
+
   const handleCreateNode = async () => {
     if (!newNodeName.trim()) return;
     
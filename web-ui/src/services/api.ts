@@ -1,5 +1,5 @@
 import axios, { AxiosResponse } from 'axios';
-import { Node, CreateNodeRequest, ReserveNodeRequest, ApiResponse } from '../types';
+import { Node, NodeChanges, NodeEvent, CreateNodeRequest, ReserveNodeRequest, ApiResponse } from '../types';
 
 const API_BASE_URL = process.env.REACT_APP_API_URL || 'http://localhost:8000';
 
@@ -26,6 +26,12 @@ export const nodeService = {
     return response.data;
   },
 
+  // Get the nodes changed and deleted after since (an as_of from the previous call)
+  async listChanges(since: string): Promise<NodeChanges> {
+    const response: AxiosResponse<NodeChanges> = await api.get('/nodes/', { params: { since } });
+    return response.data;
+  },
+
   // Get a specific node
   async getNode(nodeName: string): Promise<Node> {
     const response: AxiosResponse<Node> = await api.get(`/nodes/${nodeName}`);
@@ -62,6 +68,16 @@ export const nodeService = {
     return response.data;
   },
 
+  // Subscribe to live node changes; returns a function that closes the stream
+  subscribeToEvents(onEvent: (event: NodeEvent) => void): () => void {
+    const source = new EventSource(`${API_BASE_URL}/nodes/events`);
+    const handler = (e: MessageEvent) => onEvent(JSON.parse(e.data));
+    ['create', 'reserve', 'release', 'delete', 'expire', 'update', 'reset'].forEach((type) =>
+      source.addEventListener(type, handler as EventListener)
+    );
+    return () => source.close();
+  },
+
   // Health check
   async healthCheck(): Promise<{ status: string }> {
     const response: AxiosResponse<{ status: string }> = await api.get('/health');
@@ -23,6 +23,20 @@ export interface ApiResponse<T = any> {
   data?: T;
 }
 
+export interface NodeEvent {
+  seq: number;
+  type: 'ready' | 'create' | 'reserve' | 'release' | 'delete' | 'expire' | 'update' | 'reset';
+  node: string | null;
+  item?: Partial<Node> | null;
+  at: string | null;
+}
+
+export interface NodeChanges {
+  nodes: Node[];
+  deleted: string[];
+  as_of: string;
+}
+
 export interface ErrorResponse {
   detail: string;
 } 
\ No newline at end of file